@@ -0,0 +1,76 @@
+// Infinite scroll: fetch the next keyset page of a column when its button comes into view
+(function () {
+    // Hashed URLs the template passes in, see tasks.html
+    const config = document.currentScript.dataset;
+    const editIcon = config.editIcon;
+    const deleteIcon = config.deleteIcon;
+
+    function taskItem(task) {
+        const item = document.createElement('li');
+        item.className = 'task-item';
+        item.append(task.title);
+
+        const actions = document.createElement('div');
+        actions.className = 'task-actions';
+        [[task.edit_url, editIcon, 'Edit'], [task.delete_url, deleteIcon, 'Delete']].forEach(([href, src, label]) => {
+            const link = document.createElement('a');
+            link.href = href;
+            const img = document.createElement('img');
+            img.src = src;
+            img.alt = img.title = label;
+            link.append(img);
+            actions.append(link);
+        });
+        item.append(actions);
+
+        if (task.tags.length) {
+            const tags = document.createElement('div');
+            tags.className = 'task-tags';
+            tags.textContent = task.tags.join(', ');
+            item.append(tags);
+        }
+        return item;
+    }
+
+    async function loadMore(button) {
+        if (button.dataset.loading) return;
+        button.dataset.loading = 'true';
+        const response = await fetch(button.dataset.url + '&cursor=' + encodeURIComponent(button.dataset.cursor));
+        const page = await response.json();
+        const list = document.getElementById(button.dataset.list);
+        page.results.forEach(task => list.append(taskItem(task)));
+
+        if (page.next_cursor) {
+            button.dataset.cursor = page.next_cursor;
+            delete button.dataset.loading;
+        } else if (!page.results.length && button.classList.contains('show-older')) {
+            button.replaceWith('No archived tasks.');
+        } else {
+            button.remove();
+        }
+    }
+
+    const observer = new IntersectionObserver(entries => {
+        entries.filter(entry => entry.isIntersecting).forEach(entry => loadMore(entry.target));
+    });
+    document.querySelectorAll('.load-more').forEach(button => {
+        button.addEventListener('click', () => loadMore(button));
+        observer.observe(button);
+    });
+    // Archived tasks are only fetched when asked for
+    document.querySelectorAll('.show-older').forEach(button => {
+        button.addEventListener('click', () => loadMore(button));
+    });
+
+    // Live updates: reload the board shortly after one of the user's tasks changes
+    if (window.EventSource) {
+        const events = new EventSource(config.eventsUrl);
+        let refresh;
+        ['task.created', 'task.updated', 'task.deleted', 'board.changed'].forEach(type => {
+            events.addEventListener(type, () => {
+                clearTimeout(refresh);
+                refresh = setTimeout(() => location.reload(), 500);
+            });
+        });
+    }
+})();
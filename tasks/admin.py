@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Task
+from .models import Project, ProjectMembership, Task
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
@@ -16,4 +16,14 @@ class TaskAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.user = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+class ProjectMembershipInline(admin.TabularInline):
+    model = ProjectMembership
+    extra = 1
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_at')
+    search_fields = ('name',)
+    inlines = [ProjectMembershipInline]
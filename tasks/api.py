@@ -0,0 +1,238 @@
+import hashlib
+import json
+from functools import wraps
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.http import HttpResponse, JsonResponse, QueryDict
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_http_methods
+from .bulk import soft_delete_tasks
+from .cache import board_version, complete_tags, tag_catalog, tag_catalog_version
+from .forms import TaskConflict, TaskForm
+from .models import Task
+from .pagination import InvalidCursor, paginate
+from .serializers import TASK_FIELDS, task_to_dict
+
+# Upper bound for the page_size query parameter
+MAX_PAGE_SIZE = 200
+
+# Upper bound for the limit query parameter of tag completions
+MAX_COMPLETIONS = 50
+
+# Fields returned when the client does not ask for specific ones
+DEFAULT_FIELDS = tuple(field for field in TASK_FIELDS if field not in ('edit_url', 'delete_url'))
+
+
+class BadRequest(ValueError):
+    '''Raised for malformed API input; answered with a 400 response.'''
+    status = 400
+
+
+class UnsupportedMediaType(BadRequest):
+    '''Raised for a body in a format the API does not read; answered with a 415 response.'''
+    status = 415
+
+
+def _json(data, status=200):
+    # Compact separators keep payloads small before (and after) gzip
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'separators': (',', ':')})
+
+
+def _error(message, status):
+    return _json({'error': message}, status=status)
+
+
+def api_view(*methods):
+    '''Restricts a view to `methods`, answers anonymous users with 401 and BadRequest with 400.'''
+    def decorator(view):
+        @require_http_methods(methods)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return _error("Authentication required.", 401)
+            try:
+                response = view(request, *args, **kwargs)
+            except BadRequest as exc:
+                return _error(str(exc), exc.status)
+            # Responses depend on the session and must be revalidated before reuse
+            patch_vary_headers(response, ['Cookie'])
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _conditional(request, etag, build):
+    '''Returns 304 when the client's ETag is current, otherwise build() with the ETag set.'''
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+        if response.status_code == 200:
+            response['ETag'] = etag
+    return response
+
+
+def _requested_fields(request):
+    fields = request.GET.get('fields')
+    if not fields:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in TASK_FIELDS]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _prefetched(tasks, fields):
+    return tasks.prefetch_related('tags') if 'tags' in fields else tasks
+
+
+def _get_task(request, task_id, fields=DEFAULT_FIELDS, editable=False):
+    tasks = Task.objects.editable_by(request.user) if editable else Task.objects.visible_to(request.user)
+    return _prefetched(tasks, fields).filter(id=task_id).first()
+
+
+def _request_data(request):
+    '''Returns the submitted task data from a JSON body or a form-encoded body.'''
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            raise BadRequest("Invalid JSON body.")
+        if not isinstance(data, dict):
+            raise BadRequest("Expected a JSON object.")
+        return data
+    if request.method == "POST":
+        form = request.POST
+    elif request.content_type == 'application/x-www-form-urlencoded':
+        # Django only parses form bodies of POST requests
+        form = QueryDict(request.body, encoding=request.encoding)
+    elif request.body:
+        raise UnsupportedMediaType("Send a JSON or form-encoded body.")
+    else:
+        form = None
+    return form.dict() | {'tags': form.getlist('tags')} if form else {}
+
+
+def _save_task(request, data, task=None, partial=False):
+    if partial:
+        # Fields that are not sent keep their current values
+        current = model_to_dict(task, fields=['title', 'priority', 'status', 'description', 'due_date', 'project'])
+        current['tags'] = [tag.id for tag in task.tags.all()]
+        data = current | data
+
+    form = TaskForm(data, instance=task, user=request.user)
+    if not form.is_valid():
+        return None, _json({'errors': form.errors.get_json_data()}, status=400)
+
+    if task is not None:
+        try:
+            return form.save_changes(), None
+        except TaskConflict as exc:
+            return None, _json({'error': "The task was changed since the submitted version.",
+                                'version': exc.version}, status=409)
+
+    # The task and its tag links are written together or not at all
+    with transaction.atomic():
+        task = form.save(commit=False)
+        task.user = request.user
+        task.save()
+        form.save_m2m()
+    return task, None
+
+
+@api_view("GET", "POST")
+def task_list(request):
+    '''Lists the user's tasks and their projects' newest first (keyset paginated), or creates a task.
+
+    Archived tasks are only listed with archived=1.
+    '''
+    if request.method == "POST":
+        task, errors = _save_task(request, _request_data(request))
+        if errors:
+            return errors
+        return _json(task_to_dict(task, DEFAULT_FIELDS), status=201)
+
+    fields = _requested_fields(request)
+    # The board version moves on every change to the user's tasks, so the ETag
+    # is computed without touching the task table
+    query_hash = hashlib.md5(request.GET.urlencode().encode(), usedforsecurity=False).hexdigest()[:12]
+    etag = f"tasks-{request.user.id}-{board_version(request.user.id)}-{query_hash}"
+
+    def build():
+        tasks = _prefetched(Task.objects.all(), fields)
+        tasks = tasks.archived() if request.GET.get('archived') == '1' else tasks.live()
+        if request.GET.get('status'):
+            tasks = tasks.filter(status=request.GET['status'])
+        try:
+            page_size = min(max(int(request.GET.get('page_size', 50)), 1), MAX_PAGE_SIZE)
+            tasks, next_cursor = paginate(tasks, request.GET.get('cursor'), page_size, request.user)
+        except (InvalidCursor, ValueError) as exc:
+            raise BadRequest(str(exc))
+        return _json({
+            'results': [task_to_dict(task, fields) for task in tasks],
+            'next_cursor': next_cursor,
+        })
+
+    return _conditional(request, etag, build)
+
+
+@api_view("GET", "PUT", "PATCH", "DELETE")
+def task_detail(request, task_id):
+    '''Reads, replaces, partially updates or deletes a task; project viewers may only read.'''
+    if request.method == "GET":
+        fields = _requested_fields(request)
+        # Validated against the board version first, so a 304 costs no query
+        etag = f"task-{task_id}-{board_version(request.user.id)}-{','.join(fields)}"
+
+        def build():
+            task = _get_task(request, task_id, fields)
+            if task is None:
+                return _error("Task not found.", 404)
+            response = _json(task_to_dict(task, fields))
+            response['Last-Modified'] = http_date(task.updated_at.timestamp())
+            return response
+
+        return _conditional(request, etag, build)
+
+    # Tasks the user may only see are not found for writes, without a second query
+    task = _get_task(request, task_id, editable=True)
+    if task is None:
+        return _error("Task not found.", 404)
+
+    if request.method == "DELETE":
+        soft_delete_tasks(Task.objects.filter(id=task.id))
+        return HttpResponse(status=204)
+
+    task, errors = _save_task(request, _request_data(request), task, partial=request.method == "PATCH")
+    if errors:
+        return errors
+    saved = _get_task(request, task.id)
+    if saved is None:
+        # Saved, but moved out of the user's view: a project owner made it its creator's private task
+        return HttpResponse(status=204)
+    return _json(task_to_dict(saved, DEFAULT_FIELDS))
+
+
+@api_view("GET")
+def tag_list(request):
+    '''Lists the shared tags and the user's own, by name, served from the tag catalog.
+
+    With q, only the tags starting with it (ignoring case) are listed, at most
+    `limit` of them: the autocomplete of tag inputs.
+    '''
+    prefix = request.GET.get('q')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_COMPLETIONS)
+    except ValueError:
+        raise BadRequest("limit must be a number.")
+    query_hash = hashlib.md5(request.GET.urlencode().encode(), usedforsecurity=False).hexdigest()[:12]
+    etag = f"tags-{tag_catalog_version(request.user.id)}-{query_hash}"
+
+    def build():
+        tags = complete_tags(request.user.id, prefix, limit) if prefix else tag_catalog(request.user.id)
+        return _json([{'id': tag.id, 'name': tag.name} for tag in tags])
+
+    return _conditional(request, etag, build)
@@ -0,0 +1,49 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .bulk import purge_tasks
+from .cache import bump_board_version, bump_project_version
+from .events import publish_board_changed, publish_projects_changed
+from .models import Task
+
+# Finished tasks untouched for this long leave the board
+ARCHIVE_AFTER = timedelta(days=30)
+
+# Soft-deleted tasks are kept this long before being purged
+PURGE_AFTER = timedelta(days=30)
+
+# Tasks archived or purged per transaction
+BATCH_SIZE = 1000
+
+
+def archive_finished_tasks(before, batch_size=BATCH_SIZE):
+    '''Archives live finished tasks last updated before `before`, one batch per transaction.
+
+    Yields the number of tasks archived by each batch. Archived tasks keep
+    counting in the statistics; they only leave the board.
+    '''
+    archivable = Task.objects.live().filter(status__in=Task.FINISHED_STATUSES, updated_at__lt=before)
+    while True:
+        with transaction.atomic():
+            batch = list(archivable.values_list('id', 'user_id', 'project_id')[:batch_size])
+            if not batch:
+                return
+            # update() leaves updated_at alone, so "show older" pages keep their order
+            Task.objects.filter(id__in=[task_id for task_id, _, _ in batch]).update(archived_at=timezone.now())
+            user_ids = {user_id for _, user_id, _ in batch}
+            project_ids = {project_id for _, _, project_id in batch}
+            bump_board_version(*user_ids)
+            bump_project_version(*project_ids)
+            publish_board_changed(*user_ids)
+            publish_projects_changed(*project_ids)
+        yield len(batch)
+
+
+def purge_deleted_tasks(before, batch_size=BATCH_SIZE):
+    '''Permanently deletes tasks soft-deleted before `before`; yields the size of each batch.'''
+    deleted = Task.all_objects.filter(deleted_at__lt=before)
+    while True:
+        purged = purge_tasks(Task.all_objects.filter(id__in=list(deleted.values_list('id', flat=True)[:batch_size])))
+        if not purged:
+            return
+        yield purged
@@ -0,0 +1,274 @@
+import http.client
+import statistics
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from .metrics import registry
+from .models import Project, ProjectMembership, Task
+
+# Routes of tasks/urls.py the suite does not drive, with the reason
+SKIPPED_ROUTES = {
+    'task_events': "a server-sent event stream stays open; covered by LiveEventTests",
+    'metrics_report': "staff-only monitoring endpoint",
+    'metrics_prometheus': "monitoring endpoint",
+    'demo_login': "signs the benchmark client in as a new demo user",
+}
+
+# Default slowdown (as a fraction of the baseline) reported as a regression
+THRESHOLD = 0.25
+
+# Timing differences below this many milliseconds are noise, never regressions
+MIN_REGRESSION_MS = 2.0
+
+
+class BenchmarkError(RuntimeError):
+    '''Raised when a scenario request does not answer with the expected status.'''
+
+
+class Scenario:
+    '''One request of the suite.
+
+    `setup(user)` runs before each timed request and returns the fixture the
+    path and data are built from; `teardown(fixture)` cleans up after it.
+    Neither is timed or counted.
+    '''
+
+    def __init__(self, name, method="GET", label=None, path=None, params=None, data=None,
+                 url_kwargs=None, setup=None, teardown=None, status=200):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.label = label or (name if method == "GET" else f"{name}:{method.lower()}")
+        self.params = params
+        self.data = data
+        self.url_kwargs = url_kwargs
+        self.setup = setup
+        self.teardown = teardown
+        self.status = status
+
+    def prepare(self, user):
+        fixture = self.setup(user) if self.setup else {'user': user}
+        path = self.path or reverse(self.name, kwargs=self.url_kwargs(fixture) if self.url_kwargs else None)
+        if self.params:
+            path += "?" + urlencode(self.params(fixture))
+        data = self.data(fixture) if self.data else None
+        return fixture, path, data
+
+    def cleanup(self, fixture):
+        if self.teardown:
+            self.teardown(fixture)
+
+
+def _latest_task(user):
+    return {'user': user, 'task_id': Task.objects.filter(user=user).latest('updated_at').id}
+
+
+def _new_tasks(count):
+    def setup(user):
+        # Saved one by one so the statistics counters and board caches stay right
+        tasks = [Task.objects.create(user=user, title=f"Benchmark {i}") for i in range(count)]
+        return {'user': user, 'task_id': tasks[0].id, 'task_ids': [task.id for task in tasks]}
+    return setup
+
+
+def _delete_tasks(fixture):
+    Task.all_objects.filter(id__in=fixture['task_ids']).delete()
+
+
+def _delete_created(fixture):
+    Task.objects.filter(user=fixture['user'], title="Benchmark created").delete()
+
+
+def _new_project(user):
+    project = Project.objects.create(name="Benchmark project")
+    ProjectMembership.objects.create(project=project, user=user, role=ProjectMembership.OWNER)
+    return {'user': user, 'project_id': project.id}
+
+
+def _delete_project(fixture):
+    Project.objects.filter(id=fixture['project_id']).delete()
+
+
+def _task_id(fixture):
+    return {'task_id': fixture['task_id']}
+
+
+SCENARIOS = [
+    Scenario('welcome'),
+    Scenario('home'),
+    Scenario('home', label='home:tag', params=lambda f: {'tag': "Work"}),
+    Scenario('tasks'),
+    Scenario('task_page', params=lambda f: {'status': "Pending"}),
+    Scenario('task_search', params=lambda f: {'q': "report"}),
+    Scenario('profile'),
+    Scenario('edit_profile'),
+    Scenario('register'),
+    # reverse('login') finds the accounts/ login view registered under the same name
+    Scenario('login', path="/login/"),
+    Scenario('task_create'),
+    Scenario('task_create', method="POST", status=302,
+             data=lambda f: {'title': "Benchmark created", 'priority': "Low", 'status': "Pending"},
+             teardown=_delete_created),
+    Scenario('task_update', setup=_latest_task, url_kwargs=_task_id),
+    Scenario('task_update', method="POST", status=302, setup=_new_tasks(1), url_kwargs=_task_id,
+             data=lambda f: {'title': "Benchmark updated", 'priority': "High", 'status': "In progress"},
+             teardown=_delete_tasks),
+    Scenario('task_delete', status=302, setup=_new_tasks(1), url_kwargs=_task_id, teardown=_delete_tasks),
+    Scenario('task_bulk', method="POST", setup=_new_tasks(20), teardown=_delete_tasks,
+             data=lambda f: {'action': "status", 'status': "In progress", 'task_ids': f['task_ids']}),
+    Scenario('task_export', params=lambda f: {'format': "csv"}),
+    Scenario('project_list'),
+    Scenario('project_detail', setup=_new_project, url_kwargs=lambda f: {'project_id': f['project_id']},
+             teardown=_delete_project),
+    Scenario('api_task_list'),
+    Scenario('api_task_detail', setup=_latest_task, url_kwargs=_task_id),
+    Scenario('api_tag_list'),
+    Scenario('api_tag_list', label='api_tag_list:complete', params=lambda f: {'q': "wo"}),
+]
+
+
+class ClientTransport:
+    '''Sends the requests through the Django test client, in this thread.'''
+
+    name = "client"
+
+    def __init__(self, user, host="localhost"):
+        self.client = Client(SERVER_NAME=host)
+        self.client.force_login(user)
+
+    def request(self, method, path, data):
+        if method == "GET":
+            response = self.client.get(path)
+        else:
+            response = self.client.generic(method, path, urlencode(data or {}, doseq=True),
+                                           content_type="application/x-www-form-urlencoded")
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, len(body)
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGITransport:
+    '''Sends real HTTP requests to a wsgiref server running the project in a thread of this process.'''
+
+    name = "wsgi"
+
+    def __init__(self, user, host="127.0.0.1"):
+        self.server = make_server(host, 0, get_wsgi_application(), WSGIServer, _QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        # Reuse a test client login for the session cookie
+        client = Client(SERVER_NAME="localhost")
+        client.force_login(user)
+        csrf_token = get_random_string(32)
+        self.headers = {
+            'Cookie': f"sessionid={client.cookies['sessionid'].value}; csrftoken={csrf_token}",
+            'X-CSRFToken': csrf_token,
+            'Content-Type': "application/x-www-form-urlencoded",
+        }
+
+    def request(self, method, path, data):
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            connection.request(method, path, urlencode(data or {}, doseq=True), self.headers)
+            response = connection.getresponse()
+            return response.status, len(response.read())
+        finally:
+            connection.close()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def measure(transport, scenario, user, iterations, warmup=1):
+    '''Runs one scenario and returns its p50/p95 latency, mean queries and peak memory.'''
+    def run():
+        fixture, path, data = scenario.prepare(user)
+        try:
+            started = time.perf_counter()
+            status, _ = transport.request(scenario.method, path, data)
+            elapsed = time.perf_counter() - started
+        finally:
+            scenario.cleanup(fixture)
+        if status != scenario.status:
+            raise BenchmarkError(f"{scenario.label}: expected status {scenario.status}, got {status}")
+        return elapsed
+
+    for _ in range(warmup):
+        run()
+    # Query counts come from the request metrics middleware, which sees both transports
+    registry.reset()
+    timings = [run() for _ in range(iterations)]
+    report = next((row for row in registry.report() if row['view'] == scenario.name), None)
+
+    # tracemalloc slows everything down, so memory is measured on a separate request
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+        'queries': round(report['db_queries']['mean'], 2) if report else 0,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_suite(user, transports, iterations, scenarios=SCENARIOS, progress=None):
+    '''Returns {transport name: {scenario label: figures}} for every scenario.'''
+    results = {}
+    for transport_class in transports:
+        transport = transport_class(user)
+        try:
+            for scenario in scenarios:
+                figures = measure(transport, scenario, user, iterations)
+                results.setdefault(transport.name, {})[scenario.label] = figures
+                if progress:
+                    progress(transport.name, scenario.label, figures)
+        finally:
+            transport.close()
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    '''Returns a message for every figure that regressed past the baseline.
+
+    Latency and memory regress when they grow by more than `threshold` (and,
+    for latency, by more than MIN_REGRESSION_MS); query counts are
+    deterministic, so any increase is a regression.
+    '''
+    regressions = []
+    for transport, scenarios in baseline.items():
+        for label, before in scenarios.items():
+            after = results.get(transport, {}).get(label)
+            if after is None:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if after[key] > before[key] * (1 + threshold) and after[key] - before[key] > MIN_REGRESSION_MS:
+                    regressions.append(f"{transport} {label}: {key} {before[key]} -> {after[key]}")
+            if after['queries'] > before['queries']:
+                regressions.append(f"{transport} {label}: queries {before['queries']} -> {after['queries']}")
+            if after['peak_kib'] > before['peak_kib'] * (1 + threshold):
+                regressions.append(f"{transport} {label}: peak_kib {before['peak_kib']} -> {after['peak_kib']}")
+    return regressions
@@ -0,0 +1,87 @@
+import hashlib
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import get_template, render_to_string
+from .cache import cached_cards
+from .models import Task
+from .pagination import encode_cursor
+
+# Maximum number of cards rendered per status column
+COLUMN_LIMIT = 50
+
+# (status, header label, css class, empty message) in board order
+BOARD_COLUMNS = [
+    ("Pending", "Pending", "pending", "No pending tasks."),
+    ("In progress", "In Progress", "in-progress", "No tasks in progress."),
+    ("Canceled", "Canceled", "canceled", "No canceled tasks."),
+    ("Completed", "Completed", "completed", "No completed tasks."),
+]
+
+
+def load_board(user, limit=COLUMN_LIMIT):
+    '''Loads the user's board, their projects' tasks included, with one task query (plus one for tags).
+
+    Each column is capped at `limit` cards; the window annotations keep the
+    cap and the per-column total inside the same query.
+    '''
+    tasks = (
+        Task.objects.live().visible_in_order(user)
+        .annotate(
+            column_position=Window(
+                RowNumber(),
+                partition_by=F('status'),
+                order_by=[F('updated_at').desc(), F('id').desc()],
+            ),
+            column_total=Window(Count('id'), partition_by=F('status')),
+        )
+        .filter(column_position__lte=limit)
+        .order_by('status', 'column_position')
+        .select_related('project')
+        .prefetch_related('tags')
+    )
+
+    grouped = {status: [] for status, *_ in BOARD_COLUMNS}
+    totals = {}
+    for task in tasks:
+        grouped.setdefault(task.status, []).append(task)
+        totals[task.status] = task.column_total
+
+    return [
+        {
+            'status': status,
+            'label': label,
+            'css_class': css_class,
+            'empty_message': empty_message,
+            'tasks': grouped[status],
+            'total': totals.get(status, 0),
+            'has_more': totals.get(status, 0) > len(grouped[status]),
+            # Where the "load more" request for this column picks up
+            'next_cursor': encode_cursor(grouped[status][-1]) if grouped[status] else None,
+            # Finished columns page through their archived tasks on demand
+            'has_archive': status in Task.FINISHED_STATUSES,
+        }
+        for status, label, css_class, empty_message in BOARD_COLUMNS
+    ]
+
+
+def card_key(task):
+    '''Identifies what the card of `task` shows: the task as last saved and the names of its tags and project.'''
+    # Tags and projects are renamed without saving the task
+    names = [tag.name for tag in task.tags.all()] + [task.project.name if task.project else ""]
+    digest = hashlib.md5("\n".join(names).encode(), usedforsecurity=False).hexdigest()[:16]
+    return f"{task.id}:{task.version}:{task.updated_at.timestamp()}:{digest}"
+
+
+def render_board(user, limit=COLUMN_LIMIT):
+    '''Renders the status columns of the user's board.
+
+    Every task card is a cached fragment of its own, so when one task changes
+    only its card is rendered again, not the whole board.
+    '''
+    columns = load_board(user, limit)
+    tasks = [task for column in columns for task in column['tasks']]
+    template = get_template('task_card.html')
+    cards = cached_cards(tasks, card_key, lambda task: template.render({'task': task}))
+    for task, card in zip(tasks, cards):
+        task.card = card
+    return render_to_string('board_columns.html', {'columns': columns})
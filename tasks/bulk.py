@@ -0,0 +1,149 @@
+import time
+from collections import Counter, defaultdict
+from django.db import models, transaction
+from django.db.models import F, ProtectedError
+from django.utils import timezone
+from .cache import bump_board_version, bump_project_version
+from .events import publish_board_changed, publish_projects_changed, publish_task_event
+from .models import Task
+from .stats import apply_deltas, status_priority_delta, tag_delta
+
+
+def apply_bulk_action(user, action, task_ids, status=None, priority=None, tags=()):
+    '''Applies one action to the tasks among `task_ids` the user may edit, in a single transaction.
+
+    Ids of other tasks are ignored. Returns a summary with the number of
+    matched and affected tasks and the time spent in milliseconds.
+    '''
+    started = time.perf_counter()
+    through = Task.tags.through
+
+    with transaction.atomic():
+        rows = list(
+            Task.objects.editable_by(user).filter(id__in=task_ids)
+            .values_list('id', 'user_id', 'project_id', 'status', 'priority')
+        )
+        matched = [row[0] for row in rows]
+        owners = {task_id: owner_id for task_id, owner_id, *_ in rows}
+        # Re-filter on the editable ids so every statement below is a primary key lookup
+        tasks = Task.objects.filter(id__in=matched)
+        now = timezone.now()
+        # Edits based on the versions before this action get a conflict
+        version = F('version') + 1
+        # Counter changes per task owner, from the rows read above instead of a recount
+        deltas = defaultdict(Counter)
+
+        if action == "status":
+            reopened = {} if status in Task.FINISHED_STATUSES else {'archived_at': None}
+            affected = tasks.update(status=status, updated_at=now, version=version, **reopened)
+            for _, owner_id, _, old_status, old_priority in rows:
+                deltas[owner_id].update(status_priority_delta((old_status, old_priority), (status, old_priority)))
+        elif action == "priority":
+            affected = tasks.update(priority=priority, updated_at=now, version=version)
+            for _, owner_id, _, old_status, old_priority in rows:
+                deltas[owner_id].update(status_priority_delta((old_status, old_priority), (old_status, priority)))
+        elif action == "add_tags":
+            existing = set(through.objects.filter(task_id__in=matched, tag__in=tags).values_list('task_id', 'tag_id'))
+            # Links that already exist are skipped by the unique (task, tag) constraint
+            through.objects.bulk_create(
+                [through(task_id=task_id, tag_id=tag.id) for task_id in matched for tag in tags],
+                ignore_conflicts=True,
+            )
+            for task_id in matched:
+                deltas[owners[task_id]].update(
+                    tag_delta([tag.id for tag in tags if (task_id, tag.id) not in existing], 1)
+                )
+            affected = tasks.update(updated_at=now, version=version)
+        elif action == "remove_tags":
+            links = through.objects.filter(task_id__in=matched, tag__in=tags)
+            for task_id, tag_id in links.values_list('task_id', 'tag_id'):
+                deltas[owners[task_id]].update(tag_delta([tag_id], -1))
+            links.delete()
+            affected = tasks.update(updated_at=now, version=version)
+        elif action == "delete":
+            affected = soft_delete_tasks(tasks)
+        else:
+            raise ValueError(f"Unknown bulk action: {action!r}")
+
+        for owner_id, owner_deltas in deltas.items():
+            apply_deltas(owner_id, owner_deltas)
+
+    # update() and bulk_create() send no signals; project tasks count for the members who created them
+    user_ids = {user.id} | set(owners.values())
+    project_ids = {project_id for _, _, project_id, *_ in rows if project_id}
+    bump_board_version(*user_ids)
+    bump_project_version(*project_ids)
+    publish_board_changed(*user_ids)
+    publish_projects_changed(*project_ids)
+
+    return {
+        'action': action,
+        'matched': len(matched),
+        'affected': affected,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def purge_tasks(tasks):
+    '''Deletes the tasks of a queryset with one DELETE per table, returning how many were deleted.
+
+    Unlike QuerySet.delete(), only ids are read and no delete signals are sent,
+    so callers must drop the owners' counters and caches themselves. Tag links
+    are deleted first, and the rows of models referencing Task are handled as
+    their on_delete says; ProtectedError is raised for protected rows. Callers
+    pass batches: the ids are read once, so deleting the links cannot change them.
+    '''
+    with transaction.atomic():
+        task_ids = list(tasks.values_list('id', flat=True))
+        if not task_ids:
+            return 0
+        Task.tags.through.objects.filter(task_id__in=task_ids).delete()
+        for relation in Task._meta.related_objects:
+            name = relation.field.name
+            label = f"{relation.related_model.__name__}.{name}"
+            related = relation.related_model._base_manager.filter(**{f"{name}__in": task_ids})
+            if relation.on_delete is models.CASCADE:
+                related.delete()
+            elif relation.on_delete is models.SET_NULL:
+                related.update(**{name: None})
+            elif relation.on_delete in (models.PROTECT, models.RESTRICT):
+                protected = set(related)
+                if protected:
+                    raise ProtectedError(f"Cannot purge tasks referenced through {label}", protected)
+            elif relation.on_delete is not models.DO_NOTHING:
+                raise ValueError(f"purge_tasks() does not handle the on_delete of {label}")
+        # _raw_delete() issues a plain DELETE ... WHERE, without the collector
+        return Task._base_manager.filter(id__in=task_ids)._raw_delete(tasks.db)
+
+
+def soft_delete_tasks(tasks):
+    '''Marks the tasks of a queryset deleted and returns how many were.
+
+    The rows stay until archive.purge_deleted_tasks() removes them, but they leave every
+    listing and the statistics counters at once.
+    '''
+    with transaction.atomic():
+        rows = list(tasks.values('id', 'user_id', 'project_id', 'status', 'priority'))
+        task_ids = [row['id'] for row in rows]
+        if not task_ids:
+            return 0
+        Task.objects.filter(id__in=task_ids).update(deleted_at=timezone.now())
+
+        deltas = defaultdict(Counter)
+        for row in rows:
+            deltas[row['user_id']].update(status_priority_delta((row['status'], row['priority']), None))
+        links = Task.tags.through.objects.filter(task_id__in=task_ids).values_list('task__user_id', 'tag_id')
+        for user_id, tag_id in links:
+            deltas[user_id].update(tag_delta([tag_id], -1))
+        for user_id, user_deltas in deltas.items():
+            apply_deltas(user_id, user_deltas)
+
+    # update() sends no signals
+    bump_board_version(*(row['user_id'] for row in rows))
+    bump_project_version(*(row['project_id'] for row in rows))
+    if len(rows) == 1:
+        publish_task_event(rows[0]['user_id'], rows[0]['project_id'], {'type': "task.deleted", 'id': rows[0]['id']})
+    else:
+        publish_board_changed(*(row['user_id'] for row in rows))
+        publish_projects_changed(*(row['project_id'] for row in rows))
+    return len(rows)
@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from django.core.cache import cache, caches
+from django.db.models import Q
+from django.utils.safestring import mark_safe
+from .models import ProjectMembership, Tag
+
+# Rendered fragments are dropped by version bumps, the timeout only bounds memory
+FRAGMENT_TIMEOUT = 60 * 60
+
+# Process-wide hit/miss counters for the fragment cache
+CACHE_STATS = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _shared():
+    '''Returns the cache seen by every process, which holds the versions and the memberships.
+
+    A management command bumping a version in a process-local cache would
+    leave the web workers serving stale fragments and ETags.
+    '''
+    return caches['shared']
+
+
+def _current_version(key):
+    '''Returns the version stored under `key`, starting a new one if needed.'''
+    shared = _shared()
+    version = shared.get(key)
+    if version is None:
+        # Start from the clock so an expired or evicted version is never reused
+        shared.add(key, time.time_ns())
+        version = shared.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        _shared().incr(key)
+    except ValueError:  # No version stored yet, nothing cached to invalidate
+        pass
+
+
+def _version_key(user_id):
+    return f"board-version:{user_id}"
+
+
+def _project_version_key(project_id):
+    return f"project-version:{project_id}"
+
+
+def board_version(user_id):
+    '''Returns the current version of a user's board: their own version and those of their projects.
+
+    A change to a project's tasks bumps one project version, not the board
+    version of each of its members.
+    '''
+    version = _current_version(_version_key(user_id))
+    project_ids = member_project_ids(user_id)
+    if not project_ids:
+        return version
+    keys = [_project_version_key(project_id) for project_id in project_ids]
+    stored = _shared().get_many(keys)
+    versions = [stored.get(key) or _current_version(key) for key in keys]
+    digest = hashlib.md5(repr((project_ids, versions)).encode(), usedforsecurity=False).hexdigest()[:16]
+    return f"{version}-{digest}"
+
+
+def bump_board_version(*user_ids):
+    '''Invalidates every cached fragment of the given users.'''
+    for user_id in set(user_ids):
+        _bump_version(_version_key(user_id))
+
+
+def bump_project_version(*project_ids):
+    '''Invalidates every cached fragment showing tasks of the given projects, for all their members.'''
+    for project_id in set(project_ids) - {None}:
+        _bump_version(_project_version_key(project_id))
+
+
+def _member_projects_key(user_id):
+    return f"member-projects:{user_id}"
+
+
+def _project_members_key(project_id):
+    return f"project-members:{project_id}"
+
+
+def member_project_ids(user_id):
+    '''Returns the ids of the projects `user_id` is a member of, cached until their memberships change.'''
+    key = _member_projects_key(user_id)
+    project_ids = _shared().get(key)
+    if project_ids is None:
+        project_ids = sorted(ProjectMembership.objects.filter(user_id=user_id).values_list('project_id', flat=True))
+        _shared().set(key, project_ids, FRAGMENT_TIMEOUT)
+    return project_ids
+
+
+def project_member_ids(project_id):
+    '''Returns the ids of the members of a project, cached until its memberships change.'''
+    key = _project_members_key(project_id)
+    user_ids = _shared().get(key)
+    if user_ids is None:
+        user_ids = sorted(ProjectMembership.objects.filter(project_id=project_id).values_list('user_id', flat=True))
+        _shared().set(key, user_ids, FRAGMENT_TIMEOUT)
+    return user_ids
+
+
+def forget_membership(user_id, project_id):
+    '''Drops the cached memberships of a user and a project after the user joined, left or changed role.'''
+    _shared().delete_many([_member_projects_key(user_id), _project_members_key(project_id)])
+
+
+def _count(outcome):
+    with _stats_lock:
+        CACHE_STATS[outcome] += 1
+
+
+def cached_fragment(user_id, name, render):
+    '''Returns the cached HTML fragment `name` of a user's board, rendering it on a miss.'''
+    key = f"board:{user_id}:{board_version(user_id)}:{name}"
+    html = cache.get(key)
+    if html is not None:
+        _count('hits')
+        return mark_safe(html)
+
+    _count('misses')
+    html = render()
+    cache.set(key, str(html), FRAGMENT_TIMEOUT)
+    return mark_safe(html)
+
+
+def cached_cards(items, key, render):
+    '''Returns the HTML card of each of `items`, rendering only the cards missing from the cache.
+
+    `key(item)` must change whenever the card would, so cards are never
+    invalidated, only left to expire. The lookups cost one get_many and one
+    set_many, however many cards there are.
+    '''
+    keys = [f"card:{key(item)}" for item in items]
+    cached = cache.get_many(keys)
+    rendered = {}
+    cards = []
+    for key, item in zip(keys, items):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = str(render(item))
+        cards.append(mark_safe(html))
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+    return cards
+
+
+def forget_cards(items, key):
+    '''Drops the cached cards of `items`, which cached_cards() then renders again.'''
+    cache.delete_many([f"card:{key(item)}" for item in items])
+
+
+def cache_stats():
+    '''Returns a snapshot of the hit/miss counters and the hit ratio.'''
+    with _stats_lock:
+        stats = dict(CACHE_STATS)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+# Process-local tag catalogs, one per user (the shared tags plus the user's own),
+# reloaded when either version moves on; only the most recently used are kept
+TAG_CATALOG_VERSION_KEY = "tag-catalog-version"
+TAG_CATALOGS_KEPT = 512
+_tag_catalogs = OrderedDict()
+_tag_catalog_lock = threading.Lock()
+
+
+def _tag_catalog_version_key(user_id):
+    return TAG_CATALOG_VERSION_KEY if user_id is None else f"{TAG_CATALOG_VERSION_KEY}:{user_id}"
+
+
+def tag_catalog_version(user_id=None):
+    '''Returns the current version of the shared tags, or of every tag visible to `user_id`.'''
+    shared = _current_version(TAG_CATALOG_VERSION_KEY)
+    if user_id is None:
+        return shared
+    return f"{shared}.{_current_version(_tag_catalog_version_key(user_id))}"
+
+
+def _tag_index(user_id):
+    '''Returns (version, casefolded names, tags) of the tags visible to `user_id`, sorted by name.'''
+    # Read the version before loading, so a change during the load is picked up next time
+    version = tag_catalog_version(user_id)
+    with _tag_catalog_lock:
+        index = _tag_catalogs.get(user_id)
+        if index is None or index[0] != version:
+            tags = sorted(
+                Tag.objects.filter(Q(user__isnull=True) | Q(user=user_id)),
+                key=lambda tag: (tag.name.casefold(), tag.id),
+            )
+            index = _tag_catalogs[user_id] = (version, [tag.name.casefold() for tag in tags], tuple(tags))
+            if len(_tag_catalogs) > TAG_CATALOGS_KEPT:
+                _tag_catalogs.popitem(last=False)
+        _tag_catalogs.move_to_end(user_id)
+        return index
+
+
+def tag_catalog(user_id=None):
+    '''Returns the shared tags and those of `user_id`, by name, from memory while the catalog is current.'''
+    return _tag_index(user_id)[2]
+
+
+def complete_tags(user_id, prefix, limit=10):
+    '''Returns up to `limit` tags visible to `user_id` whose name starts with `prefix`, ignoring case.
+
+    A binary search over the sorted catalog finds the first match, so no query
+    and no scan over the whole catalog is needed.
+    '''
+    _, names, tags = _tag_index(user_id)
+    prefix = prefix.casefold()
+    start = end = bisect_left(names, prefix)
+    while end < len(names) and end - start < limit and names[end].startswith(prefix):
+        end += 1
+    return list(tags[start:end])
+
+
+def invalidate_tag_catalog(user_id=None):
+    '''Makes every process reload the catalogs showing the shared tags, or the tags of `user_id`.'''
+    _bump_version(_tag_catalog_version_key(user_id))
@@ -1,27 +1,20 @@
-from django.utils import timezone
-from datetime import datetime
+import time
 
 def demo_session_timer(request):
     '''This context processor is used to display the time remaining for the demo session.'''
-    
-    if request.session.get("is_demo", False):
-        # Get the expiry time from the session
-        expiry_time_str = request.session.get("expiry_time")
-        
-        if expiry_time_str:
-            expiry_time = datetime.fromisoformat(expiry_time_str)
 
-            # Calculate the time remaining for the demo session
-            time_remaining_seconds = int((expiry_time - timezone.now()).total_seconds())
-            
-            # Calculate the minutes and seconds
-            if time_remaining_seconds > 0:
-                minutes = time_remaining_seconds // 60
-                seconds = time_remaining_seconds % 60
+    session = getattr(request, "session", None)
+    if session is None or not session.get("is_demo", False):
+        return {}
 
-                return {
-                    'time_remaining_minutes': minutes,
-                    'time_remaining_seconds': seconds,
-                }
+    # Unix timestamp of the end of the demo, set by demo.start_demo_session()
+    expires_at = session.get("demo_expires_at")
+    if expires_at:
+        time_remaining_seconds = int(expires_at - time.time())
+        if time_remaining_seconds > 0:
+            return {
+                'time_remaining_minutes': time_remaining_seconds // 60,
+                'time_remaining_seconds': time_remaining_seconds % 60,
+            }
 
-    return {}
\ No newline at end of file
+    return {}
@@ -0,0 +1,109 @@
+import random
+import time
+from datetime import timedelta
+from importlib import import_module
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from .bulk import purge_tasks
+from .cache import bump_board_version, bump_project_version, forget_membership
+from .events import publish_board_changed, publish_projects_changed
+from .importer import import_batch
+from .models import DemoAccount, ProjectMembership, Tag, Task, TaskCounter
+from .seeding import seed_rows, tag_names
+
+# How long a demo account (and its session) lives
+DEMO_LIFETIME = timedelta(minutes=30)
+
+# Tasks seeded into each demo account
+DEMO_TASKS = 25
+
+# Demo accounts one client address may create per hour
+DEMO_RATE_LIMIT = 5
+
+# Expired demo accounts deleted per transaction by the reaper
+PURGE_BATCH_SIZE = 200
+
+
+def demo_allowed(address):
+    '''Counts a demo sign-up from `address`; False once it exceeds DEMO_RATE_LIMIT this hour.'''
+    key = f"demo-signups:{address}"
+    cache.add(key, 0, timeout=3600)
+    try:
+        return cache.incr(key) <= DEMO_RATE_LIMIT
+    except ValueError:  # Expired between add() and incr()
+        cache.set(key, 1, timeout=3600)
+        return True
+
+
+def create_demo_account():
+    '''Creates a demo user with a password-less login and a set of sample tasks.'''
+    username = f"demo-{get_random_string(12).lower()}"
+    with transaction.atomic():
+        user = User.objects.create_user(username=username)  # Unusable password
+        account = DemoAccount.objects.create(user=user, expires_at=timezone.now() + DEMO_LIFETIME)
+        # Rows without a username go to the default user, which spares looking the new user up
+        import_batch(list(seed_rows(random.Random(), [None], [DEMO_TASKS], tag_names(8))), default_user=user)
+    return account
+
+
+def start_demo_session(request, account):
+    '''Logs the demo user in with a session that ends when the account expires.'''
+    login(request, account.user, backend='django.contrib.auth.backends.ModelBackend')
+    request.session['is_demo'] = True
+    # Stored as a Unix timestamp so the header timer needs no date parsing
+    request.session['demo_expires_at'] = int(account.expires_at.timestamp())
+    request.session.set_expiry(max(int(account.expires_at.timestamp() - time.time()), 1))
+
+
+def purge_expired_demos(now=None, batch_size=PURGE_BATCH_SIZE):
+    '''Deletes expired demo users with their tasks, a batch of users per transaction.
+
+    Each batch costs a fixed number of bulk DELETE statements, however many
+    tasks the users own. Returns the number of users deleted.
+    '''
+    now = now or timezone.now()
+    purged = 0
+    while True:
+        user_ids = list(
+            DemoAccount.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('user_id', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            break
+        with transaction.atomic():
+            purge_tasks(Task.all_objects.filter(user_id__in=user_ids))
+            TaskCounter.objects.filter(user_id__in=user_ids).delete()
+            # Tags and memberships have delete signals, so the collector would load
+            # and signal them one row at a time; their caches are dropped below instead
+            memberships = ProjectMembership.objects.filter(user_id__in=user_ids)
+            member_of = list(memberships.values_list('user_id', 'project_id'))
+            memberships._raw_delete(memberships.db)
+            tag_ids = list(Tag.objects.filter(user_id__in=user_ids).values_list('id', flat=True))
+            # Tags of project members can be on tasks the purge kept
+            links = Task.tags.through.objects.filter(tag_id__in=tag_ids)
+            tagged = list(links.values_list('task__user_id', 'task__project_id').distinct())
+            links.delete()
+            TaskCounter.objects.filter(dimension=TaskCounter.TAG, key__in=[str(tag_id) for tag_id in tag_ids]).delete()
+            tags = Tag.objects.filter(id__in=tag_ids)
+            tags._raw_delete(tags.db)
+            # Nothing left to cascade to but the demo account rows
+            User.objects.filter(id__in=user_ids).delete()
+        purged += len(user_ids)
+
+        for user_id, project_id in member_of:
+            forget_membership(user_id, project_id)
+        # The purged users' project tasks left their projects' boards
+        project_ids = {project_id for _, project_id in member_of} | {project_id for _, project_id in tagged}
+        bump_board_version(*(user_id for user_id, _ in tagged))
+        bump_project_version(*project_ids)
+        publish_board_changed(*(user_id for user_id, _ in tagged))
+        publish_projects_changed(*project_ids)
+
+    # Sessions of the purged users have expired too
+    import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+    return purged
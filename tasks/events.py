@@ -0,0 +1,168 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from .cache import project_member_ids
+
+# Events kept per idle connection before the oldest ones are dropped
+QUEUE_SIZE = 100
+
+# Redis channel carrying the events of every user between processes
+REDIS_CHANNEL = "tasks:events"
+
+
+def _offer(queue, event):
+    '''Adds an event to a subscriber queue, dropping the oldest event when it is full.'''
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class Subscription:
+    '''A user's stream of task events, used as an async context manager.'''
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.loop = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        await self.broker.register(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.unregister(self)
+
+    async def next_event(self, timeout=None):
+        '''Waits for the next event; returns None if `timeout` seconds pass first.'''
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    '''In-process pub/sub: events published from any thread reach this process's subscribers.'''
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        return Subscription(self, user_id)
+
+    async def register(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.user_id].add(subscription)
+
+    def unregister(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def deliver(self, user_id, event):
+        '''Hands an event to the local subscribers of `user_id`.'''
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(_offer, subscription.queue, event)
+            except RuntimeError:  # The subscriber's event loop is closed
+                self.unregister(subscription)
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class RedisBroker(LocalBroker):
+    '''Publishes through a Redis channel so subscribers in every process receive the events.
+
+    Each process runs a single channel listener that fans the events out to its
+    local subscribers, however many connections it holds.
+    '''
+
+    def __init__(self, url):
+        super().__init__()
+        import redis  # Optional dependency, only needed with a Redis URL
+
+        self._url = url
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, user_id, event):
+        self._redis.publish(REDIS_CHANNEL, json.dumps({'user_id': user_id, 'event': event}))
+
+    async def register(self, subscription):
+        await super().register(subscription)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self._url)
+        async with client.pubsub() as pubsub:
+            await pubsub.subscribe(REDIS_CHANNEL)
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    data = json.loads(message['data'])
+                    self.deliver(data['user_id'], data['event'])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    '''Returns the process-wide broker, backed by Redis when TASK_EVENTS_REDIS_URL is set.'''
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = getattr(settings, 'TASK_EVENTS_REDIS_URL', None)
+            _broker = RedisBroker(url) if url else LocalBroker()
+        return _broker
+
+
+def publish_on_commit(user_id, event):
+    '''Publishes an event to a user's subscribers once the current transaction commits.'''
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def publish_board_changed(*user_ids):
+    '''Tells the given users that their board changed in ways not described by single events.'''
+    for user_id in set(user_ids):
+        publish_on_commit(user_id, {'type': 'board.changed'})
+
+
+def task_audience(user_id, project_id):
+    '''Returns the ids of the users a task shows up for: its owner, or every member of its project.'''
+    return project_member_ids(project_id) if project_id else [user_id]
+
+
+def publish_task_event(user_id, project_id, event):
+    '''Publishes an event about one task, owned by `user_id` in `project_id`, to everyone seeing it.'''
+    for recipient in task_audience(user_id, project_id):
+        publish_on_commit(recipient, event)
+
+
+def publish_projects_changed(*project_ids):
+    '''Tells every member of the given projects that their board changed.'''
+    publish_board_changed(*(
+        user_id for project_id in set(project_ids) - {None} for user_id in project_member_ids(project_id)
+    ))
+
+
+def format_sse(event):
+    '''Formats an event as a server-sent events message.'''
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
@@ -0,0 +1,80 @@
+import csv
+import json
+from django.db.models import F
+
+# Tasks fetched per database round trip (and per tag prefetch)
+CHUNK_SIZE = 500
+
+EXPORT_FIELDS = [
+    'id', 'user', 'title', 'priority', 'status', 'description',
+    'due_date', 'created_at', 'updated_at', 'tags',
+]
+
+# Joins tag names in the single CSV tags column
+TAG_SEPARATOR = ";"
+
+EXPORT_FORMATS = {
+    'csv': "text/csv",
+    'jsonl': "application/x-ndjson",
+}
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    '''Yields one dict per task of `queryset`, holding only one chunk of tasks in memory.
+
+    iterator(chunk_size=...) runs the tags prefetch once per chunk, so memory
+    use does not grow with the number of exported tasks.
+    '''
+    tasks = (
+        queryset.annotate(username=F('user__username'))
+        .order_by('id')
+        .prefetch_related('tags')
+        .iterator(chunk_size=chunk_size)
+    )
+    for task in tasks:
+        yield {
+            'id': task.id,
+            'user': task.username,
+            'title': task.title,
+            'priority': task.priority,
+            'status': task.status,
+            'description': task.description,
+            'due_date': _isoformat(task.due_date),
+            'created_at': _isoformat(task.created_at),
+            'updated_at': _isoformat(task.updated_at),
+            'tags': [tag.name for tag in task.tags.all()],
+        }
+
+
+class _Echo:
+    '''File-like object whose write() hands the written line back to csv.writer's caller.'''
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['tags'] = TAG_SEPARATOR.join(row['tags'])
+        yield writer.writerow([row[field] if row[field] is not None else "" for field in EXPORT_FIELDS])
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, separators=(",", ":")) + "\n"
+
+
+def stream_export(queryset, export_format, chunk_size=CHUNK_SIZE):
+    '''Returns an iterator over the lines of the export in `export_format`.'''
+    rows = export_rows(queryset, chunk_size)
+    if export_format == 'csv':
+        return iter_csv(rows)
+    if export_format == 'jsonl':
+        return iter_jsonl(rows)
+    raise ValueError(f"Unknown export format: {export_format!r}")
@@ -1,7 +1,11 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Task, Tag
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms.models import ModelChoiceIterator
+from .cache import tag_catalog
+from .models import Project, ProjectMembership, RecurrenceRule, Task, Tag
 
 class CustomUserCreationForm(UserCreationForm):
     '''Custom form for user registration.'''
@@ -31,21 +35,235 @@ class CustomUserCreationForm(UserCreationForm):
             raise forms.ValidationError("The email is already taken.")
         return email
 
+class TagCatalogIterator(ModelChoiceIterator):
+    '''Iterates over the in-memory tag catalog instead of querying the Tag table.'''
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for tag in self.field.catalog():
+            yield self.choice(tag)
+
+    def __len__(self):
+        return len(self.field.catalog()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.catalog())
+
+class TagCatalogField(forms.ModelMultipleChoiceField):
+    '''Tag choices rendered and validated against the tag catalog, without queries.
+
+    The choices are the shared tags plus those of `user_id`, which the form
+    sets, and the `kept` tags: those already on a project task edited by a
+    member who does not have them.
+    '''
+    iterator = TagCatalogIterator
+    user_id = None
+    kept = ()
+
+    def catalog(self):
+        tags = tag_catalog(self.user_id)
+        known = {tag.pk for tag in tags}
+        kept = [tag for tag in self.kept if tag.pk not in known]
+        return [*tags, *kept] if kept else tags
+
+    def _check_values(self, value):
+        try:
+            value = frozenset(value)
+        except TypeError:
+            raise ValidationError(self.error_messages["invalid_list"], code="invalid_list")
+
+        tags_by_pk = {str(tag.pk): tag for tag in self.catalog()}
+        for pk in value:
+            if str(pk) not in tags_by_pk:
+                raise ValidationError(
+                    self.error_messages["invalid_choice"],
+                    code="invalid_choice",
+                    params={"value": pk},
+                )
+        return [tags_by_pk[str(pk)] for pk in value]
+
+class TaskConflict(Exception):
+    '''Raised when a task was changed by someone else since the version an edit started from.'''
+
+    def __init__(self, version):
+        super().__init__(f"The task is now at version {version}.")
+        self.version = version
+
 class TaskForm(forms.ModelForm):
-    tags = forms.ModelMultipleChoiceField(
+    tags = TagCatalogField(
     queryset=Tag.objects.all(),
     widget=forms.CheckboxSelectMultiple,  # Display the tags as checkboxes
     required=False
     )
+    # The version of the task the edit started from; left empty, the edit always wins
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Task
-        fields = ['title', 'priority', 'status', 'description', 'due_date', 'tags']
+        fields = ['title', 'priority', 'status', 'description', 'due_date', 'project', 'tags']
         widgets = {
             'due_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Offer the tags of the editing user (the task's owner by default); `user` is needed for new tasks
+        user_id = self.user_id = user.id if user else self.instance.user_id
+        self.fields['tags'].user_id = user_id
+        self.fields['tags'].kept = self.initial.get('tags', [])
+        # Tasks can be filed in the projects the user may edit
+        self.fields['project'].queryset = Project.objects.filter(
+            memberships__user_id=user_id, memberships__role__in=ProjectMembership.EDIT_ROLES,
+        ).order_by('name')
+        self.fields['project'].empty_label = "None (private)"
+        if self.instance.pk:
+            self.fields['version'].initial = self.instance.version
+
+    def clean_project(self):
+        '''Only the task's creator or a project owner may take a task out of its project.
+
+        A task taken out of its project becomes its creator's private task, so
+        it would vanish for every other member, the editor included.
+        '''
+        project = self.cleaned_data['project']
+        current = self.instance.project_id if self.instance.pk else None
+        if current is None or project is not None and project.pk == current:
+            return project
+        if self.instance.user_id != self.user_id and not ProjectMembership.objects.filter(
+            project_id=current, user_id=self.user_id, role=ProjectMembership.OWNER,
+        ).exists():
+            raise ValidationError("Only the task's creator or a project owner can move it out of its project.")
+        return project
+
+    def save_changes(self):
+        '''Saves an edit of an existing task, writing only the columns and tag links that changed.
+
+        The task row is locked and its version compared with the submitted one
+        first: TaskConflict is raised when they differ. A save that changes
+        anything moves the version on.
+        '''
+        task = self.instance
+        loaded = getattr(task, '_loaded_values', {})
+        # Compared by column (project_id, not project), so no related row is loaded
+        fields = {name: Task._meta.get_field(name).attname for name in self._meta.fields if name != 'tags'}
+        changed = [
+            name for name, attname in fields.items()
+            if attname not in loaded or getattr(task, attname) != loaded[attname]
+        ]
+        old_tags = {tag.pk for tag in self.initial.get('tags', [])}
+        new_tags = {tag.pk for tag in self.cleaned_data['tags']}
+
+        # No savepoint of its own within the caller's transaction; a conflict is
+        # raised after the block, which has then written nothing
+        with transaction.atomic(savepoint=False):
+            current = Task.objects.select_for_update().filter(id=task.id).values_list('version', flat=True).first()
+            expected = self.cleaned_data.get('version')
+            conflict = current is None or expected is not None and expected != current
+            if not conflict and (changed or old_tags != new_tags):
+                task.version = current + 1
+                task.save(update_fields=[*changed, 'version', 'updated_at'])
+                # The m2m_changed signals keep the tag counters and boards current
+                if old_tags - new_tags:
+                    task.tags.remove(*(old_tags - new_tags))
+                if new_tags - old_tags:
+                    task.tags.add(*(new_tags - old_tags))
+        if conflict:
+            raise TaskConflict(current)
+        return task
+
+class RecurrenceForm(forms.Form):
+    '''How a task repeats; the fields are passed to recurrence.set_recurrence().'''
+    frequency = forms.ChoiceField(choices=[("", "Does not repeat")] + RecurrenceRule.FREQUENCY_CHOICES, required=False)
+    interval = forms.IntegerField(min_value=1, max_value=365, initial=1, required=False, label="Every")
+    by_weekday = forms.MultipleChoiceField(
+        choices=RecurrenceRule.WEEKDAY_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+        label="On (weekly)",
+    )
+    until = forms.DateTimeField(required=False, widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}))
+    count = forms.IntegerField(min_value=1, required=False, label="Occurrences")
+
+    @classmethod
+    def initial_for(cls, rule):
+        if rule is None:
+            return {}
+        return {
+            'frequency': rule.frequency,
+            'interval': rule.interval,
+            'by_weekday': rule.by_weekday.split(",") if rule.by_weekday else [],
+            'until': rule.until,
+            'count': rule.count,
+        }
+
+    def clean_by_weekday(self):
+        codes = [code for code, _ in RecurrenceRule.WEEKDAY_CHOICES]
+        return ",".join(sorted(self.cleaned_data['by_weekday'], key=codes.index))
+
 class TagForm(forms.ModelForm):
     name = forms.CharField(required=False)
     class Meta:
         model = Tag
-        fields = ['name']
\ No newline at end of file
+        fields = ['name']
+
+class ProjectForm(forms.ModelForm):
+    class Meta:
+        model = Project
+        fields = ['name']
+
+class ProjectMemberForm(forms.Form):
+    '''Adds a user to a project, or changes their role, by username.'''
+    username = forms.CharField(max_length=150)
+    role = forms.ChoiceField(choices=ProjectMembership.ROLE_CHOICES, initial=ProjectMembership.EDITOR)
+
+    def clean_username(self):
+        username = self.cleaned_data['username'].strip()
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise forms.ValidationError("There is no user with this username.")
+        return user
+
+class TaskIdListField(forms.Field):
+    '''A list of task ids submitted as repeated form values.'''
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return sorted({int(task_id) for task_id in value or []})
+        except (TypeError, ValueError):
+            raise ValidationError("Enter a list of task ids.", code="invalid")
+
+    def validate(self, value):
+        if not value:
+            raise ValidationError("Select at least one task.", code="required")
+
+class BulkTaskForm(forms.Form):
+    '''Validates one bulk operation applied to several tasks at once.'''
+    ACTION_CHOICES = [
+        ("status", "Change status"),
+        ("priority", "Change priority"),
+        ("add_tags", "Add tags"),
+        ("remove_tags", "Remove tags"),
+        ("delete", "Delete"),
+    ]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    task_ids = TaskIdListField()
+    status = forms.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = forms.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    tags = TagCatalogField(queryset=Tag.objects.all(), required=False)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['tags'].user_id = user.id if user else None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get("action")
+        # The value each action needs
+        required = {"status": "status", "priority": "priority", "add_tags": "tags", "remove_tags": "tags"}
+        field = required.get(action)
+        if field and not cleaned_data.get(field):
+            self.add_error(field, f"This field is required for the {action} action.")
+        return cleaned_data
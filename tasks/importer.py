@@ -0,0 +1,179 @@
+import csv
+import json
+from datetime import datetime
+from collections import Counter, defaultdict
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import bump_board_version, invalidate_tag_catalog
+from .events import publish_board_changed
+from .export import TAG_SEPARATOR
+from .models import Tag, Task
+from .stats import apply_deltas, status_priority_delta, tag_delta
+
+# Rows validated and written per transaction
+BATCH_SIZE = 1000
+
+PRIORITIES = {value for value, _ in Task.PRIORITY_CHOICES}
+STATUSES = {value for value, _ in Task.STATUS_CHOICES}
+
+
+class RowError(ValueError):
+    '''Raised for an import row that cannot be turned into a task.'''
+
+    def __init__(self, row_number, message):
+        super().__init__(f"Row {row_number}: {message}")
+        self.row_number = row_number
+
+
+def read_rows(source, import_format):
+    '''Yields (row number, dict) pairs from an open CSV or JSON Lines file, one at a time.'''
+    if import_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(source), start=1):
+            tags = row.get('tags') or ""
+            row['tags'] = [name.strip() for name in tags.split(TAG_SEPARATOR) if name.strip()]
+            yield row_number, row
+    elif import_format == 'jsonl':
+        row_number = 0
+        for line in source:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                yield row_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise RowError(row_number, f"invalid JSON ({exc})")
+    else:
+        raise ValueError(f"Unknown import format: {import_format!r}")
+
+
+def _text(row_number, row, field):
+    '''Returns the stripped string in `field` of a row, or "" when it is missing.'''
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise RowError(row_number, f"{field} must be a string, not {value!r}")
+    return value.strip()
+
+
+def clean_row(row_number, row):
+    '''Validates a raw row against the Task field types and choices and returns the task fields.'''
+    if not isinstance(row, dict):
+        raise RowError(row_number, "expected a JSON object")
+    title = _text(row_number, row, 'title')
+    if not title:
+        raise RowError(row_number, "title is required")
+    if len(title) > Task._meta.get_field('title').max_length:
+        raise RowError(row_number, "title is too long")
+
+    priority = _text(row_number, row, 'priority') or "Low"
+    if priority not in PRIORITIES:
+        raise RowError(row_number, f"unknown priority {priority!r}")
+    status = _text(row_number, row, 'status') or "Pending"
+    if status not in STATUSES:
+        raise RowError(row_number, f"unknown status {status!r}")
+
+    due_date = _text(row_number, row, 'due_date') or None
+    if due_date:
+        try:
+            due_date = datetime.fromisoformat(due_date)
+        except ValueError:
+            raise RowError(row_number, f"invalid due_date {due_date!r}")
+        if timezone.is_naive(due_date):
+            due_date = timezone.make_aware(due_date)
+
+    tags = row.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tags]
+    if not isinstance(tags, list) or not all(isinstance(name, str) for name in tags):
+        raise RowError(row_number, f"tags must be a list of strings, not {tags!r}")
+    max_length = Tag._meta.get_field('name').max_length
+
+    return {
+        'username': _text(row_number, row, 'user') or None,
+        'title': title,
+        'priority': priority,
+        'status': status,
+        'description': _text(row_number, row, 'description') or None,
+        'due_date': due_date,
+        'tags': [name.strip()[:max_length] for name in tags if name.strip()],
+    }
+
+
+def import_batch(rows, default_user=None):
+    '''Writes one batch of cleaned rows in a single transaction and returns the new tasks.
+
+    Users and tags are each resolved with one query for the whole batch: a tag
+    name means the shared tag of that name, else the task owner's own tag, which
+    is created in bulk when missing. Names match ignoring case, like the tag
+    form's uniqueness check. Tasks and their tag links are bulk inserted.
+    '''
+    usernames = {row['username'] for row in rows if row['username']}
+    users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+    missing_users = usernames - users.keys()
+    if missing_users:
+        raise ValueError(f"Unknown users: {', '.join(sorted(missing_users))}")
+
+    tasks = []
+    for row in rows:
+        user = users.get(row['username'], default_user)
+        if user is None:
+            raise ValueError(f"No owner for task {row['title']!r}; pass a default user")
+        tasks.append(Task(
+            user=user,
+            title=row['title'],
+            priority=row['priority'],
+            status=row['status'],
+            description=row['description'],
+            due_date=row['due_date'],
+        ))
+
+    # Part of the caller's transaction when there is one, without a savepoint:
+    # the input is validated above, so only database errors can abort it
+    with transaction.atomic(savepoint=False):
+        owner_ids = {task.user_id for task in tasks}
+        # Keyed by casefolded name; the owners' tag namespaces are small enough to load whole
+        tags = {}
+        for tag in Tag.objects.filter(Q(user__isnull=True) | Q(user__in=owner_ids)):
+            tags[tag.user_id, tag.name.casefold()] = tag
+        missing_tags = {}
+        for task, row in zip(tasks, rows):
+            for name in row['tags']:
+                key = task.user_id, name.casefold()
+                if (None, key[1]) not in tags and key not in tags:
+                    missing_tags.setdefault(key, name)
+        if missing_tags:
+            Tag.objects.bulk_create([Tag(user_id=user_id, name=name) for (user_id, _), name in missing_tags.items()],
+                                    ignore_conflicts=True)
+            created = Tag.objects.filter(user__in={user_id for user_id, _ in missing_tags},
+                                         name__in=set(missing_tags.values()))
+            tags.update(((tag.user_id, tag.name.casefold()), tag) for tag in created)
+
+        def tag_ids(task, row):
+            names = {name.casefold() for name in row['tags']}
+            return {(tags.get((None, name)) or tags[task.user_id, name]).id for name in names}
+
+        Task.objects.bulk_create(tasks)
+
+        through = Task.tags.through
+        through.objects.bulk_create([
+            through(task_id=task.id, tag_id=tag_id)
+            for task, row in zip(tasks, rows)
+            for tag_id in tag_ids(task, row)
+        ])
+
+        deltas = defaultdict(Counter)
+        for task, row in zip(tasks, rows):
+            deltas[task.user_id].update(status_priority_delta(None, (task.status, task.priority)))
+            deltas[task.user_id].update(tag_delta(tag_ids(task, row), 1))
+        for user_id, user_deltas in deltas.items():
+            apply_deltas(user_id, user_deltas)
+
+    # bulk_create sends no signals
+    for user_id in {user_id for user_id, _ in missing_tags}:
+        invalidate_tag_catalog(user_id)
+    bump_board_version(*(task.user_id for task in tasks))
+    publish_board_changed(*(task.user_id for task in tasks))
+    return tasks
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tasks.archive import ARCHIVE_AFTER, BATCH_SIZE, archive_finished_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves Completed and Canceled tasks that have not changed for --days days off the board, "
+        "in batches of one transaction each; with --interval, keeps doing so periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=ARCHIVE_AFTER.days,
+                            help=f"Archive finished tasks untouched for this many days (default {ARCHIVE_AFTER.days}).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=0,
+                            help="Seconds to sleep between batches, to leave room for other writers.")
+        parser.add_argument("--interval", type=int,
+                            help="Seconds between runs; runs once when omitted.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["days"] < 0:
+            raise CommandError("--batch-size must be positive and --days not negative")
+
+        while True:
+            before = timezone.now() - timedelta(days=options["days"])
+            archived = 0
+            for count in archive_finished_tasks(before, options["batch_size"]):
+                archived += count
+                time.sleep(options["pause"])
+            self.stdout.write(f"Archived {archived} tasks finished before {before:%Y-%m-%d %H:%M}.")
+            if not options["interval"]:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from tasks.board import card_key, render_board
+from tasks.cache import forget_cards
+from tasks.models import Tag, Task
+from tasks.seeding import PRIORITY_WEIGHTS, STATUS_WEIGHTS, WORDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the rendering of a board of --tasks tasks, with every card rendered and with the cards "
+        "served from the fragment cache but one. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=500)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+        priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+
+        with transaction.atomic():
+            user = User.objects.create_user(username=f"board-benchmark-{rng.random()}")
+            tasks = Task.objects.bulk_create([
+                Task(
+                    user=user,
+                    title=" ".join(rng.sample(WORDS, 3)),
+                    status=rng.choices(statuses, status_weights)[0],
+                    priority=rng.choices(priorities, priority_weights)[0],
+                )
+                for _ in range(options["tasks"])
+            ])
+            tags = list(Tag.objects.filter(user__isnull=True))
+            Task.tags.through.objects.bulk_create([
+                Task.tags.through(task_id=task.id, tag_id=tag.id)
+                for task in tasks
+                for tag in rng.sample(tags, min(rng.randint(0, 2), len(tags)))
+            ])
+            # Every task on the board, not only the first page of each column
+            render = lambda: render_board(user, limit=options["tasks"])
+
+            # Cards are keyed by what they show, so only dropping them renders them all again
+            cards = list(Task.objects.filter(user=user).select_related('project').prefetch_related('tags'))
+            self.report("every card rendered", render, lambda: forget_cards(cards, card_key), options["iterations"])
+            render()
+
+            def edit_one():
+                Task.objects.filter(id=rng.choice(tasks).id).update(updated_at=timezone.now())
+
+            self.report("one card changed", render, edit_one, options["iterations"])
+
+            transaction.set_rollback(True)
+
+    def report(self, label, render, prepare, iterations):
+        timings = []
+        for _ in range(iterations):
+            prepare()
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{label:>20}: median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms"
+        )
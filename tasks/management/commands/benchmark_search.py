@@ -0,0 +1,79 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from tasks.models import Task
+from tasks.search import has_search_index, search_tasks
+
+# Common words appear in many tasks; the rare words make queries selective, as real searches are
+COMMON_WORDS = (
+    "report budget meeting invoice review draft plan garden groceries doctor "
+    "dentist taxes email slides release deploy backup laptop train flight hotel"
+).split()
+
+
+def make_vocabulary(rng, size=20000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(5, 9))) for _ in range(size)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares full-text search latency with the icontains scan on a synthetic set of tasks. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = make_vocabulary(rng)
+        # Whole rare words and prefixes of them
+        queries = [rng.choice(vocabulary)[:rng.randint(4, 9)] for _ in range(options["queries"])]
+
+        with transaction.atomic():
+            user = User.objects.create_user(username=f"search-benchmark-{rng.random()}")
+            self.stdout.write(f"Creating {options['tasks']} tasks...")
+            Task.objects.bulk_create(
+                (
+                    Task(
+                        user=user,
+                        title=" ".join(rng.sample(COMMON_WORDS, 2) + rng.sample(vocabulary, 1)),
+                        description=" ".join(rng.sample(COMMON_WORDS, 4) + rng.sample(vocabulary, 4)),
+                    )
+                    for _ in range(options["tasks"])
+                ),
+                batch_size=5000,
+            )
+
+            def icontains(query):
+                return list(
+                    Task.objects.filter(Q(title__icontains=query) | Q(description__icontains=query), user=user)
+                    .order_by('-updated_at')[:50]
+                )
+
+            self.report("icontains", icontains, queries)
+            if has_search_index():
+                self.report("full-text", lambda query: search_tasks(user, query), queries)
+            else:
+                self.stdout.write("No full-text index on this database, skipping.")
+
+            transaction.set_rollback(True)
+
+    def report(self, label, search, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{label:>10}: median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms"
+        )
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tasks.export import CHUNK_SIZE, EXPORT_FORMATS, stream_export
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = "Streams every user's tasks (or one user's) to a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write to (default: standard output).")
+        parser.add_argument("--user", help="Only export the tasks of this username.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.all()
+        if options["user"]:
+            try:
+                tasks = tasks.filter(user=User.objects.get(username=options["user"]))
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist.")
+
+        lines = stream_export(tasks, options["format"], options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                count = self.write_lines(lines, output)
+            self.stderr.write(f"Wrote {count} lines to {options['output']}.")
+        else:
+            self.write_lines(lines, self.stdout)
+
+    def write_lines(self, lines, output):
+        # Lines are written as they are produced, so only one chunk of tasks is in memory
+        count = 0
+        for line in lines:
+            output.write(line)
+            count += 1
+        return count
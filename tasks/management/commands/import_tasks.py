@@ -0,0 +1,75 @@
+import os
+import time
+from itertools import islice
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from tasks.importer import BATCH_SIZE, clean_row, import_batch, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk imports tasks from a CSV or JSON Lines file (the export_tasks formats). "
+        "Rows are written in batches, one transaction each; with --checkpoint a failed "
+        "import resumes after the last committed batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON Lines file to import.")
+        parser.add_argument("--format", choices=["csv", "jsonl"],
+                            help="File format (default: guessed from the file extension).")
+        parser.add_argument("--user", help="Owner of rows without a user column.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--start-row", type=int, default=0,
+                            help="Number of data rows to skip before importing.")
+        parser.add_argument("--checkpoint",
+                            help="File recording how many rows are committed, read back on restart.")
+
+    def handle(self, *args, **options):
+        import_format = options["format"] or ("jsonl" if options["path"].endswith((".jsonl", ".ndjson")) else "csv")
+        default_user = None
+        if options["user"]:
+            try:
+                default_user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist.")
+
+        start_row = options["start_row"]
+        checkpoint = options["checkpoint"]
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start_row = max(start_row, int(f.read().strip() or 0))
+            self.stdout.write(f"Resuming after row {start_row}.")
+
+        imported = 0
+        committed = start_row
+        started = time.perf_counter()
+        with open(options["path"], encoding="utf-8", newline="") as source:
+            rows = islice(read_rows(source, import_format), start_row, None)
+            while True:
+                try:
+                    batch = [clean_row(number, row) for number, row in islice(rows, options["batch_size"])]
+                    if not batch:
+                        break
+                    import_batch(batch, default_user)
+                except (ValueError, DatabaseError) as exc:  # RowError is a ValueError
+                    raise CommandError(
+                        f"Import stopped: {exc}. {committed} rows are committed; "
+                        f"rerun with --start-row {committed} (or the same --checkpoint) to resume."
+                    )
+
+                imported += len(batch)
+                committed += len(batch)
+                if checkpoint:
+                    with open(checkpoint, "w") as f:
+                        f.write(str(committed))
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"Committed rows up to {committed}.")
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} tasks in {elapsed:.2f}s ({rate:.0f} rows/s)."
+        ))
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tasks.recurrence import BATCH_SIZE, LOOKAHEAD, materialize_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the instances of repeating tasks due within the next --lookahead-days days, "
+        "in batches of rules of one transaction each; with --interval, keeps doing so periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lookahead-days", type=int, default=LOOKAHEAD.days,
+                            help=f"Create instances this many days ahead of their due date (default {LOOKAHEAD.days}).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help=f"Rules materialized per transaction (default {BATCH_SIZE}).")
+        parser.add_argument("--interval", type=int,
+                            help="Seconds between runs; runs once when omitted.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["lookahead_days"] < 0:
+            raise CommandError("--batch-size must be positive and --lookahead-days not negative")
+
+        while True:
+            horizon = timezone.now() + timedelta(days=options["lookahead_days"])
+            created = sum(materialize_due(horizon, options["batch_size"]))
+            self.stdout.write(f"Created {created} task instances due up to {horizon:%Y-%m-%d %H:%M}.")
+            if not options["interval"]:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
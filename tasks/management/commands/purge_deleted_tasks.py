@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tasks.archive import BATCH_SIZE, PURGE_AFTER, purge_deleted_tasks
+
+
+class Command(BaseCommand):
+    help = "Permanently deletes tasks soft-deleted more than --days days ago, with bulk DELETEs per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=PURGE_AFTER.days,
+                            help=f"Grace period in days before deleted tasks are purged (default {PURGE_AFTER.days}).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["days"] < 0:
+            raise CommandError("--batch-size must be positive and --days not negative")
+
+        before = timezone.now() - timedelta(days=options["days"])
+        purged = sum(purge_deleted_tasks(before, options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} tasks deleted before {before:%Y-%m-%d %H:%M}."))
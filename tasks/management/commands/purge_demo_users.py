@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from tasks.demo import PURGE_BATCH_SIZE, purge_expired_demos
+
+
+class Command(BaseCommand):
+    help = "Deletes expired demo users and their tasks in bulk; with --interval, keeps doing so periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE,
+                            help=f"Demo users deleted per transaction (default {PURGE_BATCH_SIZE}).")
+        parser.add_argument("--interval", type=int,
+                            help="Seconds between purges; runs once when omitted.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        while True:
+            purged = purge_expired_demos(batch_size=options["batch_size"])
+            self.stdout.write(f"Purged {purged} expired demo users.")
+            if not options["interval"]:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
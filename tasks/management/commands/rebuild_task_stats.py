@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tasks.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the task counters behind the dashboard statistics from the task table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", dest="usernames",
+                            help="Only rebuild this username's counters (repeatable).")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["usernames"]:
+            users = dict(User.objects.filter(username__in=options["usernames"]).values_list("username", "id"))
+            missing = set(options["usernames"]) - users.keys()
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+            user_ids = list(users.values())
+
+        count = rebuild_user_stats(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} task counters."))
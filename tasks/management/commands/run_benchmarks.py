@@ -0,0 +1,83 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from tasks.benchmarks import SCENARIOS, THRESHOLD, ClientTransport, WSGITransport, compare, run_suite
+from tasks.models import Task
+from tasks.seeding import seeded_user
+
+TRANSPORTS = {'client': [ClientTransport], 'wsgi': [WSGITransport], 'both': [ClientTransport, WSGITransport]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every view through the test client and an in-process WSGI server as a seeded user "
+        "(see seed_tasks), reports p50/p95 latency, queries per request and peak memory, and fails "
+        "when results regress past --threshold against --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="User to benchmark as (default: the seeded user with most tasks).")
+        parser.add_argument("--transport", choices=TRANSPORTS, default="both")
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per scenario.")
+        parser.add_argument("--scenario", action="append", dest="labels",
+                            help="Only run this scenario label (repeatable).")
+        parser.add_argument("--baseline", help="Baseline JSON file to compare with.")
+        parser.add_argument("--save-baseline", action="store_true",
+                            help="Write the results to --baseline instead of comparing.")
+        parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                            help=f"Allowed slowdown as a fraction of the baseline (default {THRESHOLD}).")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        user = seeded_user(options["user"])
+        if user is None:
+            raise CommandError("No user to benchmark as; run seed_tasks first or pass --user.")
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be positive")
+        if options["save_baseline"] and not options["baseline"]:
+            raise CommandError("--save-baseline needs --baseline")
+
+        scenarios = SCENARIOS
+        if options["labels"]:
+            scenarios = [scenario for scenario in SCENARIOS if scenario.label in options["labels"]]
+            unknown = set(options["labels"]) - {scenario.label for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        task_count = Task.objects.filter(user=user).count()
+        self.stdout.write(f"Benchmarking as {user.username} ({task_count} tasks), {options['iterations']} iterations.")
+        self.stdout.write(f"{'':>6} {'scenario':<22} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>9}")
+        results = run_suite(
+            user, TRANSPORTS[options["transport"]], options["iterations"], scenarios,
+            progress=lambda transport, label, figures: self.stdout.write(
+                f"{transport:>6} {label:<22} {figures['p50_ms']:>9.2f} {figures['p95_ms']:>9.2f} "
+                f"{figures['queries']:>8g} {figures['peak_kib']:>9.1f}"
+            ),
+        )
+        document = {'user_tasks': task_count, 'iterations': options["iterations"], 'results': results}
+
+        if options["output"]:
+            self.write_json(options["output"], document)
+        if options["save_baseline"]:
+            self.write_json(options["baseline"], document)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}."))
+            return
+        if not options["baseline"]:
+            return
+        if not os.path.exists(options["baseline"]):
+            raise CommandError(f"Baseline {options['baseline']} does not exist; create it with --save-baseline.")
+
+        with open(options["baseline"]) as f:
+            baseline = json.load(f)
+        if baseline.get('user_tasks') != task_count:
+            self.stderr.write(
+                f"Warning: the baseline was recorded with {baseline.get('user_tasks')} tasks, not {task_count}."
+            )
+        regressions = compare(results, baseline['results'], options["threshold"])
+        if regressions:
+            raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def write_json(self, path, document):
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
@@ -0,0 +1,53 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tasks.reminders import BATCH_SIZE, new_worker_id, expire_stale_claims, run_cycle
+
+
+class Command(BaseCommand):
+    help = "Emails reminders for open tasks about to become due, polling until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lead-minutes", type=int, default=60,
+                            help="Remind this many minutes before the due date (default 60).")
+        parser.add_argument("--lookback-minutes", type=int, default=60,
+                            help="Also remind tasks that became due this recently, to cover downtime (default 60).")
+        parser.add_argument("--interval", type=int, default=60,
+                            help="Seconds between polls (default 60).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help=f"Due tasks read per query (default {BATCH_SIZE}).")
+        parser.add_argument("--shard", type=int, default=0,
+                            help="Index of this worker's shard, from 0.")
+        parser.add_argument("--shards", type=int, default=1,
+                            help="Number of worker processes splitting the tasks by id.")
+        parser.add_argument("--once", action="store_true",
+                            help="Run a single poll and exit.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options["shards"] < 1 or not 0 <= options["shard"] < options["shards"]:
+            raise CommandError("--shard must be between 0 and --shards - 1")
+
+        worker = new_worker_id()
+        lead = timedelta(minutes=options["lead_minutes"])
+        lookback = timedelta(minutes=options["lookback_minutes"])
+        while True:
+            now = timezone.now()
+            unknown = expire_stale_claims(now)
+            sent, skipped = run_cycle(
+                now - lookback, now + lead, worker,
+                batch_size=options["batch_size"], shard=options["shard"], shards=options["shards"],
+            )
+            if sent or skipped or unknown:
+                self.stdout.write(
+                    f"{now:%Y-%m-%d %H:%M:%S} sent {sent} reminders, skipped {skipped} without email, "
+                    f"marked {unknown} interrupted reminders unknown"
+                )
+            if options["once"]:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from tasks.importer import BATCH_SIZE
+from tasks.seeding import SEED_PASSWORD, SEED_PREFIX, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates seeded users, each with about --tasks tasks spread over --tags tags, "
+        "with realistic status, priority, due date and tag distributions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--tasks", type=int, default=1000, help="Average number of tasks per user.")
+        parser.add_argument("--tags", type=int, default=30)
+        parser.add_argument("--seed", type=int, default=42, help="Random seed, for repeatable data sets.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if min(options["users"], options["tasks"], options["tags"], options["batch_size"]) < 1:
+            raise CommandError("--users, --tasks, --tags and --batch-size must be positive")
+
+        created = seed(
+            options["users"], options["tasks"], options["tags"],
+            seed=options["seed"], batch_size=options["batch_size"],
+            progress=lambda count: self.stdout.write(f"{count} tasks...", ending="\r"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} tasks for users {SEED_PREFIX}0..{options['users'] - 1} "
+            f"(password {SEED_PASSWORD!r})."
+        ))
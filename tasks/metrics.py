@@ -0,0 +1,194 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from django.template.backends.django import DjangoTemplates
+
+# Upper bounds of the histogram buckets of each per-request measurement
+BUCKETS = {
+    'duration_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'db_queries': (1, 2, 5, 10, 20, 50, 100, 200, 500),
+    'db_seconds': (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    'template_seconds': (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    'response_bytes': (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000),
+}
+
+METRIC_HELP = {
+    'duration_seconds': "Wall time spent producing the response.",
+    'db_queries': "SQL queries run per request.",
+    'db_seconds': "Time spent in SQL queries per request.",
+    'template_seconds': "Time spent rendering templates per request.",
+    'response_bytes': "Size of the response body (not measured for streaming responses).",
+}
+
+# Measurements of the request being handled; contextvars follow the request
+# into sync_to_async threads, so async views are measured too
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    '''Counters collected while one request is handled.'''
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    '''Database execute wrapper adding each query's count and time to the current request.'''
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def install_query_recorder(connection):
+    '''Puts record_query on a database connection, for as long as it stays open.'''
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate:
+    '''Wraps a backend template to add its render time to the current request.'''
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        # Templates rendered while rendering another one are already in its time
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    '''Django template backend that measures render time for the request metrics.'''
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    '''Cumulative-bucket histogram in the Prometheus style.'''
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One count per bound, plus the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        '''Returns (upper bound, observations <= bound) pairs, ending with +Inf.'''
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        '''Estimates a quantile as the upper bound of the bucket it falls in (capped at the max seen).'''
+        if not self.count:
+            return 0
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    '''Per-view histograms of the request measurements, for this process only.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, values):
+        '''Records one request of `view`; `values` maps BUCKETS names to measurements.'''
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = {name: Histogram(bounds) for name, bounds in BUCKETS.items()}
+            for name, value in values.items():
+                if value is not None:
+                    histograms[name].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def report(self):
+        '''Returns per-view summaries, slowest 95th percentile first.'''
+        with self._lock:
+            rows = [
+                {
+                    'view': view,
+                    'requests': histograms['duration_seconds'].count,
+                    **{
+                        name: {
+                            'mean': histogram.sum / histogram.count if histogram.count else 0,
+                            'p50': histogram.quantile(0.5),
+                            'p95': histogram.quantile(0.95),
+                            'max': histogram.max,
+                        }
+                        for name, histogram in histograms.items()
+                    },
+                }
+                for view, histograms in self._views.items()
+            ]
+        return sorted(rows, key=lambda row: row['duration_seconds']['p95'], reverse=True)
+
+    def prometheus(self, prefix="taskmanager_request"):
+        '''Renders every histogram in the Prometheus text exposition format.'''
+        lines = []
+        with self._lock:
+            for name in BUCKETS:
+                metric = f"{prefix}_{name}"
+                lines.append(f"# HELP {metric} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+                for view, histograms in sorted(self._views.items()):
+                    histogram = histograms[name]
+                    label = view.replace("\\", "\\\\").replace('"', '\\"')
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                        lines.append(f'{metric}_bucket{{view="{label}",le="{le}"}} {total}')
+                    lines.append(f'{metric}_sum{{view="{label}"}} {histogram.sum:g}')
+                    lines.append(f'{metric}_count{{view="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
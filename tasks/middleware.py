@@ -0,0 +1,282 @@
+import json
+import logging
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import urlparse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+from .metrics import RequestMetrics, registry
+from .storage import compressors
+
+logger = logging.getLogger('tasks.performance')
+
+# Defaults for the budgets above which a request is logged as slow
+SLOW_REQUEST_MS = 500
+QUERY_BUDGET = 20
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else "<unresolved>"
+
+
+class RequestMetricsMiddleware:
+    '''Measures every request and adds it to the per-view histograms.
+
+    Records wall time, SQL query count and time, template render time and
+    response size, and logs requests over TASK_SLOW_REQUEST_MS or
+    TASK_QUERY_BUDGET. Works for both sync and async views.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            RequestMetrics.deactivate(token)
+        self._finish(request, response, metrics, start)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            RequestMetrics.deactivate(token)
+        self._finish(request, response, metrics, start)
+        return response
+
+    def _start(self):
+        metrics = RequestMetrics()
+        return metrics, metrics.activate(), time.perf_counter()
+
+    def _finish(self, request, response, metrics, start):
+        duration = time.perf_counter() - start
+        view = _view_name(request)
+        # Streaming bodies (exports, live events) are not buffered, so their size is unknown
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, {
+            'duration_seconds': duration,
+            'db_queries': metrics.queries,
+            'db_seconds': metrics.db_seconds,
+            'template_seconds': metrics.template_seconds,
+            'response_bytes': size,
+        })
+
+        slow_ms = getattr(settings, 'TASK_SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+        query_budget = getattr(settings, 'TASK_QUERY_BUDGET', QUERY_BUDGET)
+        if duration * 1000 > slow_ms or metrics.queries > query_budget:
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms",
+                request.method, request.path, view, duration * 1000,
+                metrics.queries, metrics.db_seconds * 1000, metrics.template_seconds * 1000,
+            )
+
+
+# Hashed static files never change, so browsers and proxies may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Unhashed copies may change with the next deploy
+STATIC_MAX_AGE = 60
+
+# Content-Encoding of each pre-compressed variant suffix written by tasks.storage
+ENCODINGS = {'.br': 'br', '.gz': 'gzip'}
+
+# A single byte range; multiple ranges get the whole file, as RFC 9110 allows
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Chunk size of the body of 206 responses
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+class StaticAsset:
+    '''A collected static file with its response headers, computed once.'''
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        max_age = f"max-age={IMMUTABLE_MAX_AGE}, immutable" if immutable else f"max-age={STATIC_MAX_AGE}"
+        self.cache_control = f"public, {max_age}"
+        # (encoding, path, ETag), best encoding first. Each variant is its own representation
+        # with its own ETag, so a cache cannot answer a request with the wrong encoding
+        self.variants = [
+            (ENCODINGS[suffix], path + suffix, f'{self.etag[:-1]}-{suffix[1:]}"')
+            for suffix, _ in compressors() if os.path.exists(path + suffix)
+        ]
+
+    def variant(self, request):
+        '''Returns the (encoding, path, ETag) to send for the request's Accept-Encoding.'''
+        accepted = _accepted_encodings(request)
+        for encoding, path, etag in self.variants:
+            if encoding in accepted:
+                return encoding, path, etag
+        return None, self.path, self.etag
+
+    def headers(self, etag=None):
+        headers = {
+            'ETag': etag or self.etag,
+            'Last-Modified': http_date(self.mtime),
+            'Cache-Control': self.cache_control,
+            'Accept-Ranges': "bytes",
+            'X-Content-Type-Options': "nosniff",
+        }
+        if self.variants:
+            headers['Vary'] = "Accept-Encoding"
+        return headers
+
+    def not_modified(self, request, etag):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ""))
+        return since is not None and self.mtime <= since
+
+    def byte_range(self, request):
+        '''Returns the (first, last) byte asked for by a Range header, or None for the whole file.
+
+        Raises ValueError when the range lies outside the file.
+        '''
+        header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if not header or (if_range is not None and if_range.strip() != self.etag):
+            return None
+        match = BYTE_RANGE.match(header.strip())
+        if not match or match.groups() == ("", ""):
+            return None
+        first, last = match.groups()
+        if not first:
+            # "bytes=-N": the last N bytes
+            if not int(last) or not self.size:
+                raise ValueError(header)
+            return max(self.size - int(last), 0), self.size - 1
+        if int(first) >= self.size or (last and int(last) < int(first)):
+            raise ValueError(header)
+        return int(first), min(int(last), self.size - 1) if last else self.size - 1
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', "").split(","):
+        coding, _, params = item.partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _read_range(path, first, length):
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+class StaticFilesMiddleware:
+    '''Serves the collected static files (STATIC_ROOT) before the rest of the stack runs.
+
+    The files are indexed once at startup, so collectstatic must run before the
+    server starts; without collected files the middleware removes itself.
+    Hashed names get far-future immutable caching, pre-compressed variants
+    are picked by Accept-Encoding, conditional requests get 304s, single byte
+    ranges get 206s, and full files go out through the server's file wrapper
+    (sendfile under gunicorn).
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = "/" + urlparse(settings.STATIC_URL).path.lstrip("/")
+        self.assets = self.index(settings.STATIC_ROOT) if settings.STATIC_ROOT else {}
+        if not self.assets:
+            raise MiddlewareNotUsed
+
+    def index(self, root):
+        '''Maps the URL path of every file under `root` to its StaticAsset.'''
+        manifest = os.path.join(root, getattr(staticfiles_storage, 'manifest_name', "staticfiles.json"))
+        hashed = set()
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                hashed = set(json.load(f).get('paths', {}).values())
+        assets = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                stem, suffix = os.path.splitext(path)
+                if suffix in ENCODINGS and os.path.exists(stem):
+                    continue  # A variant, served in place of its file
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                assets[self.prefix + name] = StaticAsset(path, name in hashed)
+        return assets
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        asset = self.assets.get(request.path_info)
+        return self.serve(request, asset) if asset else self.get_response(request)
+
+    async def __acall__(self, request):
+        asset = self.assets.get(request.path_info)
+        return self.serve(request, asset) if asset else await self.get_response(request)
+
+    def serve(self, request, asset):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(["GET", "HEAD"])
+        # Ranges refer to the uncompressed file, so Range requests are never sent a variant
+        if 'Range' in request.headers:
+            encoding, path, etag = None, asset.path, asset.etag
+        else:
+            encoding, path, etag = asset.variant(request)
+        if asset.not_modified(request, etag):
+            return HttpResponse(status=304, headers=asset.headers(etag))
+
+        try:
+            byte_range = asset.byte_range(request)
+        except ValueError:
+            return HttpResponse(status=416, headers={**asset.headers(), 'Content-Range': f"bytes */{asset.size}"})
+
+        headers = asset.headers(etag)
+        if byte_range:
+            first, last = byte_range
+            headers['Content-Range'] = f"bytes {first}-{last}/{asset.size}"
+            size = last - first + 1
+        elif encoding:
+            headers['Content-Encoding'] = encoding
+            size = os.path.getsize(path)
+        else:
+            size = asset.size
+
+        headers['Content-Length'] = str(size)
+        headers['Content-Type'] = asset.content_type
+        status = 206 if byte_range else 200
+        if request.method == "HEAD":
+            return HttpResponse(status=status, headers=headers)
+        if byte_range:
+            return StreamingHttpResponse(_read_range(path, byte_range[0], size), status=status, headers=headers)
+        response = FileResponse(open(path, 'rb'), headers=headers)
+        # FileResponse names the (possibly compressed) file; the URL already does
+        del response['Content-Disposition']
+        return response
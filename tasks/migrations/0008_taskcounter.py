@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_tasks(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    TaskCounter = apps.get_model('tasks', 'TaskCounter')
+    counters = [
+        TaskCounter(user_id=row['user_id'], dimension='status_priority',
+                    key=f"{row['status']}|{row['priority']}", count=row['count'])
+        for row in Task.objects.values('user_id', 'status', 'priority').annotate(count=Count('id')).order_by()
+    ] + [
+        TaskCounter(user_id=row['task__user_id'], dimension='tag', key=str(row['tag_id']), count=row['count'])
+        for row in Task.tags.through.objects.values('task__user_id', 'tag_id').annotate(count=Count('id')).order_by()
+    ]
+    TaskCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_task_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'dimension', 'key'), name='unique_task_counter')],
+            },
+        ),
+        migrations.RunPython(count_existing_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:52
+
+from importlib import import_module
+from django.db import migrations, models
+
+search_index = import_module('tasks.migrations.0007_task_search_index')
+
+# SQLite adds or drops a NOT NULL column by rebuilding tasks_task, which drops
+# the full-text search triggers (the FTS table itself survives)
+recreate_search_triggers = search_index.run_for_vendor({
+    'sqlite': search_index.SQLITE_BACKWARD[:3] + search_index.SQLITE_FORWARD[1:],
+})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_recurrencerule'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_search_triggers),
+        migrations.AddField(
+            model_name='task',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(recreate_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Stay shared, as created by Tag.create_default_tags()
+DEFAULT_TAGS = ["Work", "Studies", "Home", "Meetings", "Goals", "Reading", "Shopping", "Bills"]
+
+
+def split_tags(apps, schema_editor):
+    """Gives each user their own copy of the non-default tags on their tasks.
+
+    The first user of a tag takes it over, other users get a copy with their
+    task links and tag counters moved to it. Tags on no task are dropped.
+    """
+    Tag = apps.get_model('tasks', 'Tag')
+    Task = apps.get_model('tasks', 'Task')
+    TaskCounter = apps.get_model('tasks', 'TaskCounter')
+    through = Task.tags.through
+    for tag in Tag.objects.filter(user__isnull=True).exclude(name__in=DEFAULT_TAGS).iterator():
+        links = through.objects.filter(tag_id=tag.id)
+        user_ids = sorted(set(links.values_list('task__user_id', flat=True)))
+        if not user_ids:
+            tag.delete()
+            continue
+        Tag.objects.filter(id=tag.id).update(user_id=user_ids[0])
+        for user_id in user_ids[1:]:
+            copy = Tag.objects.create(user_id=user_id, name=tag.name)
+            links.filter(task__user_id=user_id).update(tag_id=copy.id)
+            TaskCounter.objects.filter(user_id=user_id, dimension='tag', key=str(tag.id)).update(key=str(copy.id))
+
+
+def merge_tags(apps, schema_editor):
+    """Folds per-user tags back into one shared tag per name; run rebuild_task_stats afterwards."""
+    Tag = apps.get_model('tasks', 'Tag')
+    Task = apps.get_model('tasks', 'Task')
+    through = Task.tags.through
+    kept = {}
+    for tag in Tag.objects.order_by('user_id', 'id').iterator():
+        if tag.name not in kept:
+            kept[tag.name] = tag.id
+            continue
+        # A task cannot be linked to the kept tag twice
+        linked = through.objects.filter(tag_id=kept[tag.name]).values('task_id')
+        through.objects.filter(tag_id=tag.id).exclude(task_id__in=linked).update(tag_id=kept[tag.name])
+        tag.delete()
+    Tag.objects.update(user=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_task_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tags', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.RunPython(split_tags, merge_tags),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_user_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('name',), name='unique_shared_tag'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_projects'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskreminder',
+            name='state',
+            field=models.CharField(choices=[('claimed', 'Claimed'), ('sent', 'Sent'), ('skipped', 'Skipped'), ('unknown', 'Unknown')], default='claimed', max_length=10),
+        ),
+    ]
@@ -1,9 +1,22 @@
+import datetime
 from django.db import models
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.models import User
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=50, unique=True)
+    # Shared by every user (user is null); other tags belong to one user
+    DEFAULT_TAGS = ["Work", "Studies", "Home", "Meetings", "Goals", "Reading", "Shopping", "Bills"]
+
+    name = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='tags')
+
+    class Meta:
+        constraints = [
+            # Also the index behind loading one user's tags
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_user_tag'),
+            models.UniqueConstraint(fields=['name'], condition=models.Q(user__isnull=True), name='unique_shared_tag'),
+        ]
 
     def __str__(self):
         return self.name
@@ -11,9 +24,72 @@ class Tag(models.Model):
     @classmethod
     def create_default_tags(cls):
         """Creates default tags if they do not exist."""
-        default_tags = ["Work", "Studies", "Home", "Meetings", "Goals", "Reading", "Shopping", "Bills"]
-        for tag in default_tags:
-            cls.objects.get_or_create(name=tag)
+        for tag in cls.DEFAULT_TAGS:
+            cls.objects.get_or_create(name=tag, user=None)
+
+# Tasks on the board: neither archived nor soft-deleted
+LIVE_TASKS = models.Q(archived_at__isnull=True, deleted_at__isnull=True)
+
+class TaskQuerySet(models.QuerySet):
+    def live(self):
+        '''Tasks shown on the board and the home feed.'''
+        return self.filter(archived_at__isnull=True)
+
+    def archived(self):
+        '''Finished tasks moved off the board by the archive_tasks command.'''
+        return self.filter(archived_at__isnull=False)
+
+    def visible_to(self, user):
+        '''The user's own tasks outside projects, and the tasks of every project they are a member of.
+
+        Memberships are read by a subquery of the same statement, so checking
+        access costs no query of its own, however many projects or members.
+        '''
+        projects = ProjectMembership.objects.filter(user=user).values('project_id')
+        return self.filter(models.Q(project__isnull=True, user=user) | models.Q(project_id__in=projects))
+
+    def visible_in_order(self, user, limit=None):
+        '''visible_to() for ordered lists: a UNION ALL of the user's own tasks and those of their projects.
+
+        An OR of the two branches can use neither branch's index, so every
+        visible task would be sorted. Here each branch is read through its own
+        index in the queryset's order and, with `limit`, stops after that many
+        rows: only the rows of one page get sorted. Apply it last, after the
+        filters, the ordering and the related lookups; visible_to() stays
+        cheaper for lookups by id.
+        '''
+        if self.query.is_empty():
+            # none() cannot be compiled into the branches' SQL
+            return self
+        # The project branch joins from the user's memberships, so it only reads their projects' tasks
+        branches = [self.filter(project__isnull=True, user=user), self.filter(project__memberships__user=user)]
+        parts, params = [], []
+        for number, branch in enumerate(branches):
+            branch = branch.values('id')
+            branch = branch[:limit] if limit is not None else branch.order_by()
+            sql, branch_params = branch.query.get_compiler(using=self.db).as_sql()
+            # Wrapped, as SQLite refuses ORDER BY and LIMIT in the parts of a compound statement
+            parts.append(f"SELECT id FROM ({sql}) AS branch_{number}")
+            params.extend(branch_params)
+        # The branches applied the filters: the outer query only fetches their rows by primary key,
+        # as the planner may otherwise walk a filter's index across every user's tasks
+        tasks = self.model.all_objects.db_manager(self.db).filter(id__in=RawSQL(" UNION ALL ".join(parts), params))
+        tasks.query.select_related = self.query.select_related
+        tasks._prefetch_related_lookups = self._prefetch_related_lookups
+        return tasks.order_by(*self.query.order_by)
+
+    def editable_by(self, user):
+        '''The tasks the user may change: their own outside projects, and those of projects they edit.'''
+        projects = ProjectMembership.objects.filter(
+            user=user, role__in=ProjectMembership.EDIT_ROLES,
+        ).values('project_id')
+        return self.filter(models.Q(project__isnull=True, user=user) | models.Q(project_id__in=projects))
+
+class TaskManager(models.Manager.from_queryset(TaskQuerySet)):
+    '''Hides soft-deleted tasks; Task.all_objects still returns them.'''
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 class Task(models.Model):
     PRIORITY_CHOICES = [
@@ -39,6 +115,241 @@ class Task(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField(Tag, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Set when a long-finished task is moved off the board (archive_tasks command)
+    archived_at = models.DateTimeField(blank=True, null=True)
+    # Set by task deletion; the row is purged later (purge_deleted_tasks command)
+    deleted_at = models.DateTimeField(blank=True, null=True)
+    # Series the task belongs to and the occurrence it stands for; a rule's
+    # template task is the first occurrence of its own series
+    recurrence = models.ForeignKey('RecurrenceRule', on_delete=models.SET_NULL, blank=True, null=True,
+                                   related_name='instances')
+    occurrence = models.DateTimeField(blank=True, null=True)
+    # Moves on with every edit, so concurrent edits can detect each other (TaskForm.save_changes)
+    version = models.PositiveIntegerField(default=1)
+    # Shared with the project's members when set; `user` is then the member who created it
+    project = models.ForeignKey('Project', on_delete=models.CASCADE, blank=True, null=True, related_name='tasks')
+
+    objects = TaskManager()
+    all_objects = models.Manager.from_queryset(TaskQuerySet)()
+
+    # Statuses whose tasks get archived once they have not changed for a while
+    FINISHED_STATUSES = ["Completed", "Canceled"]
+
+    class Meta:
+        constraints = [
+            # Materializing a series twice cannot create an occurrence twice
+            models.UniqueConstraint(fields=['recurrence', 'occurrence'], name='unique_task_occurrence',
+                                    condition=models.Q(deleted_at__isnull=True)),
+        ]
+        indexes = [
+            # The hot indexes only cover live tasks, so archived and deleted rows
+            # do not grow them; queries must filter with LIVE_TASKS to use them.
+            # Board columns and due-date views: WHERE user AND status ORDER BY due_date
+            models.Index(fields=['user', 'status', 'due_date'], name='task_user_status_due_idx', condition=LIVE_TASKS),
+            # Keyset pages of a single board column, newest first
+            models.Index(fields=['user', 'status', '-updated_at'], name='task_user_status_updated_idx',
+                         condition=LIVE_TASKS),
+            # Most recently updated first, per user (home feed, board ordering)
+            models.Index(fields=['user', '-updated_at'], name='task_user_updated_idx', condition=LIVE_TASKS),
+            # The same for the tasks of a project, the other branch of TaskQuerySet.visible_in_order()
+            models.Index(fields=['project', 'status', '-updated_at'], name='task_project_updated_idx',
+                         condition=LIVE_TASKS),
+            # "Show older" pages of the archived tasks of a column
+            models.Index(fields=['user', 'status', '-updated_at'], name='task_user_archived_idx',
+                         condition=models.Q(archived_at__isnull=False, deleted_at__isnull=True)),
+            # Archival scans: live finished tasks by last update
+            models.Index(fields=['status', 'updated_at'], name='task_archivable_idx', condition=LIVE_TASKS),
+            # Purge scans over soft-deleted tasks
+            models.Index(fields=['deleted_at'], name='task_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+            # Reminder scans: open tasks becoming due in a time window, across all users
+            models.Index(fields=['status', 'due_date'], name='task_status_due_idx'),
+            # Admin list filters
+            models.Index(fields=['status', 'priority'], name='task_status_priority_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        # Reopening an archived task puts it back on the board
+        if self.archived_at and self.status not in self.FINISHED_STATUSES:
+            self.archived_at = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'archived_at'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values, so signal handlers can tell what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+class Project(models.Model):
+    '''Tasks shared by a team; what each member may do with them depends on their role.'''
+    name = models.CharField(max_length=100)
+    members = models.ManyToManyField(User, through='ProjectMembership', related_name='projects')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+class ProjectMembership(models.Model):
+    OWNER = 'owner'
+    EDITOR = 'editor'
+    VIEWER = 'viewer'
+    ROLE_CHOICES = [
+        (OWNER, "Owner"),
+        (EDITOR, "Editor"),
+        (VIEWER, "Viewer"),
+    ]
+    # Roles allowed to create, change and delete the project's tasks; owners also manage the members
+    EDIT_ROLES = [OWNER, EDITOR]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='project_memberships')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=EDITOR)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the index behind listing a project's members
+            models.UniqueConstraint(fields=['project', 'user'], name='unique_project_member'),
+        ]
+        indexes = [
+            # Covers the membership subqueries of TaskQuerySet, which read no table row
+            models.Index(fields=['user', 'role', 'project'], name='membership_user_role_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.project_id} ({self.role})"
+
+class RecurrenceRule(models.Model):
+    '''Repeats a template task, following a subset of the iCalendar RRULE (FREQ, INTERVAL, BYDAY, UNTIL, COUNT).
+
+    Instances are created lazily, a little ahead of their due date, by the
+    materialize_recurrences command (see recurrence.py).
+    '''
+    DAILY = 'DAILY'
+    WEEKLY = 'WEEKLY'
+    MONTHLY = 'MONTHLY'
+    FREQUENCY_CHOICES = [
+        (DAILY, "Daily"),
+        (WEEKLY, "Weekly"),
+        (MONTHLY, "Monthly"),
+    ]
+    WEEKDAY_CHOICES = [
+        ("MO", "Monday"),
+        ("TU", "Tuesday"),
+        ("WE", "Wednesday"),
+        ("TH", "Thursday"),
+        ("FR", "Friday"),
+        ("SA", "Saturday"),
+        ("SU", "Sunday"),
+    ]
+
+    template = models.OneToOneField(Task, on_delete=models.CASCADE, related_name='recurrence_rule')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveSmallIntegerField(default=1)
+    # Comma-separated RRULE day codes ("MO,TH"); weekly rules only, empty for the weekday of starts_at
+    by_weekday = models.CharField(max_length=20, blank=True)
+    # First occurrence (DTSTART): the template's due date
+    starts_at = models.DateTimeField()
+    until = models.DateTimeField(blank=True, null=True)
+    count = models.PositiveIntegerField(blank=True, null=True)
+    # Every occurrence up to this point has its instance
+    materialized_until = models.DateTimeField()
+    # Set once the last occurrence allowed by UNTIL or COUNT has its instance
+    exhausted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Materializer scans: open series falling behind the look-ahead horizon
+            models.Index(fields=['materialized_until'], name='recurrence_pending_idx',
+                         condition=models.Q(exhausted=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.rrule} for task {self.template_id}"
+
+    @property
+    def weekdays(self):
+        '''The BYDAY days as weekday numbers (Monday is 0), in week order.'''
+        codes = [code for code, _ in self.WEEKDAY_CHOICES]
+        return sorted(codes.index(code) for code in self.by_weekday.split(",") if code in codes)
+
+    @property
+    def rrule(self):
+        '''The rule in iCalendar RRULE notation.'''
+        parts = [f"FREQ={self.frequency}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.by_weekday:
+            parts.append(f"BYDAY={self.by_weekday}")
+        if self.until:
+            parts.append(f"UNTIL={self.until.astimezone(datetime.timezone.utc):%Y%m%dT%H%M%SZ}")
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        return ";".join(parts)
+
+class TaskCounter(models.Model):
+    '''A per-user task count for one key of a dimension, kept up to date by signals.'''
+    STATUS_PRIORITY = 'status_priority'  # key: "<status>|<priority>"
+    TAG = 'tag'  # key: tag id
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_counters')
+    dimension = models.CharField(max_length=20)
+    key = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dimension', 'key'], name='unique_task_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.dimension}:{self.key} = {self.count}"
+
+class TaskReminder(models.Model):
+    '''Records the reminder for a task's due date, so it is sent at most once across workers and restarts.'''
+    CLAIMED = 'claimed'
+    SENT = 'sent'
+    SKIPPED = 'skipped'
+    # The worker stopped between claiming and recording the outcome: the email may or may not have gone out
+    UNKNOWN = 'unknown'
+    STATE_CHOICES = [
+        (CLAIMED, "Claimed"),
+        (SENT, "Sent"),
+        (SKIPPED, "Skipped"),
+        (UNKNOWN, "Unknown"),
+    ]
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='reminders')
+    # The due date this reminder was for; moving the due date makes a new reminder due
+    due_date = models.DateTimeField()
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=CLAIMED)
+    worker = models.CharField(max_length=64)
+    claimed_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'due_date'], name='unique_task_reminder'),
+        ]
+        indexes = [
+            models.Index(fields=['state', 'claimed_at'], name='reminder_state_claimed_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reminder for task {self.task_id} due {self.due_date} ({self.state})"
+
+class DemoAccount(models.Model):
+    '''Marks a throwaway demo user, deleted with its tasks once `expires_at` passes.'''
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='demo_account')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Indexed for the reaper's range scan over expired accounts
+    expires_at = models.DateTimeField(db_index=True)
 
     def __str__(self):
-        return f"{self.title} ({self.status})"
\ No newline at end of file
+        return f"Demo {self.user_id} until {self.expires_at}"
@@ -0,0 +1,63 @@
+import base64
+from datetime import datetime
+from django.db.models import Q
+
+# Default number of tasks per page
+PAGE_SIZE = 30
+
+
+class InvalidCursor(ValueError):
+    '''Raised when a pagination cursor cannot be decoded.'''
+
+
+def encode_cursor(task):
+    '''Encodes the (updated_at, id) position of a task as an opaque URL-safe string.'''
+    raw = f"{task.updated_at.isoformat()}|{task.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    '''Returns the (updated_at, id) pair stored in a cursor.'''
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, task_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(updated_at), int(task_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from exc
+
+
+def _page_queryset(queryset, cursor, page_size, user=None):
+    queryset = queryset.order_by('-updated_at', '-id')
+    if cursor:
+        updated_at, task_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=task_id)
+        )
+    if user is not None:
+        queryset = queryset.visible_in_order(user, page_size + 1)
+    # One extra row tells whether another page follows
+    return queryset[:page_size + 1]
+
+
+def _split_page(tasks, page_size):
+    if len(tasks) > page_size:
+        tasks = tasks[:page_size]
+        return tasks, encode_cursor(tasks[-1])
+    return tasks, None
+
+
+def paginate(queryset, cursor=None, page_size=PAGE_SIZE, user=None):
+    '''Returns (tasks, next_cursor) for the page after `cursor`, newest first.
+
+    Rows are sorted by (updated_at, id) and the page starts strictly after the
+    cursor position, so every page is an index range scan of `page_size` rows,
+    no matter how deep it is (unlike OFFSET paging). With `user`, only the
+    tasks visible to them are paged, through TaskQuerySet.visible_in_order().
+    '''
+    return _split_page(list(_page_queryset(queryset, cursor, page_size, user)), page_size)
+
+
+async def apaginate(queryset, cursor=None, page_size=PAGE_SIZE, user=None):
+    '''Async version of paginate(), for async views.'''
+    tasks = [task async for task in _page_queryset(queryset, cursor, page_size, user)]
+    return _split_page(tasks, page_size)
@@ -0,0 +1,236 @@
+import calendar
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import count
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from .bulk import soft_delete_tasks
+from .cache import bump_board_version, bump_project_version
+from .events import publish_board_changed, publish_projects_changed
+from .models import RecurrenceRule, Task
+from .stats import apply_deltas, status_priority_delta, tag_delta
+
+# Instances are created this far ahead of their due date
+LOOKAHEAD = timedelta(days=14)
+
+# Rules materialized per transaction
+BATCH_SIZE = 100
+
+
+def _periods_before(rule, start, moment):
+    '''Counts the whole periods (days, weeks or months) of the rule between `start` and `moment`.'''
+    if moment <= start:
+        return 0
+    if rule.frequency == RecurrenceRule.DAILY:
+        periods = (moment.date() - start.date()).days
+    elif rule.frequency == RecurrenceRule.WEEKLY:
+        periods = (moment.date() - start.date() + timedelta(days=start.weekday())).days // 7
+    else:
+        periods = (moment.year - start.year) * 12 + moment.month - start.month
+    # One period early, so the occurrences of the period holding `moment` are not skipped
+    return max(periods // rule.interval - 1, 0)
+
+
+def _periods(rule, start, skip=0):
+    '''Yields (period start, candidate occurrences) for every period of the rule, as naive local times.'''
+    for index in count(skip * rule.interval, rule.interval):
+        if rule.frequency == RecurrenceRule.DAILY:
+            day = start + timedelta(days=index)
+            yield day, [day]
+        elif rule.frequency == RecurrenceRule.WEEKLY:
+            monday = start - timedelta(days=start.weekday()) + timedelta(weeks=index)
+            yield monday, [monday + timedelta(days=day) for day in rule.weekdays or [start.weekday()]]
+        else:
+            year, month = divmod(start.month - 1 + index, 12)
+            year, month = start.year + year, month + 1
+            first = start.replace(year=year, month=month, day=1)
+            # As in RFC 5545, months without the day (the 31st, February 30th) have no occurrence
+            if start.day <= calendar.monthrange(year, month)[1]:
+                yield first, [first.replace(day=start.day)]
+            else:
+                yield first, []
+
+
+def series(rule, after):
+    '''Yields the occurrences of `rule` later than `after`, in order, until UNTIL or COUNT ends the series.
+
+    Occurrences are computed in local time, so a task due at 9:00 stays at
+    9:00 across daylight saving changes. As in RFC 5545, starts_at is always
+    the first occurrence and counts towards COUNT.
+    '''
+    tz = timezone.get_current_timezone()
+    start = timezone.localtime(rule.starts_at, tz).replace(tzinfo=None)
+    if rule.starts_at > after:
+        yield rule.starts_at
+    # Without COUNT nothing before `after` needs enumerating
+    skip = 0 if rule.count else _periods_before(rule, start, timezone.localtime(after, tz).replace(tzinfo=None))
+    seen = 1
+    for period_start, candidates in _periods(rule, start, skip):
+        if rule.until and timezone.make_aware(period_start, tz) > rule.until:
+            return
+        for candidate in candidates:
+            if candidate <= start:
+                continue
+            moment = timezone.make_aware(candidate, tz)
+            if rule.until and moment > rule.until:
+                return
+            seen += 1
+            if rule.count and seen > rule.count:
+                return
+            if moment > after:
+                yield moment
+
+
+def occurrences(rule, after, until):
+    '''Yields the occurrences of `rule` later than `after` and no later than `until`.'''
+    for moment in series(rule, after):
+        if moment > until:
+            return
+        yield moment
+
+
+def materialize(rules, horizon, created=False):
+    '''Creates the missing instances of `rules` due up to `horizon` in one transaction and returns them.
+
+    Instances copy the template's title, priority, description, project and
+    tags, and are bulk inserted with the statistics counters, board caches and
+    live events maintained as import_batch() does. Rules already materialized
+    up to `horizon` (by another worker, say) are left alone. With `created`,
+    the rules were created in the caller's transaction with their templates
+    loaded: no other worker can see them yet, and they have no instances.
+    '''
+    # Part of the caller's transaction when there is one, without a savepoint:
+    # nothing here catches errors, so a failure aborts the caller's work anyway
+    with transaction.atomic(savepoint=False):
+        if created:
+            rules = [rule for rule in rules if rule.materialized_until < horizon]
+            existing = set()
+        else:
+            rules = list(
+                RecurrenceRule.objects.select_for_update().select_related('template')
+                .filter(id__in=[rule.id for rule in rules], materialized_until__lt=horizon)
+            )
+            # Occurrences kept when a rule was edited already have their instance
+            existing = set(
+                Task.objects.filter(recurrence__in=rules, occurrence__gt=min(rule.materialized_until for rule in rules))
+                .values_list('recurrence_id', 'occurrence')
+            ) if rules else set()
+        if not rules:
+            return []
+        template_tags = defaultdict(set)
+        links = Task.tags.through.objects.filter(task_id__in=[rule.template_id for rule in rules])
+        for task_id, tag_id in links.values_list('task_id', 'tag_id'):
+            template_tags[task_id].add(tag_id)
+
+        tasks = []
+        exhausted = []
+        for rule in rules:
+            template = rule.template
+            for moment in occurrences(rule, rule.materialized_until, horizon):
+                if (rule.id, moment) not in existing:
+                    tasks.append(Task(
+                        user_id=template.user_id,
+                        project_id=template.project_id,
+                        title=template.title,
+                        priority=template.priority,
+                        description=template.description,
+                        due_date=moment,
+                        recurrence=rule,
+                        occurrence=moment,
+                    ))
+            if next(series(rule, horizon), None) is None:
+                exhausted.append(rule.id)
+        Task.objects.bulk_create(tasks)
+
+        through = Task.tags.through
+        through.objects.bulk_create([
+            through(task_id=task.id, tag_id=tag_id)
+            for task in tasks
+            for tag_id in template_tags[task.recurrence.template_id]
+        ])
+
+        deltas = defaultdict(Counter)
+        for task in tasks:
+            deltas[task.user_id].update(status_priority_delta(None, (task.status, task.priority)))
+            deltas[task.user_id].update(tag_delta(template_tags[task.recurrence.template_id], 1))
+        for user_id, user_deltas in deltas.items():
+            apply_deltas(user_id, user_deltas)
+
+        RecurrenceRule.objects.filter(id__in=[rule.id for rule in rules]).update(
+            materialized_until=horizon,
+            exhausted=Case(When(id__in=exhausted, then=Value(True)), default=F('exhausted')),
+        )
+
+    # bulk_create sends no signals
+    if tasks:
+        bump_board_version(*(task.user_id for task in tasks))
+        bump_project_version(*(task.project_id for task in tasks))
+        publish_board_changed(*(task.user_id for task in tasks))
+        publish_projects_changed(*(task.project_id for task in tasks))
+    return tasks
+
+
+def materialize_due(horizon, batch_size=BATCH_SIZE):
+    '''Materializes every open series up to `horizon`, one batch of rules per transaction.
+
+    Yields the number of instances created by each batch.
+    '''
+    behind = (
+        RecurrenceRule.objects.filter(exhausted=False, materialized_until__lt=horizon,
+                                      template__deleted_at__isnull=True)
+        .order_by('materialized_until', 'id')
+    )
+    while True:
+        batch = list(behind[:batch_size])
+        if not batch:
+            return
+        yield len(materialize(batch, horizon))
+
+
+def _untouched_future_instances(rule, now):
+    return rule.instances.filter(occurrence__gt=now, status="Pending").exclude(id=rule.template_id)
+
+
+def set_recurrence(task, frequency=None, interval=1, by_weekday="", until=None, count=None, now=None):
+    '''Makes `task` the template of a series, changes its rule, or ends it when `frequency` is empty.
+
+    Changing an existing rule regenerates the series in one bulk operation:
+    future instances still pending are soft-deleted and recreated from the
+    new rule and the template as it is now. Past instances and instances
+    already started or finished stay. Returns the rule, or None.
+    '''
+    now = now or timezone.now()
+    # Only a task already in a series can be the template of a rule
+    rule = RecurrenceRule.objects.filter(template=task).first() if task.recurrence_id else None
+    # Without a savepoint, as in materialize()
+    with transaction.atomic(savepoint=False):
+        if not frequency:
+            if rule is not None:
+                soft_delete_tasks(_untouched_future_instances(rule, now))
+                rule.delete()
+            return None
+
+        fields = {
+            'frequency': frequency,
+            'interval': interval or 1,
+            'by_weekday': by_weekday if frequency == RecurrenceRule.WEEKLY else "",
+            'starts_at': task.due_date,
+            'until': until,
+            'count': count,
+            # Occurrences before now are not created retroactively
+            'materialized_until': max(task.due_date, now),
+            'exhausted': False,
+        }
+        created = rule is None
+        if created:
+            rule = RecurrenceRule.objects.create(template=task, **fields)
+        else:
+            soft_delete_tasks(_untouched_future_instances(rule, now))
+            for name, value in fields.items():
+                setattr(rule, name, value)
+            rule.save()
+        Task.objects.filter(id=task.id).update(recurrence=rule, occurrence=task.due_date)
+        task.recurrence, task.occurrence = rule, task.due_date
+        materialize([rule], now + LOOKAHEAD, created=created)
+    return rule
@@ -0,0 +1,143 @@
+import smtplib
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Mod
+from django.utils import timezone
+from .models import Task, TaskReminder
+from .stats import OPEN_STATUSES
+
+# Due tasks read (and claimed) per round trip
+BATCH_SIZE = 500
+
+# Claims older than this whose outcome was never recorded are marked unknown
+STALE_CLAIM_AFTER = timedelta(minutes=10)
+
+
+def new_worker_id():
+    return uuid.uuid4().hex
+
+
+def due_task_batches(since, until, batch_size=BATCH_SIZE, shard=0, shards=1):
+    '''Yields batches of open tasks due in [since, until) that have no reminder yet.
+
+    Each batch is a range read on the (status, due_date) index, resumed after the
+    last (due_date, id) seen, so memory is bounded by `batch_size` however many
+    tasks are due. With several shards a worker only reads the ids of its shard.
+    '''
+    tasks = (
+        Task.objects.filter(status__in=OPEN_STATUSES, due_date__gte=since, due_date__lt=until)
+        .exclude(Exists(TaskReminder.objects.filter(task=OuterRef('pk'), due_date=OuterRef('due_date'))))
+        .order_by('due_date', 'id')
+        .values('id', 'title', 'due_date', 'user_id', 'user__email', 'user__username')
+    )
+    if shards > 1:
+        tasks = tasks.alias(shard=Mod(F('id'), shards)).filter(shard=shard)
+
+    position = None
+    while True:
+        page = tasks
+        if position:
+            due_date, task_id = position
+            page = page.filter(Q(due_date__gt=due_date) | Q(due_date=due_date, id__gt=task_id))
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        position = batch[-1]['due_date'], batch[-1]['id']
+
+
+def claim(batch, worker):
+    '''Claims the reminders of a batch; returns the tasks this worker won.
+
+    The unique (task, due_date) constraint lets exactly one worker insert each
+    claim, so concurrent workers never remind twice.
+    '''
+    TaskReminder.objects.bulk_create(
+        [TaskReminder(task_id=task['id'], due_date=task['due_date'], worker=worker) for task in batch],
+        ignore_conflicts=True,
+    )
+    won = set(
+        TaskReminder.objects.filter(
+            task_id__in=[task['id'] for task in batch], worker=worker, state=TaskReminder.CLAIMED
+        ).values_list('task_id', flat=True)
+    )
+    return [task for task in batch if task['id'] in won]
+
+
+def build_messages(tasks):
+    '''Groups claimed tasks into one reminder email per user; returns (messages, task ids without email).'''
+    by_user = defaultdict(list)
+    skipped = []
+    for task in tasks:
+        if task['user__email']:
+            by_user[(task['user__username'], task['user__email'])].append(task)
+        else:
+            skipped.append(task['id'])
+
+    messages = []
+    for (username, email), user_tasks in by_user.items():
+        lines = [
+            f"- {task['title']} (due {timezone.localtime(task['due_date']):%Y-%m-%d %H:%M})"
+            for task in user_tasks
+        ]
+        message = EmailMessage(
+            subject=f"{len(user_tasks)} task(s) due soon",
+            body=f"Hi {username},\n\nThese tasks are due soon:\n\n" + "\n".join(lines) + "\n",
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+        )
+        message.task_ids = [task['id'] for task in user_tasks]
+        messages.append(message)
+    return messages, skipped
+
+
+def deliver(tasks, worker, connection=None):
+    '''Sends the reminders of claimed tasks in one email connection and records the outcome.'''
+    messages, skipped = build_messages(tasks)
+    claims = TaskReminder.objects.filter(worker=worker, state=TaskReminder.CLAIMED)
+    if skipped:
+        claims.filter(task_id__in=skipped).update(state=TaskReminder.SKIPPED)
+
+    sent, failed = [], []
+    connection = connection or get_connection()
+    with connection:
+        for message in messages:
+            # One message at a time, so a failure only concerns its own claims
+            try:
+                delivered = connection.send_messages([message])
+            except (smtplib.SMTPException, OSError):
+                delivered = 0
+            (sent if delivered else failed).extend(message.task_ids)
+    claims.filter(task_id__in=sent).update(state=TaskReminder.SENT, sent_at=timezone.now())
+    # The mail server refused these, so they can be claimed again by a later cycle
+    claims.filter(task_id__in=failed).delete()
+    return len(sent), len(skipped)
+
+
+def expire_stale_claims(now=None):
+    '''Marks claims whose worker stopped before recording the outcome as unknown; returns their number.
+
+    Delivery is at most once: the worker may have stopped after the mail server
+    accepted the email, so such reminders are never sent again. Only the
+    rejections the mail server reports are retried. Unknown reminders are kept
+    for review instead.
+    '''
+    now = now or timezone.now()
+    stale = TaskReminder.objects.filter(state=TaskReminder.CLAIMED, claimed_at__lt=now - STALE_CLAIM_AFTER)
+    return stale.update(state=TaskReminder.UNKNOWN)
+
+
+def run_cycle(since, until, worker, batch_size=BATCH_SIZE, shard=0, shards=1):
+    '''Reminds every open task due in [since, until) at most once; returns (sent, skipped) counts.'''
+    sent = skipped = 0
+    for batch in due_task_batches(since, until, batch_size, shard, shards):
+        claimed = claim(batch, worker)
+        if claimed:
+            batch_sent, batch_skipped = deliver(claimed, worker)
+            sent += batch_sent
+            skipped += batch_skipped
+    return sent, skipped
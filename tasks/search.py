@@ -0,0 +1,88 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Task
+
+# Maximum number of ranked results returned by a search
+SEARCH_LIMIT = 50
+
+# The condition of TaskQuerySet.visible_to(); takes the user id twice
+VISIBLE_TO = """(
+    (tasks_task.project_id IS NULL AND tasks_task.user_id = %s)
+    OR tasks_task.project_id IN (SELECT project_id FROM tasks_projectmembership WHERE user_id = %s)
+)"""
+
+SQLITE_SEARCH = f"""
+    SELECT tasks_task.id FROM tasks_task_fts
+    JOIN tasks_task ON tasks_task.id = tasks_task_fts.rowid
+    WHERE tasks_task_fts MATCH %s AND {VISIBLE_TO} AND tasks_task.deleted_at IS NULL
+    ORDER BY bm25(tasks_task_fts), tasks_task.id DESC
+    LIMIT %s
+"""
+
+# The document expression must match the GIN index created in migration 0007
+POSTGRESQL_DOCUMENT = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))"
+POSTGRESQL_SEARCH = f"""
+    SELECT id FROM tasks_task
+    WHERE {VISIBLE_TO} AND deleted_at IS NULL AND {POSTGRESQL_DOCUMENT} @@ to_tsquery('english', %s)
+    ORDER BY ts_rank({POSTGRESQL_DOCUMENT}, to_tsquery('english', %s)) DESC, id DESC
+    LIMIT %s
+"""
+
+
+def search_terms(query):
+    '''Splits a user query into plain word tokens, dropping any search operators.'''
+    return re.findall(r"\w+", query.lower())
+
+
+# Result of the index lookup, per database name
+_index_available = {}
+
+
+def has_search_index():
+    '''Tells whether the database has the full-text index for the current backend.'''
+    name = connection.settings_dict['NAME']
+    if name not in _index_available:
+        if connection.vendor == 'sqlite':
+            _index_available[name] = 'tasks_task_fts' in connection.introspection.table_names()
+        else:
+            _index_available[name] = connection.vendor == 'postgresql'
+    return _index_available[name]
+
+
+def _ranked_ids(user, terms, limit):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Every term must match, the last word typed may be incomplete
+            match = " ".join(f'"{term}"*' for term in terms)
+            cursor.execute(SQLITE_SEARCH, [match, user.id, user.id, limit])
+        else:
+            tsquery = " & ".join(f"{term}:*" for term in terms)
+            cursor.execute(POSTGRESQL_SEARCH, [user.id, user.id, tsquery, tsquery, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_tasks(user, query, limit=SEARCH_LIMIT):
+    '''Returns the tasks visible to the user matching every word of `query` (as prefixes), best match first.
+
+    Uses SQLite FTS5 or the PostgreSQL GIN index when available, and falls back
+    to icontains scans on other databases.
+    '''
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if not has_search_index():
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(description__icontains=term)
+        return list(
+            Task.objects.visible_to(user).filter(condition)
+            .order_by('-updated_at', '-id')
+            .select_related('project')
+            .prefetch_related('tags')[:limit]
+        )
+
+    ids = _ranked_ids(user, terms, limit)
+    tasks = Task.objects.filter(id__in=ids).select_related('project').prefetch_related('tags').in_bulk()
+    return [tasks[task_id] for task_id in ids if task_id in tasks]
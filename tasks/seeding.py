@@ -0,0 +1,111 @@
+import math
+import random
+from datetime import timedelta
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.utils import timezone
+from .importer import BATCH_SIZE, import_batch
+from .models import Task
+
+# Username prefix of seeded accounts; the benchmarks pick their user among them
+SEED_PREFIX = "seed-user-"
+
+# Shared by every seeded account
+SEED_PASSWORD = "seed-pass-123"
+
+WORDS = (
+    "report budget meeting invoice review draft plan garden groceries doctor dentist "
+    "taxes email slides release deploy backup laptop train flight hotel contract "
+    "interview roadmap workshop newsletter survey audit migration onboarding payroll "
+    "presentation quarterly renewal insurance appointment birthday homework essay"
+).split()
+
+STATUS_WEIGHTS = {"Pending": 40, "In progress": 20, "Completed": 35, "Canceled": 5}
+PRIORITY_WEIGHTS = {"Low": 40, "Medium": 35, "High": 20, "Urgent": 5}
+# Number of tags on a task: most have one or none
+TAG_COUNT_WEIGHTS = {0: 30, 1: 40, 2: 20, 3: 10}
+
+# Spread of the per-user task counts (log-normal sigma): a few users own many tasks
+USER_SPREAD = 0.75
+
+
+def tag_names(count):
+    '''Returns `count` tag names, starting with the default tags.'''
+    names = ["Work", "Studies", "Home", "Meetings", "Goals", "Reading", "Shopping", "Bills"]
+    names += [f"{WORDS[i % len(WORDS)].title()} {i}" for i in range(max(count - len(names), 0))]
+    return names[:count]
+
+
+def user_task_counts(rng, users, tasks_per_user):
+    '''Draws skewed per-user task counts averaging `tasks_per_user`.'''
+    mean = math.exp(USER_SPREAD ** 2 / 2)
+    return [max(1, round(rng.lognormvariate(0, USER_SPREAD) / mean * tasks_per_user)) for _ in range(users)]
+
+
+def seed_rows(rng, usernames, counts, tags, now=None):
+    '''Yields import rows (see importer.clean_row) for `counts[i]` tasks of each user.
+
+    Statuses and priorities follow fixed weights, tag popularity follows a
+    Zipf-like curve, and due dates cluster around today: open tasks are mostly
+    upcoming, finished ones mostly past.
+    '''
+    now = now or timezone.now()
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+    tag_counts, tag_count_weights = zip(*TAG_COUNT_WEIGHTS.items())
+    tag_weights = [1 / (rank + 1) for rank in range(len(tags))]
+
+    for username, count in zip(usernames, counts):
+        for _ in range(count):
+            status = rng.choices(statuses, status_weights)[0]
+            due_date = None
+            if rng.random() < 0.8:
+                days = rng.gauss(-10 if status in ("Completed", "Canceled") else 7, 15)
+                due_date = now + timedelta(days=days, hours=rng.randint(0, 23))
+            tag_count = min(rng.choices(tag_counts, tag_count_weights)[0], len(tags))
+            yield {
+                'username': username,
+                'title': " ".join(rng.sample(WORDS, rng.randint(2, 4))).capitalize(),
+                'priority': rng.choices(priorities, priority_weights)[0],
+                'status': status,
+                'description': " ".join(rng.choices(WORDS, k=rng.randint(5, 30))) if rng.random() < 0.5 else None,
+                'due_date': due_date,
+                'tags': list({*rng.choices(tags, tag_weights, k=tag_count)}),
+            }
+
+
+def seed(users, tasks_per_user, tags, seed=42, batch_size=BATCH_SIZE, progress=None):
+    '''Creates (or tops up) `users` seeded accounts with tasks and returns the number of tasks created.
+
+    Rows go through importer.import_batch, so tags, statistics counters and
+    board caches are maintained exactly as for a real import.
+    '''
+    rng = random.Random(seed)
+    usernames = [f"{SEED_PREFIX}{i}" for i in range(users)]
+    password = make_password(SEED_PASSWORD)  # Hashed once, not once per user
+    User.objects.bulk_create(
+        [User(username=name, email=f"{name}@example.com", password=password) for name in usernames],
+        ignore_conflicts=True,
+    )
+    # import_batch creates the tags on first use
+    rows = seed_rows(rng, usernames, user_task_counts(rng, users, tasks_per_user), tag_names(tags))
+    created = 0
+    while batch := list(islice(rows, batch_size)):
+        created += len(import_batch(batch))
+        if progress:
+            progress(created)
+    return created
+
+
+def seeded_user(username=None):
+    '''Returns the given user, or the seeded user with the most tasks.'''
+    users = User.objects.all()
+    if username:
+        return users.filter(username=username).first()
+    busiest = (
+        Task.objects.filter(user__username__startswith=SEED_PREFIX)
+        .values('user').annotate(count=Count('id')).order_by('-count').first()
+    )
+    return users.get(id=busiest['user']) if busiest else None
@@ -0,0 +1,35 @@
+from django.urls import reverse
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+# How each key of a serialized task is computed, in output order
+TASK_SERIALIZERS = {
+    'id': lambda task: task.id,
+    'title': lambda task: task.title,
+    'priority': lambda task: task.priority,
+    'status': lambda task: task.status,
+    'description': lambda task: task.description,
+    'due_date': lambda task: _isoformat(task.due_date),
+    'created_at': lambda task: _isoformat(task.created_at),
+    'updated_at': lambda task: _isoformat(task.updated_at),
+    # Send it back with PUT or PATCH to have edits made since rejected with a 409
+    'version': lambda task: task.version,
+    # Id of the project sharing the task, or null for a private task
+    'project': lambda task: task.project_id,
+    'tags': lambda task: [tag.name for tag in task.tags.all()],
+    'edit_url': lambda task: reverse('task_update', kwargs={'task_id': task.id}),
+    'delete_url': lambda task: reverse('task_delete', kwargs={'task_id': task.id}),
+}
+
+TASK_FIELDS = tuple(TASK_SERIALIZERS)
+
+
+def task_to_dict(task, fields=TASK_FIELDS):
+    '''Serializes a task to a JSON-friendly dict; only the requested `fields` are computed.
+
+    Prefetch the tags when 'tags' is among the fields.
+    '''
+    return {field: TASK_SERIALIZERS[field](task) for field in fields}
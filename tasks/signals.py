@@ -1,8 +1,206 @@
-from django.db.models.signals import post_migrate
+from collections import Counter
+from django.db.backends.signals import connection_created
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
 from django.dispatch import receiver
-from .models import Tag
+from .cache import bump_board_version, bump_project_version, forget_membership, invalidate_tag_catalog
+from .events import publish_board_changed, publish_projects_changed, publish_task_event
+from .metrics import install_query_recorder
+from .models import Project, ProjectMembership, Tag, Task, TaskCounter
+from .stats import apply_deltas, rebuild_user_stats, status_priority_delta, tag_delta
 
 @receiver(post_migrate)
 def create_default_tags(sender, **kwargs):
     if sender.name == "tasks":
-        Tag.create_default_tags()
\ No newline at end of file
+        Tag.create_default_tags()
+
+
+def _boards_of_tasks(**filters):
+    '''Returns the ids of the owners and of the projects of the tasks matched by `filters`.'''
+    rows = Task.objects.filter(**filters).values_list('user_id', 'project_id').distinct()
+    return {user_id for user_id, _ in rows}, {project_id for _, project_id in rows if project_id}
+
+
+def _bump_boards(user_ids, project_ids):
+    bump_board_version(*user_ids)
+    bump_project_version(*project_ids)
+
+
+def _projects_of(instance):
+    '''The task's project, and the one it was loaded with when it moved.'''
+    return {instance.project_id, getattr(instance, '_loaded_values', {}).get('project_id')} - {None}
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_board(sender, instance, **kwargs):
+    _bump_boards([instance.user_id], _projects_of(instance))
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def invalidate_retagged_boards(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # task.tags.add/remove/clear(): only the boards showing the task change
+        if action in ("post_add", "post_remove", "post_clear"):
+            _bump_boards([instance.user_id], _projects_of(instance))
+    elif action in ("post_add", "post_remove"):
+        # tag.task_set.add/remove(): pk_set holds task ids
+        _bump_boards(*_boards_of_tasks(pk__in=pk_set))
+    elif action == "pre_clear":
+        # The tasks are unknown after the clear, so look them up before it
+        _bump_boards(*_boards_of_tasks(tags=instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag_boards(sender, instance, created=False, **kwargs):
+    # A renamed or deleted tag changes every board showing it; new tags show nowhere yet
+    if not created:
+        user_ids, project_ids = _boards_of_tasks(tags=instance)
+        _bump_boards(user_ids, project_ids)
+        publish_board_changed(*user_ids)
+        publish_projects_changed(*project_ids)
+
+
+@receiver(post_save, sender=Project)
+def invalidate_renamed_project(sender, instance, created, **kwargs):
+    # Cards show the project name
+    if not created:
+        bump_project_version(instance.id)
+        publish_projects_changed(instance.id)
+
+
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+def invalidate_member_board(sender, instance, **kwargs):
+    # Joining or leaving a project adds or removes its tasks on the member's board
+    forget_membership(instance.user_id, instance.project_id)
+    bump_board_version(instance.user_id)
+    publish_board_changed(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def refresh_tag_catalog(sender, instance, **kwargs):
+    invalidate_tag_catalog(instance.user_id)
+
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    loaded_project_id = loaded.get('project_id', instance.project_id)
+    # The next save of this instance starts from here (invalidate_task_board ran already)
+    loaded['project_id'] = instance.project_id
+    if loaded_project_id != instance.project_id:
+        # Moved in or out of a project: the task leaves some boards and joins others
+        publish_board_changed(instance.user_id)
+        publish_projects_changed(loaded_project_id, instance.project_id)
+        return
+    publish_task_event(instance.user_id, instance.project_id, {
+        'type': "task.created" if created else "task.updated",
+        'id': instance.id,
+        'status': instance.status,
+    })
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    publish_task_event(instance.user_id, instance.project_id, {'type': "task.deleted", 'id': instance.id})
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def publish_task_retagged(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        publish_task_event(instance.user_id, instance.project_id,
+                           {'type': "task.updated", 'id': instance.id, 'status': instance.status})
+    elif pk_set:
+        user_ids, project_ids = _boards_of_tasks(pk__in=pk_set)
+        publish_board_changed(*user_ids)
+        publish_projects_changed(*project_ids)
+
+
+def _loaded_status_priority(instance):
+    loaded = getattr(instance, '_loaded_values', {})
+    old = (loaded.get('status', DEFERRED), loaded.get('priority', DEFERRED))
+    return None if DEFERRED in old else old
+
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'status', 'priority'} & set(update_fields):
+        return
+    new = (instance.status, instance.priority)
+    old = None if created else _loaded_status_priority(instance)
+    if old is None and not created:
+        # Saved from an instance that was not loaded from the database: recount
+        rebuild_user_stats([instance.user_id])
+    else:
+        apply_deltas(instance.user_id, status_priority_delta(old, new))
+
+    if not hasattr(instance, '_loaded_values'):
+        instance._loaded_values = {}
+    instance._loaded_values.update(status=instance.status, priority=instance.priority)
+
+
+@receiver(pre_delete, sender=Task)
+def remember_deleted_task_tags(sender, instance, **kwargs):
+    # The tag links are gone by post_delete
+    instance._deleted_tag_ids = list(
+        Task.tags.through.objects.filter(task_id=instance.id).values_list('tag_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Task)
+def count_deleted_task(sender, instance, **kwargs):
+    old = _loaded_status_priority(instance) or (instance.status, instance.priority)
+    deltas = status_priority_delta(old, None)
+    deltas.update(tag_delta(getattr(instance, '_deleted_tag_ids', ()), -1))
+    apply_deltas(instance.user_id, deltas)
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def count_task_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    through = Task.tags.through
+    if not reverse:
+        # task.tags.add/remove/clear(): pk_set holds tag ids
+        if action == "pre_remove":
+            instance._unlinked_tag_ids = list(
+                through.objects.filter(task_id=instance.id, tag_id__in=pk_set).values_list('tag_id', flat=True)
+            )
+        elif action == "pre_clear":
+            instance._unlinked_tag_ids = list(
+                through.objects.filter(task_id=instance.id).values_list('tag_id', flat=True)
+            )
+        elif action == "post_add":
+            apply_deltas(instance.user_id, tag_delta(pk_set, 1))
+        elif action in ("post_remove", "post_clear"):
+            apply_deltas(instance.user_id, tag_delta(instance.__dict__.pop('_unlinked_tag_ids', ()), -1))
+        return
+
+    # tag.task_set.add/remove/clear(): pk_set holds task ids, count the links per owner
+    key = (TaskCounter.TAG, str(instance.id))
+    if action == "pre_remove":
+        links = through.objects.filter(tag_id=instance.id, task_id__in=pk_set)
+        instance._unlinked_users = Counter(links.values_list('task__user_id', flat=True))
+    elif action == "pre_clear":
+        links = through.objects.filter(tag_id=instance.id)
+        instance._unlinked_users = Counter(links.values_list('task__user_id', flat=True))
+    elif action == "post_add":
+        for user_id, count in Counter(Task.objects.filter(pk__in=pk_set).values_list('user_id', flat=True)).items():
+            apply_deltas(user_id, {key: count})
+    elif action in ("post_remove", "post_clear"):
+        for user_id, count in instance.__dict__.pop('_unlinked_users', Counter()).items():
+            apply_deltas(user_id, {key: -count})
+
+
+@receiver(pre_delete, sender=Tag)
+def drop_tag_counters(sender, instance, **kwargs):
+    TaskCounter.objects.filter(dimension=TaskCounter.TAG, key=str(instance.id)).delete()
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    # Counts the SQL of requests whichever thread (or sync_to_async worker) runs it
+    install_query_recorder(connection)
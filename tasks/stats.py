@@ -0,0 +1,144 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+from .models import Task, TaskCounter
+
+# Statuses whose tasks can become overdue
+OPEN_STATUSES = ["Pending", "In progress"]
+
+
+def status_priority_key(status, priority):
+    return f"{status}|{priority}"
+
+
+def _add_to_counters(user_id, deltas):
+    '''Adds `deltas` to existing counters in one UPDATE; returns the keys that had no counter.'''
+    counters = TaskCounter.objects.filter(user_id=user_id, key__in={key for _, key in deltas})
+    existing = {
+        (dimension, key) for dimension, key in counters.values_list('dimension', 'key')
+        if (dimension, key) in deltas
+    }
+    if existing:
+        counters.filter(
+            reduce(or_, (Q(dimension=dimension, key=key) for dimension, key in existing))
+        ).update(count=F('count') + Case(
+            *(When(dimension=dimension, key=key, then=Value(deltas[dimension, key])) for dimension, key in existing),
+            default=Value(0),
+        ))
+    return [counter for counter in deltas if counter not in existing]
+
+
+def apply_deltas(user_id, deltas):
+    '''Adds `deltas` ({(dimension, key): change}) to the user's counters.
+
+    Costs a read, an update and (for new counters) an insert, however many
+    counters change.
+    '''
+    deltas = {counter: delta for counter, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    missing = _add_to_counters(user_id, deltas)
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            TaskCounter.objects.bulk_create([
+                TaskCounter(user_id=user_id, dimension=dimension, key=key, count=deltas[dimension, key])
+                for dimension, key in missing
+            ])
+    except IntegrityError:  # Some were created concurrently, add to them instead
+        missing = _add_to_counters(user_id, {counter: deltas[counter] for counter in missing})
+        if missing:
+            raise
+
+
+def status_priority_delta(old, new):
+    '''Returns the counter changes for a task going from `old` to `new` (status, priority) pairs.
+
+    Either side may be None, for a task that is created or removed.
+    '''
+    deltas = Counter()
+    if old == new:
+        return deltas
+    if old:
+        deltas[(TaskCounter.STATUS_PRIORITY, status_priority_key(*old))] -= 1
+    if new:
+        deltas[(TaskCounter.STATUS_PRIORITY, status_priority_key(*new))] += 1
+    return deltas
+
+
+def tag_delta(tag_ids, change):
+    return Counter({(TaskCounter.TAG, str(tag_id)): change for tag_id in tag_ids})
+
+
+def rebuild_user_stats(user_ids=None):
+    '''Recomputes the counters of the given users (of everyone by default) from the task table.'''
+    tasks = Task.objects.all()
+    if user_ids is not None:
+        tasks = tasks.filter(user_id__in=user_ids)
+    through = Task.tags.through
+    links = through.objects.filter(task__in=tasks)
+
+    counters = [
+        TaskCounter(
+            user_id=row['user_id'],
+            dimension=TaskCounter.STATUS_PRIORITY,
+            key=status_priority_key(row['status'], row['priority']),
+            count=row['count'],
+        )
+        for row in tasks.values('user_id', 'status', 'priority').annotate(count=Count('id')).order_by()
+    ] + [
+        TaskCounter(user_id=row['task__user_id'], dimension=TaskCounter.TAG, key=str(row['tag_id']), count=row['count'])
+        for row in links.values('task__user_id', 'tag_id').annotate(count=Count('id')).order_by()
+    ]
+
+    with transaction.atomic():
+        stale = TaskCounter.objects.all()
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+        stale.delete()
+        TaskCounter.objects.bulk_create(counters, batch_size=1000)
+    return len(counters)
+
+
+def user_stats(user, tag_names=None):
+    '''Returns the user's dashboard figures from the counters table.
+
+    `tag_names` maps tag ids to names. The overdue count depends on the clock, so
+    it is counted on the (user, status, due_date) index instead of being stored.
+    '''
+    by_status = {status: 0 for status, _ in Task.STATUS_CHOICES}
+    by_priority = {priority: 0 for priority, _ in Task.PRIORITY_CHOICES}
+    matrix = {status: dict(by_priority) for status in by_status}
+    by_tag = {}
+
+    for counter in TaskCounter.objects.filter(user=user).exclude(count=0):
+        if counter.dimension == TaskCounter.STATUS_PRIORITY:
+            status, priority = counter.key.split("|", 1)
+            by_status[status] = by_status.get(status, 0) + counter.count
+            by_priority[priority] = by_priority.get(priority, 0) + counter.count
+            matrix.setdefault(status, {})[priority] = counter.count
+        elif counter.dimension == TaskCounter.TAG:
+            name = (tag_names or {}).get(int(counter.key), counter.key)
+            by_tag[name] = counter.count
+
+    overdue = Task.objects.live().filter(
+        user=user, status__in=OPEN_STATUSES, due_date__lt=timezone.now()
+    ).count()
+
+    return {
+        'total': sum(by_status.values()),
+        'by_status': by_status,
+        'by_priority': by_priority,
+        'matrix': matrix,
+        # Status rows of the status x priority table, in choice order
+        'rows': [
+            {'status': status, 'counts': [matrix[status].get(p, 0) for p in by_priority], 'total': by_status[status]}
+            for status in matrix
+        ],
+        'by_tag': dict(sorted(by_tag.items())),
+        'overdue': overdue,
+    }
@@ -0,0 +1,56 @@
+import gzip
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are written
+    brotli = None
+
+# Text formats worth compressing; images and fonts are compressed already
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml')
+
+# Variants saving less than this fraction of the file are not kept
+MIN_SAVING = 0.05
+
+
+def compressors():
+    '''Returns (file suffix, compress function) pairs for the available encodings.'''
+    # mtime=0 keeps the gzip output identical across collectstatic runs
+    pairs = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        pairs.insert(0, ('.br', brotli.compress))
+    return pairs
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    '''Content-hashed static files, each with pre-compressed .gz (and .br) variants.
+
+    collectstatic writes the variants next to the files, so the static files
+    middleware sends them without compressing per request. As manifest_strict
+    is left on, a file missing from the manifest raises instead of getting
+    its plain name, which immutable caching would then serve stale for a year.
+    '''
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            names.add(name)
+            if hashed_name and not isinstance(processed, Exception):
+                names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                self._save(name + suffix, ContentFile(compressed))
@@ -1,3 +1,1542 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import smtplib
+import tempfile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.core.cache import caches
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
 
-# Create your tests here.
+from . import urls
+from .benchmarks import SCENARIOS, SKIPPED_ROUTES, ClientTransport, WSGITransport, compare, run_suite
+from .board import load_board, render_board
+from .cache import bump_board_version, cache_stats, complete_tags, member_project_ids, tag_catalog
+from .export import stream_export
+from .forms import TaskForm
+from .search import search_tasks
+from .context_processors.demo_timer import demo_session_timer
+from .events import LocalBroker, get_broker
+from .stats import rebuild_user_stats, user_stats
+from .models import DemoAccount, Project, ProjectMembership, RecurrenceRule, Task, TaskCounter, TaskReminder, Tag
+from .metrics import Histogram, registry
+from .middleware import StaticFilesMiddleware
+from .pagination import _page_queryset, paginate
+from .demo import DEMO_RATE_LIMIT, DEMO_TASKS, create_demo_account, purge_expired_demos
+from .seeding import SEED_PREFIX, seeded_user
+from .reminders import claim, deliver, due_task_batches, expire_stale_claims, run_cycle
+from .recurrence import LOOKAHEAD, materialize_due, occurrences, set_recurrence
+
+
+def make_tasks(user, count, tags=(), **fields):
+    '''Creates `count` tasks for `user`, each tagged with `tags`.'''
+    tasks = Task.objects.bulk_create([
+        Task(user=user, title=f"Task {i}", **fields) for i in range(count)
+    ])
+    through = Task.tags.through
+    through.objects.bulk_create([
+        through(task_id=task.id, tag_id=tag.id) for task in tasks for tag in tags
+    ])
+    # bulk_create sends no signals, so invalidate cached boards like the bulk views do
+    bump_board_version(user.id)
+    return tasks
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class TaskTestCase(TestCase):
+    '''Base test case with a signed-in user and an empty cache.'''
+
+    def setUp(self):
+        # Test users reuse ids across tests, so drop boards cached by earlier tests
+        clear_caches()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.client.force_login(self.user)
+
+
+class BoardTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.work = Tag.objects.get(name="Work")
+
+    def count_board_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('tasks'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        make_tasks(self.user, 3, tags=[self.work], status="Pending")
+        member_project_ids(self.user.id)  # cached until the user joins or leaves a project
+        small = self.count_board_queries()
+
+        for status, _ in Task.STATUS_CHOICES:
+            make_tasks(self.user, 30, tags=[self.work], status=status)
+        large = self.count_board_queries()
+
+        self.assertEqual(small, large)
+
+    def test_columns_are_grouped_and_capped(self):
+        make_tasks(self.user, 5, status="Completed")
+        make_tasks(self.user, 2, status="Pending")
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        make_tasks(other, 4, status="Pending")
+
+        columns = {column['status']: column for column in load_board(self.user, limit=3)}
+
+        self.assertEqual(len(columns["Completed"]['tasks']), 3)
+        self.assertEqual(columns["Completed"]['total'], 5)
+        self.assertTrue(columns["Completed"]['has_more'])
+        self.assertEqual(len(columns["Pending"]['tasks']), 2)
+        self.assertFalse(columns["Pending"]['has_more'])
+        self.assertEqual(columns["Canceled"]['tasks'], [])
+
+    def test_unchanged_cards_come_from_the_cache(self):
+        first, second = make_tasks(self.user, 2, tags=[self.work])
+        render_board(self.user)
+        Task.objects.filter(id=first.id).update(title="Renamed", updated_at=timezone.now())
+        # Neither version nor updated_at moves, so the cached card is kept
+        Task.objects.filter(id=second.id).update(title="Stale")
+
+        html = render_board(self.user)
+        self.assertIn("Renamed", html)
+        self.assertNotIn("Stale", html)
+
+        # Cards show tag names, which change without saving the task
+        Tag.objects.filter(id=self.work.id).update(name="Office")
+        html = render_board(self.user)
+        self.assertEqual(html.count("Office"), 2)
+        self.assertIn("Stale", html)
+
+
+class HomeFeedTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.work = Tag.objects.get(name="Work")
+        self.home = Tag.objects.get(name="Home")
+
+    def test_query_count_is_constant(self):
+        make_tasks(self.user, 2, tags=[self.work, self.home])
+        tag_catalog(self.user.id)  # loaded once per process, not per request
+        member_project_ids(self.user.id)  # cached until the user joins or leaves a project
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('home'))
+
+        make_tasks(self.user, 40, tags=[self.work, self.home])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('home'))
+
+        self.assertEqual(len(response.context['tasks']), 30)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_tag_filter_returns_each_task_once(self):
+        tagged = make_tasks(self.user, 3, tags=[self.work, self.home])
+        make_tasks(self.user, 2)
+
+        response = self.client.get(reverse('home'), {'tag': "Work"})
+
+        self.assertEqual(
+            sorted(task.id for task in response.context['tasks']),
+            sorted(task.id for task in tagged),
+        )
+
+    def test_cache_key_ignores_raw_query_strings(self):
+        make_tasks(self.user, 3, tags=[self.work])
+        first = self.client.get(reverse('home'), {'tag': "Work", 'cursor': "not a cursor"})
+        self.assertEqual(len(first.context['tasks']), 3)
+        self.client.get(reverse('home'), {'tag': "No such tag"})
+
+        # Other invalid cursors and unknown tags are served the pages already cached
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home'), {'tag': "Work", 'cursor': "\x00\n" * 200})
+            response = self.client.get(reverse('home'), {'tag': "Other tag \x7f"})
+        self.assertFalse([query for query in queries.captured_queries if 'tasks_task' in query['sql']])
+        self.assertNotIn("Other tag", response.content.decode())
+
+
+class IndexUsageTests(TaskTestCase):
+    '''Checks that the query planner picks the Task indexes for the hot filter paths.'''
+
+    def setUp(self):
+        super().setUp()
+        make_tasks(self.user, 20, status="Pending")
+        if connection.vendor == 'postgresql':
+            # A tiny test table would otherwise always be sequentially scanned
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_board_filter_uses_user_status_index(self):
+        queryset = Task.objects.live().filter(user=self.user, status="Pending").order_by('due_date')
+        self.assertUsesIndex(queryset, 'task_user_status_due_idx')
+
+    def test_recent_tasks_use_updated_index(self):
+        queryset = Task.objects.live().filter(user=self.user).order_by('-updated_at')
+        self.assertUsesIndex(queryset, 'task_user_updated_idx')
+
+    def test_archived_pages_use_archive_index(self):
+        queryset = Task.objects.archived().filter(user=self.user, status="Completed").order_by('-updated_at')
+        self.assertUsesIndex(queryset, 'task_user_archived_idx')
+
+    def assertReadsVisibleTasksThroughIndexes(self, plan, *index_names):
+        for index_name in index_names:
+            self.assertIn(index_name, plan)
+        # Neither branch may scan (or sort) the tasks of every user
+        self.assertNotRegex(plan, r"SCAN tasks_task\b|Seq Scan on tasks_task")
+        self.assertNotIn('task_archivable_idx', plan)
+
+    def visible_project(self):
+        project = Project.objects.create(name="Launch")
+        ProjectMembership.objects.create(project=project, user=self.user, role=ProjectMembership.EDITOR)
+        for i in range(20):
+            other = User.objects.create_user(username=f"user-{i}")
+            make_tasks(other, 5, status="Pending", project=project if i == 0 else None)
+        # Plans are chosen from table statistics, as on a production database
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_visible_pages_use_an_index_per_branch(self):
+        self.visible_project()
+        queryset = _page_queryset(Task.objects.live(), None, 30, self.user)
+        self.assertReadsVisibleTasksThroughIndexes(queryset.explain(), 'task_user_updated_idx')
+        self.assertEqual(len(queryset), 25)
+
+    def test_visible_column_pages_use_an_index_per_branch(self):
+        self.visible_project()
+        queryset = _page_queryset(Task.objects.live().filter(status="Pending"), None, 30, self.user)
+        self.assertReadsVisibleTasksThroughIndexes(
+            queryset.explain(), 'task_user_status_updated_idx', 'task_project_updated_idx',
+        )
+
+    def test_board_uses_an_index_per_branch(self):
+        self.visible_project()
+        with CaptureQueriesContext(connection) as ctx:
+            load_board(self.user)
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {ctx.captured_queries[0]['sql']}")
+            plan = "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+        self.assertReadsVisibleTasksThroughIndexes(plan, 'task_user_updated_idx')
+
+    def test_reminder_window_uses_due_date_index(self):
+        now = timezone.now()
+        queryset = Task.objects.filter(
+            status__in=["Pending", "In progress"], due_date__gte=now, due_date__lt=now + timedelta(hours=1)
+        ).order_by('due_date', 'id')
+        self.assertUsesIndex(queryset, 'task_status_due_idx')
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_connections_are_persistent_and_health_checked(self):
+        self.assertGreater(connection.settings_dict['CONN_MAX_AGE'], 0)
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+class KeysetPaginationTests(TaskTestCase):
+    def test_pages_walk_every_task_once(self):
+        created = make_tasks(self.user, 25, status="Pending")
+        make_tasks(self.user, 5, status="Completed")
+
+        seen, cursor = [], None
+        while True:
+            params = {'status': "Pending", 'page_size': 10}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('task_page'), params).json()
+            seen += [task['id'] for task in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(sorted(seen), sorted(task.id for task in created))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_deep_page_query_count_matches_first_page(self):
+        make_tasks(self.user, 60)
+        first = self.client.get(reverse('task_page'), {'page_size': 10}).json()
+
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get(reverse('task_page'), {'page_size': 10})
+        with CaptureQueriesContext(connection) as later_page:
+            self.client.get(reverse('task_page'), {'page_size': 10, 'cursor': first['next_cursor']})
+
+        self.assertEqual(len(first_page.captured_queries), len(later_page.captured_queries))
+
+    def test_empty_queryset_pages_nothing(self):
+        make_tasks(self.user, 3)
+        self.assertEqual(paginate(Task.objects.none(), user=self.user), ([], None))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('task_page'), {'cursor': "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_home_links_to_older_tasks(self):
+        make_tasks(self.user, 35)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['tasks']), 30)
+
+        older = self.client.get(reverse('home'), {'cursor': response.context['next_cursor']})
+        self.assertEqual(len(older.context['tasks']), 5)
+        self.assertIsNone(older.context['next_cursor'])
+
+
+class BoardCacheTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(user=self.user, title="Write report")
+
+    def test_repeated_board_requests_hit_the_cache(self):
+        self.client.get(reverse('tasks'))
+        before = cache_stats()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('tasks'))
+
+        self.assertContains(response, "Write report")
+        self.assertEqual(cache_stats()['hits'], before['hits'] + 1)
+        self.assertFalse(any('tasks_task' in query['sql'] for query in ctx.captured_queries))
+
+    def test_task_changes_invalidate_the_board(self):
+        self.client.get(reverse('tasks'))
+
+        self.task.title = "Write summary"
+        self.task.save()
+        self.assertContains(self.client.get(reverse('tasks')), "Write summary")
+
+        self.task.tags.add(Tag.objects.get(name="Work"))
+        self.assertContains(self.client.get(reverse('tasks')), "Work")
+
+        self.task.delete()
+        self.assertNotContains(self.client.get(reverse('tasks')), "Write summary")
+
+    def test_tag_rename_invalidates_boards_showing_it(self):
+        tag = Tag.objects.get(name="Work")
+        self.task.tags.add(tag)
+        self.client.get(reverse('tasks'))
+
+        tag.name = "Office"
+        tag.save()
+
+        self.assertContains(self.client.get(reverse('tasks')), "Office")
+
+    def test_versions_are_kept_in_the_cache_shared_by_every_process(self):
+        self.client.get(reverse('tasks'))
+        # A management command bumps the version in its own process, with its own local cache
+        caches['shared'].incr(f"board-version:{self.user.id}")
+
+        Task.objects.filter(id=self.task.id).update(title="Write summary", updated_at=timezone.now())
+        self.assertContains(self.client.get(reverse('tasks')), "Write summary")
+
+    def test_other_users_changes_keep_the_cache(self):
+        self.client.get(reverse('tasks'))
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        before = cache_stats()
+
+        Task.objects.create(user=other, title="Unrelated")
+        self.client.get(reverse('tasks'))
+
+        self.assertEqual(cache_stats()['hits'], before['hits'] + 1)
+
+
+class TagCatalogTests(TaskTestCase):
+    def test_form_renders_and_validates_without_tag_queries(self):
+        work = Tag.objects.get(name="Work")
+        tag_catalog()  # warm the catalog
+
+        with CaptureQueriesContext(connection) as ctx:
+            form = TaskForm(data={'title': "Plan", 'priority': "Low", 'status': "Pending", 'tags': [work.id]})
+            form.as_p()
+            self.assertTrue(form.is_valid())
+
+        self.assertEqual(form.cleaned_data['tags'], [work])
+        self.assertFalse(any('tasks_tag' in query['sql'] for query in ctx.captured_queries))
+
+    def test_unknown_tag_is_rejected(self):
+        form = TaskForm(data={'title': "Plan", 'priority': "Low", 'status': "Pending", 'tags': [999999]})
+        self.assertFalse(form.is_valid())
+        self.assertIn('tags', form.errors)
+
+    def test_tag_changes_refresh_the_catalog(self):
+        tag_catalog()
+        Tag.objects.create(name="Garden")
+        self.assertIn("Garden", [tag.name for tag in tag_catalog()])
+
+        Tag.objects.get(name="Garden").delete()
+        self.assertNotIn("Garden", [tag.name for tag in tag_catalog()])
+
+    def test_tags_are_namespaced_per_user(self):
+        bob = User.objects.create_user(username="bob", password="secret-pass-123")
+        garden = Tag.objects.create(user=self.user, name="Garden")
+        Tag.objects.create(user=bob, name="Garden")  # Same name, other namespace
+        self.assertIn(garden, tag_catalog(self.user.id))
+        self.assertEqual([tag.name for tag in tag_catalog(bob.id)].count("Garden"), 1)
+        self.assertNotIn("Garden", [tag.name for tag in tag_catalog()])
+
+        # Other users' tags are neither offered nor accepted
+        form = TaskForm(data={'title': "Plan", 'priority': "Low", 'status': "Pending", 'tags': [garden.id]}, user=bob)
+        self.assertFalse(form.is_valid())
+        self.client.post(reverse('task_create'), {'add_tag': "", 'name': "Fitness"})
+        self.assertEqual(Tag.objects.get(name="Fitness").user, self.user)
+        # Shared tags cannot be renamed from the task form
+        work = Tag.objects.get(name="Work")
+        response = self.client.post(reverse('task_create'), {'edit_tag': "", 'tag_id': work.id, 'new_name': "Job"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_prefix_completion(self):
+        Tag.objects.create(user=self.user, name="work trips")
+        Tag.objects.create(user=self.user, name="Worship")
+        tag_catalog(self.user.id)  # warm the catalog
+        with CaptureQueriesContext(connection) as ctx:
+            names = [tag.name for tag in complete_tags(self.user.id, "wor")]
+        self.assertEqual(names, ["Work", "work trips", "Worship"])
+        self.assertFalse(any('tasks_tag' in query['sql'] for query in ctx.captured_queries))
+        self.assertEqual([tag.name for tag in complete_tags(self.user.id, "WOR", limit=1)], ["Work"])
+        self.assertEqual(complete_tags(self.user.id, "xyz"), [])
+
+        response = self.client.get(reverse('api_tag_list'), {'q': "wo", 'limit': 2})
+        self.assertEqual([tag['name'] for tag in response.json()], ["Work", "work trips"])
+
+    def test_created_task_keeps_its_tags(self):
+        work = Tag.objects.get(name="Work")
+        self.client.post(reverse('task_create'), {
+            'title': "Plan", 'priority': "Low", 'status': "Pending", 'tags': [work.id],
+        })
+        self.assertEqual(list(Task.objects.get(title="Plan").tags.all()), [work])
+
+
+class BulkTaskTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = make_tasks(self.user, 5)
+        self.ids = [task.id for task in self.tasks]
+        self.work = Tag.objects.get(name="Work")
+
+    def bulk(self, **data):
+        return self.client.post(reverse('task_bulk'), data)
+
+    def test_status_change_updates_owned_tasks_only(self):
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        foreign = make_tasks(other, 1)[0]
+
+        response = self.bulk(action="status", status="Completed", task_ids=self.ids + [foreign.id])
+
+        self.assertEqual(response.json()['affected'], 5)
+        self.assertIn('elapsed_ms', response.json())
+        self.assertEqual(Task.objects.filter(status="Completed").count(), 5)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, "Pending")
+
+    def test_tags_are_added_and_removed(self):
+        self.tasks[0].tags.add(self.work)
+
+        self.bulk(action="add_tags", tags=[self.work.id], task_ids=self.ids)
+        self.assertEqual(self.work.task_set.count(), 5)
+
+        self.bulk(action="remove_tags", tags=[self.work.id], task_ids=self.ids[:2])
+        self.assertEqual(self.work.task_set.count(), 3)
+
+    def test_delete_and_board_invalidation(self):
+        self.client.get(reverse('tasks'))
+        self.bulk(action="delete", task_ids=self.ids[:3])
+
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 2)
+        response = self.client.get(reverse('tasks'))
+        self.assertEqual(sum(len(column['tasks']) for column in response.context['columns']), 2)
+
+    def test_missing_action_value_is_rejected(self):
+        response = self.bulk(action="status", task_ids=self.ids)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.json()['errors'])
+
+
+class ExportTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        work = Tag.objects.get(name="Work")
+        home = Tag.objects.get(name="Home")
+        make_tasks(self.user, 3, tags=[work, home], priority="High")
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        make_tasks(other, 2)
+
+    def export(self, export_format):
+        response = self.client.get(reverse('task_export'), {'format': export_format})
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['user'], "alice")
+        self.assertEqual(sorted(rows[0]['tags'].split(";")), ["Home", "Work"])
+
+    def test_jsonl_export(self):
+        rows = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['priority'], "High")
+
+    def test_tags_are_fetched_per_chunk(self):
+        with CaptureQueriesContext(connection) as ctx:
+            lines = list(stream_export(Task.objects.filter(user=self.user), 'jsonl', chunk_size=2))
+        self.assertEqual(len(lines), 3)
+        # One task query read in two chunks, plus one tags query per chunk
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_command_exports_every_user(self):
+        out = io.StringIO()
+        call_command('export_tasks', '--format', 'jsonl', stdout=out)
+        users = {json.loads(line)['user'] for line in out.getvalue().splitlines()}
+        self.assertEqual(users, {"alice", "bob"})
+
+
+class ImportTests(TaskTestCase):
+    def write_file(self, content, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_csv_import_creates_tasks_and_tags(self):
+        path = self.write_file(
+            "title,priority,status,tags\n"
+            "Pay rent,High,Pending,Bills;Home\n"
+            "Read book,Low,In progress,Reading;Hobby\n",
+            ".csv",
+        )
+        call_command('import_tasks', path, '--user', 'alice', stdout=io.StringIO())
+
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 2)
+        read = Task.objects.get(title="Read book")
+        self.assertEqual(sorted(tag.name for tag in read.tags.all()), ["Hobby", "Reading"])
+        # New tags go to the importing user's namespace
+        self.assertEqual(Tag.objects.get(name="Hobby").user, self.user)
+        self.assertIn("Hobby", [tag.name for tag in tag_catalog(self.user.id)])
+        self.assertNotIn("Hobby", [tag.name for tag in tag_catalog()])
+
+    def test_export_round_trip(self):
+        make_tasks(self.user, 3, tags=[Tag.objects.get(name="Work")])
+        out = io.StringIO()
+        call_command('export_tasks', '--format', 'jsonl', stdout=out)
+        path = self.write_file(out.getvalue(), ".jsonl")
+
+        call_command('import_tasks', path, '--batch-size', '2', stdout=io.StringIO())
+
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(Tag.objects.get(name="Work").task_set.count(), 6)
+
+    def test_rows_of_the_wrong_type_are_row_errors(self):
+        for line in ['{"title": 5}', '{"title": "Plan", "tags": [1]}', '["Plan"]']:
+            path = self.write_file('{"title": "First"}\n' + line + "\n", ".jsonl")
+            with self.assertRaisesMessage(CommandError, "Row 2:"):
+                call_command('import_tasks', path, '--user', 'alice', stdout=io.StringIO())
+        self.assertFalse(Task.objects.exists())
+
+    def test_tags_match_ignoring_case(self):
+        Tag.objects.create(user=self.user, name="Errands")
+        path = self.write_file(
+            '{"title": "Plan", "tags": ["work", "WORK", "errands"]}\n{"title": "Shop", "tags": ["Hobby", "hobby"]}\n',
+            ".jsonl",
+        )
+        call_command('import_tasks', path, '--user', 'alice', stdout=io.StringIO())
+
+        plan = Task.objects.get(title="Plan")
+        self.assertEqual(sorted(tag.name for tag in plan.tags.all()), ["Errands", "Work"])
+        self.assertEqual([tag.name for tag in Task.objects.get(title="Shop").tags.all()], ["Hobby"])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_failed_batch_can_be_resumed(self):
+        path = self.write_file(
+            "title,status\nFirst,Pending\nSecond,Pending\nThird,Unknown\nFourth,Pending\n",
+            ".csv",
+        )
+        checkpoint = path + ".checkpoint"
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.remove(checkpoint))
+
+        with self.assertRaises(CommandError):
+            call_command('import_tasks', path, '--user', 'alice', '--batch-size', '2',
+                         '--checkpoint', checkpoint, stdout=io.StringIO())
+        self.assertEqual(Task.objects.count(), 2)
+
+        # Fix the bad row and run again: the committed batch is not imported twice
+        with open(path, "w") as f:
+            f.write("title,status\nFirst,Pending\nSecond,Pending\nThird,Completed\nFourth,Pending\n")
+        call_command('import_tasks', path, '--user', 'alice', '--batch-size', '2',
+                     '--checkpoint', checkpoint, stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Task.objects.values_list('title', flat=True)),
+            ["First", "Fourth", "Second", "Third"],
+        )
+
+
+class SearchTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = Task.objects.create(user=self.user, title="Quarterly report", description="Numbers for finance")
+        self.garden = Task.objects.create(user=self.user, title="Garden", description="Plant tomatoes before the report")
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        Task.objects.create(user=other, title="Report for bob")
+
+    def test_prefix_search_is_ranked_and_scoped_to_the_user(self):
+        self.assertEqual(search_tasks(self.user, "repo"), [self.report, self.garden])
+        self.assertEqual(search_tasks(self.user, "quart rep"), [self.report])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.report.title = "Yearly summary"
+        self.report.save()
+        self.assertEqual(search_tasks(self.user, "quarterly"), [])
+        self.assertEqual(search_tasks(self.user, "yearly"), [self.report])
+
+        self.garden.delete()
+        self.assertEqual(search_tasks(self.user, "tomatoes"), [])
+
+    def test_operators_are_treated_as_words(self):
+        self.assertEqual(search_tasks(self.user, 'garden" * ('), [self.garden])
+        self.assertEqual(search_tasks(self.user, '"()'), [])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('task_search'), {'q': "finance"})
+        self.assertContains(response, "Quarterly report")
+        self.assertNotContains(response, "Garden")
+
+
+class ApiTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(user=self.user, title="Write report", priority="High")
+
+    def test_list_supports_field_selection(self):
+        response = self.client.get(reverse('api_task_list'), {'fields': "id,title"})
+        self.assertEqual(response.json()['results'], [{'id': self.task.id, 'title': "Write report"}])
+
+        response = self.client.get(reverse('api_task_list'), {'fields': "id,secret"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_list_returns_304_without_queries(self):
+        etag = self.client.get(reverse('api_task_list'))['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_task_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('tasks_task' in query['sql'] for query in ctx.captured_queries))
+
+        self.task.title = "Write summary"
+        self.task.save()
+        self.assertEqual(self.client.get(reverse('api_task_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_create_update_and_delete(self):
+        work = Tag.objects.get(name="Work")
+        response = self.client.post(
+            reverse('api_task_list'),
+            json.dumps({'title': "Plan", 'priority': "Low", 'status': "Pending", 'tags': [work.id]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        task_id = response.json()['id']
+        url = reverse('api_task_detail', kwargs={'task_id': task_id})
+
+        response = self.client.patch(url, json.dumps({'status': "Completed"}), content_type="application/json")
+        self.assertEqual(response.json()['status'], "Completed")
+        self.assertEqual(response.json()['tags'], ["Work"])
+
+        response = self.client.put(url, json.dumps({'title': "", 'priority': "Low", 'status': "Pending"}),
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.json()['errors'])
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Task.objects.filter(id=task_id).exists())
+
+    def test_failed_tag_write_leaves_no_task(self):
+        def fail(sender, action, **kwargs):
+            if action == "pre_add":
+                raise RuntimeError("tag write failed")
+
+        m2m_changed.connect(fail, sender=Task.tags.through)
+        self.addCleanup(m2m_changed.disconnect, fail, sender=Task.tags.through)
+        data = {'title': "Plan", 'priority': "Low", 'status': "Pending", 'tags': [Tag.objects.get(name="Work").id]}
+        with self.assertRaises(RuntimeError):
+            self.client.post(reverse('api_task_list'), json.dumps(data), content_type="application/json")
+        self.assertFalse(Task.objects.filter(title="Plan").exists())
+
+    def test_form_encoded_updates(self):
+        url = reverse('api_task_detail', kwargs={'task_id': self.task.id})
+
+        response = self.client.patch(url, "status=Completed", content_type="application/x-www-form-urlencoded")
+        self.assertEqual(response.json()['status'], "Completed")
+        self.assertEqual(Task.objects.get(id=self.task.id).status, "Completed")
+
+        response = self.client.patch(url, b"status=Pending", content_type="text/plain")
+        self.assertEqual(response.status_code, 415)
+
+    def test_other_users_tasks_are_hidden(self):
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        foreign = Task.objects.create(user=other, title="Private")
+        url = reverse('api_task_detail', kwargs={'task_id': foreign.id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_anonymous_requests_are_rejected(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_task_list')).status_code, 401)
+
+
+class LiveEventTests(TaskTestCase):
+    def test_broker_delivers_events_from_other_threads(self):
+        broker = LocalBroker()
+
+        async def listen():
+            async with broker.subscribe(self.user.id) as subscription:
+                await asyncio.to_thread(broker.publish, self.user.id, {'type': "task.updated", 'id': 1})
+                await asyncio.to_thread(broker.publish, self.user.id + 1, {'type': "task.updated", 'id': 2})
+                first = await subscription.next_event(timeout=1)
+                second = await subscription.next_event(timeout=0.05)
+            return first, second
+
+        first, second = asyncio.run(listen())
+        self.assertEqual(first['id'], 1)
+        self.assertIsNone(second)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_task_signals_publish_after_commit(self):
+        received = []
+        broker = get_broker()
+        original, broker.publish = broker.publish, lambda user_id, event: received.append((user_id, event))
+        self.addCleanup(setattr, broker, 'publish', original)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(user=self.user, title="Plan")
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+
+        self.assertEqual([event['type'] for _, event in received], ["task.created", "task.deleted"])
+        self.assertEqual({user_id for user_id, _ in received}, {self.user.id})
+
+    async def test_event_stream(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('task_events'))
+        self.assertEqual(response['Content-Type'], "text/event-stream")
+
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+        get_broker().publish(self.user.id, {'type': "task.updated", 'id': 7})
+        self.assertIn(b'"id":7', await anext(chunks))
+        await chunks.aclose()
+
+    def test_event_stream_is_off_under_wsgi(self):
+        # A never-ending stream would hold a WSGI worker forever
+        self.assertEqual(self.client.get(reverse('task_events')).status_code, 204)
+
+    async def test_async_task_page(self):
+        await sync_to_async(make_tasks)(self.user, 3)
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('task_page'))
+        self.assertEqual(len(response.json()['results']), 3)
+
+
+class StatsTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.work = Tag.objects.get(name="Work")
+        self.tag_names = {self.work.id: "Work"}
+
+    def stats(self):
+        return user_stats(self.user, self.tag_names)
+
+    def test_counters_follow_saves_tags_and_deletes(self):
+        task = Task.objects.create(user=self.user, title="Plan", priority="High")
+        task.tags.add(self.work)
+        self.assertEqual(self.stats()['matrix']["Pending"]["High"], 1)
+        self.assertEqual(self.stats()['by_tag'], {"Work": 1})
+
+        task = Task.objects.get(id=task.id)
+        task.status = "Completed"
+        task.save()
+        stats = self.stats()
+        self.assertEqual(stats['by_status']["Pending"], 0)
+        self.assertEqual(stats['by_status']["Completed"], 1)
+
+        task.tags.remove(self.work)
+        task.tags.remove(self.work)  # removing a missing link changes nothing
+        self.assertEqual(self.stats()['by_tag'], {})
+
+        task.tags.add(self.work)
+        task.delete()
+        stats = self.stats()
+        self.assertEqual(stats['total'], 0)
+        self.assertEqual(stats['by_tag'], {})
+
+    def test_form_edit_and_bulk_paths_match_a_rebuild(self):
+        task = Task.objects.create(user=self.user, title="Plan")
+        self.client.post(reverse('task_update', kwargs={'task_id': task.id}), {
+            'title': "Plan", 'priority': "Urgent", 'status': "In progress", 'tags': [self.work.id],
+        })
+        for i in range(3):
+            Task.objects.create(user=self.user, title=f"Task {i}")
+        task_ids = list(Task.objects.values_list('id', flat=True))
+        for data in [{'action': "add_tags", 'tags': [self.work.id]}, {'action': "priority", 'priority': "Urgent"},
+                     {'action': "status", 'status': "Completed"}]:
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('task_bulk'), {**data, 'task_ids': task_ids[1:]})
+            # Counters move by deltas, without recounting the user's tasks
+            self.assertFalse(any('GROUP BY' in query['sql'] for query in ctx.captured_queries))
+        self.client.post(reverse('task_bulk'), {'action': "remove_tags", 'tags': [self.work.id],
+                                                'task_ids': task_ids[-1:]})
+        incremental = self.stats()
+
+        rebuild_user_stats()
+        self.assertEqual(self.stats(), incremental)
+        self.assertEqual(incremental['matrix']["In progress"]["Urgent"], 1)
+        self.assertEqual(incremental['matrix']["Completed"]["Urgent"], 3)
+        self.assertEqual(incremental['by_tag'], {"Work": 3})
+
+    def test_overdue_counts_open_tasks_past_due(self):
+        past = timezone.now() - timedelta(days=1)
+        Task.objects.create(user=self.user, title="Late", due_date=past)
+        Task.objects.create(user=self.user, title="Done", due_date=past, status="Completed")
+        Task.objects.create(user=self.user, title="Later", due_date=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.stats()['overdue'], 1)
+
+    def test_profile_reads_counters(self):
+        Task.objects.create(user=self.user, title="Plan")
+        response = self.client.get(reverse('profile'))
+        self.assertContains(response, "1 tasks, 0 overdue")
+
+    def test_rebuild_command(self):
+        make_tasks(self.user, 2, tags=[self.work])
+        TaskCounter.objects.all().delete()
+        call_command('rebuild_task_stats', '--user', 'alice', stdout=io.StringIO())
+        self.assertEqual(self.stats()['total'], 2)
+
+
+
+class ReminderTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.email = "alice@example.com"
+        self.user.save()
+        self.now = timezone.now()
+        self.window = (self.now - timedelta(hours=1), self.now + timedelta(hours=1))
+
+    def test_one_email_per_user_for_open_tasks_in_window(self):
+        soon = self.now + timedelta(minutes=30)
+        make_tasks(self.user, 2, due_date=soon)
+        make_tasks(self.user, 1, due_date=soon, status="Completed")
+        make_tasks(self.user, 1, due_date=self.now + timedelta(days=2))
+
+        self.assertEqual(run_cycle(*self.window, worker="w1"), (2, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["alice@example.com"])
+        self.assertIn("2 task(s) due soon", mail.outbox[0].subject)
+        self.assertEqual(TaskReminder.objects.filter(state=TaskReminder.SENT).count(), 2)
+
+    def test_reminders_are_sent_once_across_runs_and_workers(self):
+        make_tasks(self.user, 5, due_date=self.now + timedelta(minutes=10))
+        run_cycle(*self.window, worker="w1", batch_size=2)
+        run_cycle(*self.window, worker="w2")
+        self.assertEqual(TaskReminder.objects.count(), 5)
+        self.assertEqual(sum(len(message.task_ids) for message in mail.outbox), 5)
+
+    def test_concurrent_claims_have_one_winner(self):
+        make_tasks(self.user, 3, due_date=self.now + timedelta(minutes=10))
+        batch = next(due_task_batches(*self.window))
+        self.assertEqual(len(claim(batch, "w1")), 3)
+        self.assertEqual(claim(batch, "w2"), [])
+
+    def test_shards_split_the_tasks(self):
+        make_tasks(self.user, 6, due_date=self.now + timedelta(minutes=10))
+        seen = []
+        for shard in range(3):
+            for batch in due_task_batches(*self.window, shard=shard, shards=3):
+                seen += [task['id'] for task in batch]
+        self.assertCountEqual(seen, Task.objects.values_list('id', flat=True))
+
+    def test_moving_the_due_date_makes_a_new_reminder_due(self):
+        task = Task.objects.create(user=self.user, title="Plan", due_date=self.now + timedelta(minutes=10))
+        run_cycle(*self.window, worker="w1")
+        task.due_date = self.now + timedelta(minutes=40)
+        task.save()
+        run_cycle(*self.window, worker="w1")
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_users_without_email_are_skipped(self):
+        self.user.email = ""
+        self.user.save()
+        make_tasks(self.user, 1, due_date=self.now + timedelta(minutes=10))
+        self.assertEqual(run_cycle(*self.window, worker="w1"), (0, 1))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(TaskReminder.objects.get().state, TaskReminder.SKIPPED)
+
+    def test_interrupted_claims_are_marked_unknown_not_resent(self):
+        make_tasks(self.user, 1, due_date=self.now + timedelta(minutes=10))
+        claim(next(due_task_batches(*self.window)), "crashed")
+        self.assertEqual(expire_stale_claims(self.now + timedelta(hours=1)), 1)
+        self.assertEqual(run_cycle(*self.window, worker="w1"), (0, 0))
+        self.assertEqual(TaskReminder.objects.get().state, TaskReminder.UNKNOWN)
+
+    def test_refused_emails_are_retried(self):
+        make_tasks(self.user, 1, due_date=self.now + timedelta(minutes=10))
+        class RefusingBackend(BaseEmailBackend):
+            def send_messages(self, messages):
+                raise smtplib.SMTPRecipientsRefused({})
+
+        claimed = claim(next(due_task_batches(*self.window)), "w1")
+        self.assertEqual(deliver(claimed, "w1", RefusingBackend()), (0, 0))
+        self.assertFalse(TaskReminder.objects.exists())
+        self.assertEqual(run_cycle(*self.window, worker="w2"), (1, 0))
+
+    def test_command_runs_once(self):
+        make_tasks(self.user, 1, due_date=self.now + timedelta(minutes=10))
+        out = io.StringIO()
+        call_command('run_reminders', '--once', '--shards', '2', '--shard', '1', stdout=out)
+        call_command('run_reminders', '--once', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        with self.assertRaises(CommandError):
+            call_command('run_reminders', '--once', '--shard', '2', '--shards', '2')
+
+
+
+class RequestMetricsTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        make_tasks(self.user, 3)
+
+    def view_report(self, view):
+        return next(row for row in registry.report() if row['view'] == view)
+
+    def test_records_queries_templates_and_size_per_view(self):
+        response = self.client.get(reverse('home'))
+        report = self.view_report('home')
+        self.assertEqual(report['requests'], 1)
+        self.assertGreater(report['db_queries']['max'], 0)
+        self.assertGreater(report['template_seconds']['max'], 0)
+        self.assertEqual(report['response_bytes']['max'], len(response.content))
+
+    def test_async_view_queries_are_counted(self):
+        self.client.get(reverse('task_page'), {'status': "Pending"})
+        self.assertGreater(self.view_report('task_page')['db_queries']['max'], 0)
+
+    def test_requests_over_budget_are_logged(self):
+        with override_settings(TASK_QUERY_BUDGET=0), self.assertLogs('tasks.performance', 'WARNING') as logs:
+            self.client.get(reverse('tasks'))
+        self.assertIn("(tasks)", logs.output[0])
+
+    def test_report_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics_report')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('home'))
+        views = [row['view'] for row in self.client.get(reverse('metrics_report')).json()['views']]
+        self.assertIn('home', views)
+
+    @override_settings(TASK_METRICS_TOKEN="scrape-token")
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('metrics_prometheus')).status_code, 403)
+        self.client.logout()
+        response = self.client.get(reverse('metrics_prometheus'), HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE taskmanager_request_duration_seconds histogram", body)
+        self.assertIn('taskmanager_request_db_queries_count{view="home"} 1', body)
+        self.assertIn('taskmanager_request_db_queries_bucket{view="home",le="+Inf"} 1', body)
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram((1, 5, 10))
+        for value in (0.5, 2, 3, 4, 20):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()), [(1, 1), (5, 4), (10, 4), (float('inf'), 5)])
+        self.assertEqual(histogram.quantile(0.5), 5)
+        self.assertEqual(histogram.quantile(1), 20)
+
+
+
+class BenchmarkTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        call_command('seed_tasks', '--users', '2', '--tasks', '15', '--tags', '10', stdout=io.StringIO())
+        self.seeded = seeded_user()
+
+    def test_seed_creates_consistent_data(self):
+        tasks = Task.objects.filter(user__username__startswith=SEED_PREFIX)
+        self.assertGreater(tasks.count(), 2)
+        self.assertEqual(set(tasks.values_list('user__username', flat=True)), {"seed-user-0", "seed-user-1"})
+        # The 8 default tags plus at most 2 generated ones
+        self.assertLessEqual(Tag.objects.count(), 10)
+        incremental = user_stats(self.seeded)
+        rebuild_user_stats()
+        self.assertEqual(user_stats(self.seeded), incremental)
+
+    def test_scenarios_cover_every_route(self):
+        routes = {pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None)}
+        self.assertEqual({scenario.name for scenario in SCENARIOS} | SKIPPED_ROUTES.keys(), routes)
+
+    def test_suite_runs_every_scenario_through_the_client(self):
+        tasks_before = Task.objects.count()
+        results = run_suite(self.seeded, [ClientTransport], iterations=1)['client']
+        self.assertEqual(set(results), {scenario.label for scenario in SCENARIOS})
+        self.assertGreater(results['home']['queries'], 0)
+        self.assertGreater(results['tasks']['peak_kib'], 0)
+        # Scenarios that write clean up after themselves
+        self.assertEqual(Task.objects.count(), tasks_before)
+
+    def test_compare_flags_regressions(self):
+        before = {'client': {'home': {'p50_ms': 10, 'p95_ms': 20, 'queries': 2, 'peak_kib': 100}}}
+        noise = {'client': {'home': {'p50_ms': 11.5, 'p95_ms': 21, 'queries': 2, 'peak_kib': 110}}}
+        slower = {'client': {'home': {'p50_ms': 15, 'p95_ms': 20, 'queries': 3, 'peak_kib': 100}}}
+        self.assertEqual(compare(noise, before), [])
+        self.assertEqual(len(compare(slower, before)), 2)
+
+    def test_board_benchmark_rolls_back(self):
+        out = io.StringIO()
+        cards = []
+
+        def record(sender, template, **kwargs):
+            if template.name == 'task_card.html':
+                cards.append(template)
+
+        template_rendered.connect(record)
+        self.addCleanup(template_rendered.disconnect, record)
+        call_command('benchmark_board', '--tasks', '30', '--iterations', '2', stdout=out)
+        self.assertIn("one card changed", out.getvalue())
+        # Both "every card rendered" passes render all 30 cards, then each edit renders one
+        self.assertEqual(len(cards), 2 * 30 + 2)
+        self.assertFalse(User.objects.filter(username__startswith="board-benchmark-").exists())
+
+    def test_command_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            args = ['run_benchmarks', '--transport', 'client', '--scenario', 'home', '--iterations', '1',
+                    '--baseline', baseline]
+            call_command(*args, '--save-baseline', stdout=io.StringIO())
+            with open(baseline) as f:
+                document = json.load(f)
+            document['results']['client']['home']['queries'] = 0
+            with open(baseline, "w") as f:
+                json.dump(document, f)
+            with self.assertRaisesMessage(CommandError, "client home: queries"):
+                call_command(*args, stdout=io.StringIO())
+
+
+class WSGIBenchmarkTests(TransactionTestCase):
+    '''The WSGI server thread uses its own database connection, so the data must be committed.'''
+
+    def test_suite_runs_through_a_wsgi_server(self):
+        clear_caches()
+        call_command('seed_tasks', '--users', '1', '--tasks', '5', '--tags', '3', stdout=io.StringIO())
+        scenarios = [scenario for scenario in SCENARIOS if scenario.label in ('tasks', 'task_bulk:post')]
+        results = run_suite(seeded_user(), [WSGITransport], iterations=1, scenarios=scenarios)['wsgi']
+        self.assertEqual(set(results), {'tasks', 'task_bulk:post'})
+        self.assertGreater(results['tasks']['queries'], 0)
+
+
+
+class DemoSessionTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_demo_login_seeds_tasks_and_shows_timer(self):
+        response = self.client.post(reverse('demo_login'))
+        self.assertRedirects(response, reverse('home'))
+        account = DemoAccount.objects.get()
+        self.assertEqual(Task.objects.filter(user=account.user).count(), DEMO_TASKS)
+        self.assertEqual(user_stats(account.user)['total'], DEMO_TASKS)
+        self.assertTrue(self.client.session['is_demo'])
+
+        response = self.client.get(reverse('profile'))
+        self.assertContains(response, "Demo: 29m")
+
+    def test_demo_login_keeps_to_the_query_budget(self):
+        # Within TASK_QUERY_BUDGET (20), with the session writes of the login
+        with self.assertNumQueries(19):
+            self.client.post(reverse('demo_login'))
+
+    def test_timer_reads_cached_session_without_queries(self):
+        self.client.post(reverse('demo_login'))
+        request = self.client.get(reverse('profile')).wsgi_request
+        with self.assertNumQueries(0):
+            context = demo_session_timer(request)
+        self.assertEqual(context['time_remaining_minutes'], 29)
+
+    def test_demo_sign_ups_are_rate_limited(self):
+        for _ in range(DEMO_RATE_LIMIT):
+            self.client.post(reverse('demo_login'))
+        self.assertEqual(self.client.post(reverse('demo_login')).status_code, 429)
+        self.assertEqual(DemoAccount.objects.count(), DEMO_RATE_LIMIT)
+
+    def test_reaper_bulk_deletes_expired_demos(self):
+        expired = [create_demo_account() for _ in range(3)]
+        current = create_demo_account()
+        Task.objects.filter(user=expired[0].user).first().tags.add(Tag.objects.get(name="Work"))
+        TaskReminder.objects.create(task=Task.objects.filter(user=expired[0].user).first(),
+                                    due_date=timezone.now(), worker="w1")
+        project = Project.objects.create(name="Shared")
+        ProjectMembership.objects.create(project=project, user=current.user, role=ProjectMembership.OWNER)
+        for account in expired:
+            Tag.objects.create(user=account.user, name="Garden")
+            ProjectMembership.objects.create(project=project, user=account.user, role=ProjectMembership.EDITOR)
+        DemoAccount.objects.exclude(pk=current.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_expired_demos(batch_size=2), 3)
+        # Two batches, each a fixed number of statements (one more per model
+        # referencing tasks) rather than one per task
+        self.assertLess(len(queries), 65)
+        # Tags are deleted in bulk, without a delete signal (and its statements) per tag
+        tag_counter_deletes = [query for query in queries.captured_queries
+                               if query['sql'].startswith('DELETE FROM "tasks_taskcounter" WHERE ("tasks_taskcounter"."dimension"')]
+        self.assertEqual(len(tag_counter_deletes), 2)
+        self.assertEqual(list(project.memberships.values_list('user_id', flat=True)), [current.user_id])
+        self.assertFalse(Tag.objects.filter(name="Garden").exists())
+
+        self.assertEqual(list(User.objects.values_list('id', flat=True)), [current.user_id])
+        self.assertEqual(Task.objects.exclude(user=current.user).count(), 0)
+        self.assertEqual(TaskCounter.objects.exclude(user=current.user).count(), 0)
+        self.assertFalse(TaskReminder.objects.exists())
+        self.assertFalse(Task.tags.through.objects.exclude(task__user=current.user).exists())
+
+    def test_reaper_command(self):
+        create_demo_account()
+        DemoAccount.objects.update(expires_at=timezone.now())
+        out = io.StringIO()
+        call_command('purge_demo_users', stdout=out)
+        self.assertIn("Purged 1 expired demo users.", out.getvalue())
+
+
+
+class ArchiveTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.work = Tag.objects.get(name="Work")
+        self.old = make_tasks(self.user, 3, tags=[self.work], status="Completed")
+        Task.objects.filter(id__in=[task.id for task in self.old]).update(
+            updated_at=timezone.now() - timedelta(days=60))
+        self.recent = make_tasks(self.user, 2, status="Completed")
+        self.pending = make_tasks(self.user, 1, status="Pending")
+        rebuild_user_stats()
+
+    def column(self, status):
+        return next(column for column in load_board(self.user) if column['status'] == status)
+
+    def test_archive_moves_old_finished_tasks_off_the_board(self):
+        stats = user_stats(self.user)
+        out = io.StringIO()
+        call_command('archive_tasks', '--days', '30', '--batch-size', '2', stdout=out)
+        self.assertIn("Archived 3 tasks", out.getvalue())
+
+        column = self.column("Completed")
+        self.assertEqual(column['total'], 2)
+        self.assertTrue(column['has_archive'])
+        self.assertContains(self.client.get(reverse('tasks')), "Show older")
+        # Archived tasks still count in the statistics
+        self.assertEqual(user_stats(self.user), stats)
+
+        page = self.client.get(reverse('task_page'), {'status': "Completed", 'archived': "1", 'page_size': 2}).json()
+        self.assertEqual(len(page['results']), 2)
+        page = self.client.get(reverse('task_page'), {'status': "Completed", 'archived': "1",
+                                                      'cursor': page['next_cursor']}).json()
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNone(page['next_cursor'])
+
+    def test_reopening_an_archived_task_restores_it(self):
+        call_command('archive_tasks', stdout=io.StringIO())
+        task = Task.objects.get(id=self.old[0].id)
+        self.assertIsNotNone(task.archived_at)
+        self.client.post(reverse('task_update', kwargs={'task_id': task.id}), {
+            'title': task.title, 'priority': task.priority, 'status': "Pending",
+        })
+        self.assertIsNone(Task.objects.get(id=task.id).archived_at)
+        self.assertEqual(self.column("Pending")['total'], 2)
+
+    def test_delete_is_soft_until_purged(self):
+        task = self.old[0]
+        response = self.client.get(reverse('task_delete', kwargs={'task_id': task.id}))
+        self.assertRedirects(response, reverse('tasks'))
+        self.assertFalse(Task.objects.filter(id=task.id).exists())
+        self.assertTrue(Task.all_objects.filter(id=task.id).exists())
+        self.assertEqual(self.column("Completed")['total'], 4)
+        stats = user_stats(self.user)
+        self.assertEqual(stats['total'], 5)
+        self.assertEqual(stats['by_tag'], {str(self.work.id): 2})
+        rebuild_user_stats()
+        self.assertEqual(user_stats(self.user), stats)
+
+        call_command('purge_deleted_tasks', '--days', '1', stdout=io.StringIO())
+        self.assertTrue(Task.all_objects.filter(id=task.id).exists())
+        out = io.StringIO()
+        call_command('purge_deleted_tasks', '--days', '0', stdout=out)
+        self.assertIn("Purged 1 tasks", out.getvalue())
+        self.assertFalse(Task.all_objects.filter(id=task.id).exists())
+        self.assertFalse(Task.tags.through.objects.filter(task_id=task.id).exists())
+
+    def test_purge_knows_every_relation_to_tasks(self):
+        # purge_tasks() deletes without the collector: check it handles a new relation's on_delete
+        relations = {
+            (relation.related_model.__name__, relation.field.name, relation.on_delete.__name__)
+            for relation in Task._meta.related_objects
+        }
+        self.assertEqual(relations, {("RecurrenceRule", "template", "CASCADE"), ("TaskReminder", "task", "CASCADE")})
+
+    def test_bulk_and_api_deletes_are_soft(self):
+        self.client.post(reverse('task_bulk'), {'action': "delete", 'task_ids': [self.recent[0].id]})
+        self.client.delete(reverse('api_task_detail', kwargs={'task_id': self.recent[1].id}))
+        self.assertEqual(Task.all_objects.filter(deleted_at__isnull=False).count(), 2)
+        self.assertEqual(user_stats(self.user)['total'], 4)
+
+
+class RecurrenceTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now().replace(microsecond=0)
+        self.work = Tag.objects.get(name="Work")
+        self.template = Task.objects.create(user=self.user, title="Standup", priority="High", due_date=self.now)
+        self.template.tags.add(self.work)
+
+    def rule(self, **fields):
+        start = timezone.make_aware(timezone.datetime(2025, 1, 31, 9, 0))
+        return RecurrenceRule(starts_at=start, materialized_until=start, **fields)
+
+    def test_occurrences_follow_the_rule(self):
+        rule = self.rule(frequency=RecurrenceRule.DAILY, interval=2, count=3)
+        days = [moment.day for moment in occurrences(rule, rule.starts_at, rule.starts_at + timedelta(days=30))]
+        self.assertEqual(days, [2, 4])  # The start itself is the first of the three
+
+        rule = self.rule(frequency=RecurrenceRule.WEEKLY, by_weekday="MO,FR")
+        moments = list(occurrences(rule, rule.starts_at, rule.starts_at + timedelta(days=7)))
+        self.assertEqual([(moment.month, moment.day, moment.hour) for moment in moments], [(2, 3, 9), (2, 7, 9)])
+
+        # Months without a 31st are skipped
+        rule = self.rule(frequency=RecurrenceRule.MONTHLY, until=rule.starts_at + timedelta(days=200))
+        self.assertEqual([moment.month for moment in occurrences(rule, rule.starts_at, rule.until)], [3, 5, 7])
+        self.assertEqual(rule.rrule, "FREQ=MONTHLY;UNTIL=20250819T090000Z")
+
+    def test_instances_are_materialized_within_the_lookahead_only(self):
+        set_recurrence(self.template, RecurrenceRule.DAILY, now=self.now)
+        instances = Task.objects.filter(recurrence__template=self.template).exclude(id=self.template.id)
+        self.assertEqual(instances.count(), LOOKAHEAD.days)
+        self.assertEqual(set(instances.values_list('tags', flat=True)), {self.work.id})
+        stats = user_stats(self.user)
+        rebuild_user_stats()
+        self.assertEqual(user_stats(self.user), stats)
+
+        # Running again creates nothing; a later horizon only the new days
+        self.assertEqual(sum(materialize_due(self.now + LOOKAHEAD)), 0)
+        self.assertEqual(sum(materialize_due(self.now + LOOKAHEAD + timedelta(days=3))), 3)
+        self.assertEqual(instances.count(), LOOKAHEAD.days + 3)
+
+    def test_editing_the_rule_regenerates_future_instances(self):
+        rule = set_recurrence(self.template, RecurrenceRule.DAILY, now=self.now)
+        started = rule.instances.exclude(id=self.template.id).order_by('occurrence')[2]
+        started.status = "In progress"
+        started.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            set_recurrence(self.template, RecurrenceRule.WEEKLY, now=self.now)
+        self.assertLess(len(queries), 25)
+        live = rule.instances.exclude(id=self.template.id)
+        self.assertEqual(live.count(), 3)  # Two weekly occurrences, plus the started daily one
+        self.assertIn(started.id, live.values_list('id', flat=True))
+        stats = user_stats(self.user)
+        rebuild_user_stats()
+        self.assertEqual(user_stats(self.user), stats)
+
+        set_recurrence(self.template, None, now=self.now)
+        self.assertEqual(list(Task.objects.filter(user=self.user).exclude(id=self.template.id)), [started])
+        self.assertFalse(RecurrenceRule.objects.exists())
+
+    def test_creating_a_series_keeps_to_the_query_budget(self):
+        data = {'title': "Water plants", 'priority': "Low", 'status': "Pending", 'tags': [self.work.id],
+                'due_date': timezone.localtime(self.now).strftime("%Y-%m-%dT%H:%M"),
+                'recurrence-frequency': "WEEKLY", 'recurrence-interval': "1", 'recurrence-count': "2"}
+        tag_catalog(self.user.id)
+        # Within TASK_QUERY_BUDGET (20), creating the counter this task is the first to need included
+        with self.assertNumQueries(20):
+            self.assertRedirects(self.client.post(reverse('task_create'), data), reverse('tasks'),
+                                 fetch_redirect_response=False)
+
+    def test_task_form_creates_a_series(self):
+        data = {'title': "Water plants", 'priority': "Low", 'status': "Pending", 'recurrence-frequency': "WEEKLY",
+                'recurrence-interval': "1", 'recurrence-count': "2"}
+        response = self.client.post(reverse('task_create'), data)
+        self.assertContains(response, "A repeating task needs a due date.")
+
+        data['due_date'] = timezone.localtime(self.now).strftime("%Y-%m-%dT%H:%M")
+        self.assertRedirects(self.client.post(reverse('task_create'), data), reverse('tasks'))
+        self.assertEqual(Task.objects.filter(title="Water plants").count(), 2)
+        rule = RecurrenceRule.objects.get()
+        self.assertTrue(rule.exhausted)
+        self.assertEqual(rule.rrule, "FREQ=WEEKLY;COUNT=2")
+
+        out = io.StringIO()
+        call_command('materialize_recurrences', stdout=out)
+        self.assertIn("Created 0 task instances", out.getvalue())
+
+
+class ConcurrentEditTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.work, self.home = Tag.objects.get(name="Work"), Tag.objects.get(name="Home")
+        self.task = Task.objects.create(user=self.user, title="Draft", description="Long text")
+        self.task.tags.add(self.work)
+        self.url = reverse('task_update', kwargs={'task_id': self.task.id})
+
+    def edit(self, **fields):
+        data = {'title': "Draft", 'priority': "Low", 'status': "Pending", 'description': "Long text",
+                'tags': [self.work.id], 'version': Task.objects.get(id=self.task.id).version}
+        return self.client.post(self.url, data | fields)
+
+    def test_edits_keep_to_the_query_budget(self):
+        tag_catalog(self.user.id)
+        data = {'title': "Draft", 'priority': "High", 'status': "Pending", 'tags': [self.work.id, self.home.id]}
+        # Within TASK_QUERY_BUDGET (20), creating the two counters this edit is the first to need included
+        with self.assertNumQueries(18):
+            self.assertRedirects(self.client.post(self.url, data), reverse('tasks'), fetch_redirect_response=False)
+
+    def test_saves_write_only_what_changed(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertRedirects(self.edit(priority="High", tags=[self.work.id, self.home.id]), reverse('tasks'))
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE "tasks_task"'))
+        self.assertIn('"priority"', update)
+        self.assertNotIn('"description"', update)
+        # Only the new tag link is written
+        self.assertFalse(any(query['sql'].startswith('DELETE') for query in queries))
+        task = Task.objects.get(id=self.task.id)
+        self.assertEqual((task.priority, task.version), ("High", 2))
+        self.assertEqual(set(task.tags.all()), {self.work, self.home})
+        stats = user_stats(self.user)
+        rebuild_user_stats()
+        self.assertEqual(user_stats(self.user), stats)
+
+        # Unchanged forms write nothing
+        with CaptureQueriesContext(connection) as queries:
+            self.edit(priority="High", tags=[self.work.id, self.home.id])
+        self.assertFalse(any(query['sql'].startswith(('UPDATE', 'INSERT', 'DELETE')) for query in queries))
+
+    def test_stale_edits_get_a_conflict(self):
+        stale = Task.objects.get(id=self.task.id).version
+        self.edit(title="First edit")
+        response = self.edit(title="Second edit", version=stale)
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, "Someone else changed this task", status_code=409)
+        self.assertEqual(Task.objects.get(id=self.task.id).title, "First edit")
+
+        # Bulk actions move the version on too
+        self.client.post(reverse('task_bulk'), {'action': "priority", 'priority': "Urgent", 'task_ids': [self.task.id]})
+        self.assertEqual(Task.objects.get(id=self.task.id).version, 3)
+
+    def test_api_updates_check_the_version(self):
+        url = reverse('api_task_detail', kwargs={'task_id': self.task.id})
+        body = self.client.get(url).json()
+        self.assertEqual(body['version'], 1)
+        response = self.client.patch(url, {'status': "Completed", 'version': 1}, content_type="application/json")
+        self.assertEqual(response.json()['version'], 2)
+        response = self.client.patch(url, {'status': "Pending", 'version': 1}, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 2)
+
+    def test_other_users_tasks_are_not_found(self):
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('task_delete', kwargs={'task_id': self.task.id})).status_code, 404)
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(STATIC_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', '--noinput', '--ignore', "admin", verbosity=0)
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+        self.url = static("css/home.css")
+        self.factory = RequestFactory()
+
+    def get(self, url, **headers):
+        return self.middleware(self.factory.get(url, headers=headers))
+
+    def test_hashed_names_are_cached_forever(self):
+        self.assertRegex(self.url, r"^/static/css/home\.[0-9a-f]{12}\.css$")
+        response = self.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], "text/css")
+        self.assertNotIn("immutable", self.get("/static/css/home.css")['Cache-Control'])
+        self.assertEqual(self.get("/static/css/missing.css").status_code, 404)
+
+    def test_compressed_variant_follows_accept_encoding(self):
+        plain = b"".join(self.get(self.url).streaming_content)
+        response = self.get(self.url, accept_encoding="gzip, deflate")
+        self.assertEqual(response['Content-Encoding'], "gzip")
+        self.assertEqual(response['Vary'], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+        self.assertNotIn('Content-Encoding', self.get(self.url, accept_encoding="gzip;q=0"))
+
+    def test_each_encoding_has_its_own_etag(self):
+        plain = self.get(self.url)['ETag']
+        compressed = self.get(self.url, accept_encoding="gzip")['ETag']
+        self.assertEqual(compressed, plain[:-1] + '-gz"')
+        self.assertEqual(self.get(self.url, accept_encoding="gzip", if_none_match=compressed).status_code, 304)
+        # The gzip ETag does not validate the identity representation, nor the reverse
+        self.assertEqual(self.get(self.url, if_none_match=compressed).status_code, 200)
+        self.assertEqual(self.get(self.url, accept_encoding="gzip", if_none_match=plain).status_code, 200)
+
+    def test_files_missing_from_the_manifest_raise(self):
+        with self.assertRaises(ValueError):
+            static("css/missing.css")
+
+    def test_conditional_requests(self):
+        response = self.get(self.url)
+        self.assertEqual(self.get(self.url, if_none_match=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(self.url, if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_byte_ranges(self):
+        plain = b"".join(self.get(self.url).streaming_content)
+        response = self.get(self.url, range="bytes=10-19", accept_encoding="gzip")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f"bytes 10-19/{len(plain)}")
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b"".join(response.streaming_content), plain[10:20])
+        self.assertEqual(b"".join(self.get(self.url, range="bytes=-5").streaming_content), plain[-5:])
+        response = self.get(self.url, range=f"bytes={len(plain)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(plain)}")
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.get(self.url, range="bytes=10-19", if_range='"stale"').status_code, 200)
+
+
+class ProjectTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create_user(username="bob", password="secret-pass-123")
+        self.carol = User.objects.create_user(username="carol", password="secret-pass-123")
+        self.project = Project.objects.create(name="Launch")
+        for user, role in [(self.user, ProjectMembership.OWNER), (self.bob, ProjectMembership.EDITOR),
+                           (self.carol, ProjectMembership.VIEWER)]:
+            ProjectMembership.objects.create(project=self.project, user=user, role=role)
+        self.task = Task.objects.create(user=self.user, project=self.project, title="Shared plan")
+        self.url = reverse('project_detail', kwargs={'project_id': self.project.id})
+
+    def test_members_see_the_project_tasks(self):
+        private = Task.objects.create(user=self.bob, title="Private plan")
+        outsider = User.objects.create_user(username="dave", password="secret-pass-123")
+        self.assertEqual(set(Task.objects.visible_to(self.bob)), {self.task, private})
+        self.assertEqual(set(Task.objects.visible_to(self.carol)), {self.task})
+        self.assertFalse(Task.objects.visible_to(outsider).exists())
+        self.assertEqual(search_tasks(self.carol, "plan"), [self.task])
+
+        self.client.force_login(self.carol)
+        self.assertContains(self.client.get(reverse('tasks')), "Shared plan")
+        self.assertContains(self.client.get(reverse('home')), "Shared plan")
+
+    def test_access_costs_no_query_per_member(self):
+        members = User.objects.bulk_create([User(username=f"member-{i}") for i in range(200)])
+        ProjectMembership.objects.bulk_create([
+            ProjectMembership(project=self.project, user=member, role=ProjectMembership.VIEWER) for member in members
+        ])
+        with self.assertNumQueries(1):
+            list(Task.objects.live().visible_to(members[0]))
+        # The task query and the tag prefetch
+        with self.assertNumQueries(2):
+            load_board(members[0])
+
+    def test_api_edit_moving_a_task_out_of_view_succeeds(self):
+        task = Task.objects.create(user=self.bob, project=self.project, title="Bob's plan")
+        url = reverse('api_task_detail', kwargs={'task_id': task.id})
+
+        response = self.client.patch(url, {'project': None}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(Task.objects.get(id=task.id).project)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_only_the_creator_or_an_owner_can_take_a_task_out_of_its_project(self):
+        url = reverse('api_task_detail', kwargs={'task_id': self.task.id})
+        self.client.force_login(self.bob)
+        response = self.client.patch(url, {'project': None}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('project', response.json()['errors'])
+        self.assertEqual(Task.objects.get(id=self.task.id).project, self.project)
+
+        bobs = Task.objects.create(user=self.bob, project=self.project, title="Bob's plan")
+        url = reverse('api_task_detail', kwargs={'task_id': bobs.id})
+        self.assertEqual(self.client.patch(url, {'project': None}, content_type="application/json").status_code, 200)
+        self.assertIsNone(Task.objects.get(id=bobs.id).project)
+
+    def test_viewers_cannot_change_tasks(self):
+        url = reverse('task_update', kwargs={'task_id': self.task.id})
+        data = {'title': "Edited", 'priority': "High", 'status': "Pending", 'project': self.project.id}
+        api_url = reverse('api_task_detail', kwargs={'task_id': self.task.id})
+
+        self.client.force_login(self.carol)
+        self.assertEqual(self.client.post(url, data).status_code, 404)
+        self.assertEqual(self.client.get(reverse('task_delete', kwargs={'task_id': self.task.id})).status_code, 404)
+        self.assertEqual(self.client.get(api_url).status_code, 200)
+        self.assertEqual(self.client.patch(api_url, {'title': "Edited"}, content_type="application/json").status_code, 404)
+        self.client.post(reverse('task_bulk'), {'action': "status", 'status': "Completed", 'task_ids': [self.task.id]})
+        self.assertEqual(Task.objects.get(id=self.task.id).status, "Pending")
+
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(Task.objects.get(id=self.task.id).title, "Edited")
+
+    def test_member_boards_follow_project_changes(self):
+        self.client.force_login(self.carol)
+        self.client.get(reverse('tasks'))
+        self.task.title = "Renamed plan"
+        self.task.save()
+        self.assertContains(self.client.get(reverse('tasks')), "Renamed plan")
+
+        self.client.post(self.url, {'remove': "", 'user_id': self.carol.id})
+        self.assertNotContains(self.client.get(reverse('tasks')), "Renamed plan")
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_owners_manage_the_members(self):
+        dave = User.objects.create_user(username="dave", password="secret-pass-123")
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.post(self.url, {'username': "dave", 'role': "viewer"}).status_code, 403)
+
+        self.client.force_login(self.user)
+        self.client.post(self.url, {'username': "dave", 'role': "viewer"})
+        self.assertTrue(Task.objects.visible_to(dave).filter(id=self.task.id).exists())
+        response = self.client.post(self.url, {'remove': "", 'user_id': self.user.id})
+        self.assertContains(response, "at least one owner")
+
+        response = self.client.post(reverse('project_list'), {'name': "Garden"})
+        project = Project.objects.get(name="Garden")
+        self.assertRedirects(response, reverse('project_detail', kwargs={'project_id': project.id}))
+        self.assertEqual(project.memberships.get().role, ProjectMembership.OWNER)
@@ -1,18 +1,29 @@
 from django.urls import path, include
-from . import views
-from django.conf import settings
-from django.conf.urls.static import static
+from . import api, views
 
 urlpatterns = [
     path('', views.welcome, name='welcome'),
     path('home/', views.home, name='home'),
     path('tasks/', views.tasks, name='tasks'),
+    path('tasks/page/', views.task_page, name='task_page'),
+    path('tasks/events/', views.task_events, name='task_events'),
+    path('search/', views.task_search, name='task_search'),
     path('profile/', views.profile, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('register/', views.register, name='register'),
     path('login/', views.login_view, name='login'),
+    path('demo/', views.demo_login, name='demo_login'),
     path('new/', views.task_create, name='task_create'),
+    path('bulk/', views.task_bulk, name='task_bulk'),
+    path('export/', views.task_export, name='task_export'),
+    path('projects/', views.project_list, name='project_list'),
+    path('projects/<int:project_id>/', views.project_detail, name='project_detail'),
+    path('api/tasks/', api.task_list, name='api_task_list'),
+    path('api/tasks/<int:task_id>/', api.task_detail, name='api_task_detail'),
+    path('api/tags/', api.tag_list, name='api_tag_list'),
+    path('metrics/', views.metrics_report, name='metrics_report'),
+    path('metrics/prometheus/', views.metrics_prometheus, name='metrics_prometheus'),
     path('<str:task_id>/edit/', views.task_update, name='task_update'),
     path('<str:task_id>/delete/', views.task_delete, name='task_delete'),
     path('accounts/', include('django.contrib.auth.urls')),
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+]
\ No newline at end of file
@@ -1,48 +1,163 @@
+import hashlib
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, UserChangeForm
 from django.contrib.auth import login, authenticate
-from .forms import CustomUserCreationForm, TaskForm, TagForm
+from .forms import (BulkTaskForm, CustomUserCreationForm, ProjectForm, ProjectMemberForm, RecurrenceForm,
+                    TaskConflict, TaskForm, TagForm)
 from django.utils.crypto import get_random_string
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.decorators import login_required 
-from .models import Task, Tag
+from .models import Project, ProjectMembership, RecurrenceRule, Task, Tag
+from .recurrence import set_recurrence
+from django.db import transaction
+from django.db.models import Count
+from .board import COLUMN_LIMIT, render_board
+from .pagination import InvalidCursor, apaginate, decode_cursor, paginate
+from .serializers import task_to_dict
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from .cache import cached_fragment, tag_catalog
+from .bulk import apply_bulk_action, soft_delete_tasks
+from .export import EXPORT_FORMATS, stream_export
+from .search import search_tasks
+from .events import format_sse, get_broker
+from .stats import user_stats
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from .metrics import registry
+from .demo import create_demo_account, demo_allowed, start_demo_session
 from django.contrib import messages
 
+# Upper bound for the page_size query parameter of JSON listings
+MAX_PAGE_SIZE = 200
+
+# Server-sent events: client reconnect delay and idle keep-alive interval
+SSE_RETRY_MS = 5000
+SSE_HEARTBEAT_SECONDS = 15
+
 def welcome(request):
     """Not implemented yet"""
     return render(request, 'welcome.html')
 
 @login_required
 def home(request):
-    tags = Tag.objects.all()
-    tag_name = request.GET.get('tag')
+    tags = tag_catalog(request.user.id)
+    tag_name = request.GET.get('tag', '')
+    cursor = request.GET.get('cursor', '')
+    # Resolve the name against the tags already loaded for the dropdown, so the
+    # filter only touches the tag_id index of the through table
+    tag = next((tag for tag in tags if tag.name == tag_name), None) if tag_name else None
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        cursor, position = None, None
 
-    if tag_name:  
-        tasks = Task.objects.filter(tags__name=tag_name)
-    else:
-        tasks = Task.objects.all()
+    def render_tasks():
+        # Tags are fetched in one extra query instead of one per rendered task
+        tasks = Task.objects.live().select_related('project').prefetch_related('tags')
+        if tag_name:
+            # The join through the tags table can repeat a task, so keep rows unique
+            tasks = tasks.filter(tags=tag).distinct() if tag else tasks.none()
+        tasks, next_cursor = paginate(tasks, cursor, user=request.user)
+
+        return render_to_string('home_tasks.html', {
+            'tasks': tasks,
+            'next_cursor': next_cursor,
+            'tag_name': tag_name,
+        })
 
-    return render(request, 'home.html', {'tags': tags, 'tasks': tasks})
+    # Keyed by the validated filter and position, hashed: the raw query strings are
+    # unbounded and may hold characters that memcached rejects in keys. An unknown
+    # tag renders no pages, so it never shows the name it was given.
+    selected = tag.id if tag else ('unknown' if tag_name else None)
+    digest = hashlib.md5(repr((selected, position)).encode(), usedforsecurity=False).hexdigest()[:16]
+    tasks_html = cached_fragment(request.user.id, f"home:{digest}", render_tasks)
+
+    return render(request, 'home.html', {'tags': tags, 'tasks_html': tasks_html})
 
 @login_required
 def tasks(request):
-    # Filter by status
-    tasks_completed = Task.objects.filter(user=request.user, status='Completed')
-    tasks_canceled = Task.objects.filter(user=request.user, status='Canceled')
-    tasks_in_progress = Task.objects.filter(user=request.user, status='In progress')
-    tasks_pending = Task.objects.filter(user=request.user, status='Pending')
-
-    return render(request, 'tasks.html', {
-        'tasks_completed': tasks_completed,
-        'tasks_canceled': tasks_canceled,
-        'tasks_in_progress': tasks_in_progress,
-        'tasks_pending': tasks_pending
+    # One query for every column, grouped by status in Python, cached until the board changes
+    columns_html = cached_fragment(request.user.id, "board", lambda: render_board(request.user))
+
+    return render(request, 'tasks.html', {'columns_html': columns_html})
+
+@login_required
+async def task_page(request):
+    '''Returns a page of the user's tasks as JSON, optionally limited to one status column.
+
+    With archived=1 the page lists archived tasks instead (the "show older" pager).
+    '''
+    user = await request.auser()
+    tasks = Task.objects.archived() if request.GET.get('archived') == '1' else Task.objects.live()
+    tasks = tasks.prefetch_related('tags')
+    status = request.GET.get('status')
+    if status:
+        tasks = tasks.filter(status=status)
+
+    try:
+        page_size = min(int(request.GET.get('page_size', COLUMN_LIMIT)), MAX_PAGE_SIZE)
+        tasks, next_cursor = await apaginate(tasks, request.GET.get('cursor'), max(page_size, 1), user)
+    except ValueError as exc:  # InvalidCursor or a non-numeric page_size
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    return JsonResponse({
+        'results': [task_to_dict(task) for task in tasks],
+        'next_cursor': next_cursor,
     })
 
+@login_required
+async def task_events(request):
+    '''Streams the user's task change events as server-sent events.
+
+    Connections wait on an in-process queue, so under ASGI an idle board costs
+    no worker thread and no database query. Under WSGI the never-ending
+    stream would be drained before anything is sent, holding a worker
+    forever, so the view answers 204 instead, which makes EventSource stop
+    reconnecting (the board then simply has no live updates).
+    '''
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+
+    async def stream():
+        async with get_broker().subscribe(user.id) as subscription:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                event = await subscription.next_event(timeout=SSE_HEARTBEAT_SECONDS)
+                # A comment line keeps proxies from closing an idle connection
+                yield format_sse(event) if event else ": heartbeat\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response['Cache-Control'] = "no-cache"
+    response['X-Accel-Buffering'] = "no"
+    return response
+
+@login_required
+def task_search(request):
+    '''Full-text search over the titles and descriptions of the user's tasks.'''
+    query = request.GET.get('q', '').strip()
+    tasks = search_tasks(request.user, query) if query else []
+    return render(request, 'search.html', {'query': query, 'tasks': tasks})
+
 @login_required
 def profile(request):
-    return render(request, 'profile.html', {'user': request.user})
+    # Read from the counters table, no scan over the user's tasks
+    tag_names = {tag.id: tag.name for tag in tag_catalog(request.user.id)}
+    stats = user_stats(request.user, tag_names)
+    return render(request, 'profile.html', {'user': request.user, 'stats': stats})
+
+@require_POST
+def demo_login(request):
+    '''Signs the visitor in as a new throwaway demo user with sample tasks.'''
+    if not demo_allowed(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponse("Too many demo accounts from this address, try again later.", status=429)
+    start_demo_session(request, create_demo_account())
+    return redirect('home')
 
 def register(request):
     '''This view function is used to register a new user'''
@@ -96,71 +211,240 @@ def login_view(request):
 
     return render(request, 'login.html', {'form': form})
 
+def _own_tags(user):
+    '''The user's own tags, which the task form lets them rename and delete (shared tags stay).'''
+    return [tag for tag in tag_catalog(user.id) if tag.user_id == user.id]
+
+def _tag_name_free(user, name):
+    name = (name or "").strip()
+    return bool(name) and name.casefold() not in {tag.name.casefold() for tag in tag_catalog(user.id)}
+
 @login_required  # require the user to be logged in to access this view
 def task_create(request):
-    tags = Tag.objects.all()  # Retrieve all tags
-
     if request.method == "POST":
-        task_form = TaskForm(request.POST)
+        task_form = TaskForm(request.POST, user=request.user)
         tag_form = TagForm(request.POST)
+        recurrence_form = RecurrenceForm(request.POST, prefix="recurrence")
 
         # Check which button was clicked
         if "add_tag" in request.POST:
-            if tag_form.is_valid():
-                tag_form.save()
-            return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "tags": tags})
+            # Tags are added to the user's own namespace, unless one they see has the name
+            if tag_form.is_valid() and _tag_name_free(request.user, tag_form.cleaned_data['name']):
+                tag = tag_form.save(commit=False)
+                tag.user = request.user
+                tag.save()
+            return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "recurrence_form": recurrence_form, "tags": _own_tags(request.user)})
 
         elif "edit_tag" in request.POST:
             tag_id = request.POST.get("tag_id")
-            tag = get_object_or_404(Tag, id=tag_id)
-            tag.name = request.POST.get("new_name")
-            tag.save()
-            return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "tags": tags})
+            tag = get_object_or_404(Tag, id=tag_id, user=request.user)
+            if _tag_name_free(request.user, request.POST.get("new_name")):
+                tag.name = request.POST.get("new_name")
+                tag.save()
+            return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "recurrence_form": recurrence_form, "tags": _own_tags(request.user)})
 
         elif "delete_tag" in request.POST:
             tag_id = request.POST.get("tag_id")
-            tag = get_object_or_404(Tag, id=tag_id)
+            tag = get_object_or_404(Tag, id=tag_id, user=request.user)
             tag.delete()
-            return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "tags": tags})
+            return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "recurrence_form": recurrence_form, "tags": _own_tags(request.user)})
 
         else:  # New task form submitted
-            if task_form.is_valid():
-                task = task_form.save(commit=False)  # Don't save to the DB yet
-                task.user = request.user  # Assign the current user to the task
-                task.save()  # Save the task to the DB
-                
-                task_form.save_m2m()  # Save many-to-many relationships (tags)
-                
+            if _recurring_task_valid(task_form, recurrence_form):
+                with transaction.atomic():
+                    task = task_form.save(commit=False)  # Don't save to the DB yet
+                    task.user = request.user  # Assign the current user to the task
+                    task.save()  # Save the task to the DB
+
+                    # A new task has no tags to compare with, so they are only added
+                    task.tags.add(*task_form.cleaned_data['tags'])
+                    if recurrence_form.cleaned_data['frequency']:
+                        set_recurrence(task, **recurrence_form.cleaned_data)
+
                 return redirect("tasks")
 
     else:
-        task_form = TaskForm()
+        task_form = TaskForm(user=request.user)
         tag_form = TagForm()
+        recurrence_form = RecurrenceForm(prefix="recurrence")
+
+    return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "recurrence_form": recurrence_form, "tags": _own_tags(request.user)})
 
-    return render(request, "task_form.html", {"task_form": task_form, "tag_form": tag_form, "tags": tags})
 
 
+def _recurring_task_valid(task_form, recurrence_form):
+    '''Validates a task form and its repeat settings together; a repeating task needs a due date.'''
+    if not (task_form.is_valid() and recurrence_form.is_valid()):
+        return False
+    if recurrence_form.cleaned_data['frequency'] and not task_form.cleaned_data['due_date']:
+        task_form.add_error('due_date', "A repeating task needs a due date.")
+        return False
+    return True
 
+@login_required
 def task_update(request, task_id):
-    task = get_object_or_404(Task, id=task_id)
-    tags = Tag.objects.all()
+    # Access is part of the lookup, and the task's rule is joined in: one query whatever the user's projects
+    task = get_object_or_404(Task.objects.editable_by(request.user).select_related('recurrence_rule'), id=task_id)
     tag_form = TagForm()
+    try:
+        rule = task.recurrence_rule
+    except RecurrenceRule.DoesNotExist:
+        rule = None
+    # Occurrences of a series are edited one by one; only the template carries the rule
+    repeatable = rule is not None or task.recurrence_id is None
+    status = 200
 
     if request.method == "POST":
-        form = TaskForm(request.POST, instance=task)
-        if form.is_valid():
-            form.save()
-            return redirect('tasks')
+        form = TaskForm(request.POST, instance=task, user=request.user)
+        recurrence_form = RecurrenceForm(request.POST, prefix="recurrence")
+        valid = _recurring_task_valid(form, recurrence_form) if repeatable else form.is_valid()
+        if valid:
+            try:
+                with transaction.atomic():
+                    form.save_changes()
+                    # Regenerates the future occurrences from the edited rule and template
+                    if repeatable and (rule is not None or recurrence_form.cleaned_data['frequency']):
+                        set_recurrence(task, **recurrence_form.cleaned_data)
+                return redirect('tasks')
+            except TaskConflict:
+                form.add_error(None, "Someone else changed this task since you opened it. "
+                                     "Reload the page to see their changes before saving yours.")
+                status = 409
     else:
-        form = TaskForm(instance=task)
+        form = TaskForm(instance=task, user=request.user)
+        recurrence_form = RecurrenceForm(initial=RecurrenceForm.initial_for(rule), prefix="recurrence")
 
     return render(request, 'task_form.html', {
         'task_form': form,
         'tag_form': tag_form,
-        'tags': tags  # pass the tags to the template
-    })
+        'recurrence_form': recurrence_form if repeatable else None,
+        'tags': _own_tags(request.user)  # pass the tags to the template
+    }, status=status)
 
+@login_required
 def task_delete(request, task_id):
-    task = get_object_or_404(Task, id=task_id)
-    task.delete()
-    return redirect('tasks')
\ No newline at end of file
+    task = get_object_or_404(Task.objects.editable_by(request.user), id=task_id)
+    # Soft delete: the row is purged later by purge_deleted_tasks
+    soft_delete_tasks(Task.objects.filter(id=task.id))
+    return redirect('tasks')
+
+@login_required
+@require_POST
+def task_bulk(request):
+    '''Applies a status, priority, tag or delete action to many tasks the user may edit at once.'''
+    form = BulkTaskForm(request.POST, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+
+    data = form.cleaned_data
+    result = apply_bulk_action(
+        request.user,
+        data['action'],
+        data['task_ids'],
+        status=data['status'],
+        priority=data['priority'],
+        tags=data['tags'],
+    )
+    return JsonResponse(result)
+
+@login_required
+def task_export(request):
+    '''Streams the tasks visible to the user as CSV or JSON Lines without loading them all in memory.'''
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"Unknown export format: {export_format}"}, status=400)
+
+    tasks = Task.objects.visible_to(request.user)
+    response = StreamingHttpResponse(
+        stream_export(tasks, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="tasks.{export_format}"'
+    return response
+
+
+@login_required
+def project_list(request):
+    '''Lists the user's projects, and creates new ones with the user as their owner.'''
+    if request.method == "POST":
+        form = ProjectForm(request.POST)
+        if form.is_valid():
+            with transaction.atomic():
+                project = form.save()
+                ProjectMembership.objects.create(project=project, user=request.user, role=ProjectMembership.OWNER)
+            return redirect('project_detail', project_id=project.id)
+    else:
+        form = ProjectForm()
+
+    memberships = (
+        request.user.project_memberships.select_related('project')
+        .annotate(member_count=Count('project__memberships'))
+        .order_by('project__name')
+    )
+    return render(request, 'projects.html', {'form': form, 'memberships': memberships})
+
+def _keeps_an_owner(membership, role=None):
+    '''Tells whether the project still has an owner once `membership` leaves or takes `role`.'''
+    if membership.role != ProjectMembership.OWNER or role == ProjectMembership.OWNER:
+        return True
+    return membership.project.memberships.filter(role=ProjectMembership.OWNER).exclude(id=membership.id).exists()
+
+@login_required
+def project_detail(request, project_id):
+    '''Lists a project's members. Owners add members, change roles and remove members; anyone may leave.'''
+    membership = get_object_or_404(
+        ProjectMembership.objects.select_related('project'), project_id=project_id, user=request.user,
+    )
+    project = membership.project
+    is_owner = membership.role == ProjectMembership.OWNER
+    form = ProjectMemberForm()
+    error = None
+
+    if request.method == "POST":
+        if "remove" in request.POST:
+            target = get_object_or_404(project.memberships.select_related('project'), user_id=request.POST.get('user_id'))
+            leaving = target.id == membership.id
+            if not (is_owner or leaving):
+                return HttpResponseForbidden()
+            if _keeps_an_owner(target):
+                target.delete()
+                return redirect('project_list') if leaving else redirect('project_detail', project_id=project.id)
+            error = "A project needs at least one owner."
+        else:
+            if not is_owner:
+                return HttpResponseForbidden()
+            form = ProjectMemberForm(request.POST)
+            if form.is_valid():
+                user, role = form.cleaned_data['username'], form.cleaned_data['role']
+                current = project.memberships.select_related('project').filter(user=user).first()
+                if current is None or _keeps_an_owner(current, role):
+                    # The signals drop the cached memberships and the member's board
+                    ProjectMembership.objects.update_or_create(project=project, user=user, defaults={'role': role})
+                    return redirect('project_detail', project_id=project.id)
+                form.add_error('role', "A project needs at least one owner.")
+
+    return render(request, 'project_detail.html', {
+        'project': project,
+        'is_owner': is_owner,
+        'members': project.memberships.select_related('user').order_by('user__username'),
+        'form': form,
+        'error': error,
+    })
+
+
+@staff_member_required
+def metrics_report(request):
+    '''Per-view latency, SQL and template figures of this process, slowest first.'''
+    return JsonResponse({'views': registry.report()})
+
+
+def metrics_prometheus(request):
+    '''Prometheus scrape endpoint, open to staff and to the TASK_METRICS_TOKEN bearer token.'''
+    token = getattr(settings, 'TASK_METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    authorized = request.user.is_active and request.user.is_staff
+    if token and authorization.startswith('Bearer '):
+        authorized = authorized or constant_time_compare(authorization[len('Bearer '):], token)
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')